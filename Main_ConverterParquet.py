@@ -0,0 +1,31 @@
+import os
+from armazenamento_parquet import converter_csv_para_parquet
+
+
+def diretorio_projeto(nome_projeto="ProjetoInvestimento"):
+    """
+    Busca recursivamente o diretório base do projeto, partindo do arquivo atual.
+
+    :param nome_projeto: Nome da pasta do projeto (padrão: 'ProjetoInvestimento').
+    :return: Caminho absoluto para a pasta do projeto.
+    """
+    caminho_atual = os.path.abspath(__file__)  # Caminho do script atual
+    while True:
+        if os.path.basename(caminho_atual) == nome_projeto:
+            return caminho_atual
+        caminho_superior = os.path.dirname(caminho_atual)
+        if caminho_superior == caminho_atual:  # Chegou ao root e não encontrou
+            raise FileNotFoundError(f"Pasta '{nome_projeto}' não encontrada.")
+        caminho_atual = caminho_superior
+
+
+if __name__ == "__main__":
+    # Conversão unica do historico em CSV para o armazenamento em parquet
+    projeto = diretorio_projeto()
+    raiz_parquet = os.path.join(projeto, "Historico cotações", "Parquet")
+
+    for pasta, classe in [("Ações IBOV", "Acoes_IBOV"), ("FII IBOV", "Fii_IBOV")]:
+        diretorio_csv = os.path.join(projeto, "Historico cotações", pasta)
+        if os.path.exists(diretorio_csv):
+            arquivos = converter_csv_para_parquet(diretorio_csv, raiz_parquet, classe)
+            print(f'{classe}: {len(arquivos)} meses convertidos para {raiz_parquet}')
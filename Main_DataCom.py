@@ -3,13 +3,22 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import WebDriverException
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.common.by import By
 from datetime import datetime, timedelta
+from functools import lru_cache
+import lxml.html
 import pandas as pd
 import os
 import re
+import shutil
+import tempfile
+import threading
 import time
+from agendador import executar_concorrente
+from esperas import esperar_clicavel, esperar_conteudo_alterado, esperar_overlay_sumir, conteudo_elemento
+from manifesto import ARQUIVO_MANIFESTO, Manifesto
 
 
 def diretorio_projeto(nome_projeto="ProjetoInvestimento"):
@@ -29,6 +38,23 @@ def diretorio_projeto(nome_projeto="ProjetoInvestimento"):
         caminho_atual = caminho_superior
 
 
+# Chave do manifesto com a ultima data de proventos salva
+CHAVE_MANIFESTO = 'DATACOM'
+
+URL_DATACOM = "https://br.investing.com/dividends-calendar/"
+
+# Tabela de proventos e teto em segundos da espera pela atualização da tabela após aplicar filtros
+TABELA_DIVIDENDOS = (By.ID, "dividendsCalendarData")
+TETO_TABELA = 20
+
+
+class FalhaExtracao(Exception):
+    """
+    Falha ao aplicar os filtros ou ao ler a tabela de proventos. Diferente de um mês sem proventos (tabela vazia),
+    o mês não pode ser considerado extraido.
+    """
+
+
 def click_with_retry(driver, element):
     for _ in range(3):  # Tentar clicar até 3 vezes
         try:
@@ -44,9 +70,15 @@ def click_with_retry(driver, element):
                 time.sleep(1)  # Esperar antes de tentar novamente
 
 
-def initialize_driver():
+def initialize_driver(headless=False, diretorio_download=None, diretorio_perfil=None, caminho_driver=None):
+    """
+    Inicializa o Chrome. Cada worker paralelo usa o proprio diretorio de download e perfil,
+    evitando conflito de arquivos e de trava do perfil entre navegadores.
+
+    :param caminho_driver: Chromedriver já resolvido (padrão: caminho_chromedriver()).
+    """
     chrome_options = Options()
-    diretorio_download = os.path.join(diretorio_projeto(), 'DataCom Proventos')
+    diretorio_download = diretorio_download or os.path.join(diretorio_projeto(), 'DataCom Proventos')
     prefs = {
         "download.default_directory": diretorio_download,  # Define o diretorio padrao
         "download.promp_for_download": False,  # Desativa o prompt de download
@@ -54,7 +86,10 @@ def initialize_driver():
         "safebrosing.enabled": True
     }
     chrome_options.add_experimental_option("prefs", prefs)
-    # chrome_options.add_argument("--headless")  # Executar sem interface gráfica
+    if headless:
+        chrome_options.add_argument("--headless=new")  # Executar sem interface gráfica
+    if diretorio_perfil:
+        chrome_options.add_argument(f"--user-data-dir={diretorio_perfil}")
     chrome_options.add_argument("--disable-gpu")
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
@@ -63,21 +98,43 @@ def initialize_driver():
     chrome_options.add_argument("--disable-software-rasterizer")
     chrome_options.add_argument("--disable-webgl")
 
-    service = Service(ChromeDriverManager().install())
+    service = Service(caminho_driver or caminho_chromedriver())
     return webdriver.Chrome(service=service, options=chrome_options)
 
 
+@lru_cache(maxsize=1)
+def caminho_chromedriver():
+    """
+    Instala/localiza o chromedriver uma unica vez por execução.
+    O lru_cache não impede chamadas simultaneas na primeira vez: com varios navegadores em paralelo o caminho
+    deve ser resolvido antes de iniciar as threads e repassado para initialize_driver.
+    """
+    return ChromeDriverManager().install()
+
+
 def close_overlays(driver):
     try:
         popup_close_button = driver.find_element(
             By.CLASS_NAME, "popupCloseIcon")
         if popup_close_button.is_displayed():
             popup_close_button.click()
+            esperar_overlay_sumir(driver, (By.CLASS_NAME, "popupCloseIcon"))
             print("Overlay fechado com sucesso!")
     except Exception:
         print("Nenhum overlay encontrado.")
 
 
+def estado_tabela(driver):
+    """
+    Primeira linha e texto atual da tabela de proventos, usados para detectar a atualização após um filtro.
+    """
+    try:
+        primeira_linha = driver.find_element(*TABELA_DIVIDENDOS).find_element(By.TAG_NAME, "tr")
+    except Exception:
+        primeira_linha = None
+    return primeira_linha, conteudo_elemento(driver, TABELA_DIVIDENDOS)
+
+
 def select_countries(driver, wait):
     try:
         filter_button = wait.until(
@@ -97,7 +154,7 @@ def select_countries(driver, wait):
                 try:
                     driver.execute_script(
                         "arguments[0].scrollIntoView(true);", checkbox)
-                    time.sleep(0.5)
+                    esperar_clicavel(driver, checkbox)
                     checkbox.click()
                     print(f"Desmarcado: {country_id}")
                 except Exception:
@@ -109,18 +166,20 @@ def select_countries(driver, wait):
         if not brazil_checkbox.is_selected():
             driver.execute_script(
                 "arguments[0].scrollIntoView(true);", brazil_checkbox)
-            time.sleep(0.5)
             driver.execute_script("arguments[0].click();", brazil_checkbox)
         print("Brasil selecionado com sucesso!")
 
         apply_button = driver.find_element(By.ID, "ecSubmitButton")
         driver.execute_script(
             "arguments[0].scrollIntoView(true);", apply_button)
-        time.sleep(0.5)
+        esperar_clicavel(driver, apply_button)
+        linha_antiga, conteudo_antigo = estado_tabela(driver)
         click_with_retry(driver, apply_button)
+        esperar_conteudo_alterado(driver, TABELA_DIVIDENDOS, conteudo_antigo, linha_antiga, teto=TETO_TABELA)
         print("Filtros aplicados com sucesso!")
     except Exception as e:
         print(f"Erro ao selecionar apenas o Brasil: {e}")
+        raise FalhaExtracao(f"Filtro de países não aplicado: {e}") from e
 
 
 def select_dates(driver, wait, start_date, end_date):
@@ -129,7 +188,7 @@ def select_dates(driver, wait, start_date, end_date):
             EC.element_to_be_clickable((By.ID, "datePickerToggleBtn")))
         driver.execute_script(
             "arguments[0].scrollIntoView(true);", date_picker_button)
-        time.sleep(0.5)
+        esperar_clicavel(driver, date_picker_button)
         click_with_retry(driver, date_picker_button)
         print("Botão do seletor de datas clicado!")
 
@@ -150,13 +209,75 @@ def select_dates(driver, wait, start_date, end_date):
         apply_button = driver.find_element(By.ID, "applyBtn")
         driver.execute_script(
             "arguments[0].scrollIntoView(true);", apply_button)
-        time.sleep(0.5)
         close_overlays(driver)
+        esperar_clicavel(driver, apply_button)
+
+        # Aguarda a tabela ser substituida ou ter o conteudo alterado, no maximo TETO_TABELA segundos
+        linha_antiga, conteudo_antigo = estado_tabela(driver)
         click_with_retry(driver, apply_button)
         print("Botão 'Aplicar' clicado com sucesso!")
-        time.sleep(20)
+        esperar_conteudo_alterado(driver, TABELA_DIVIDENDOS, conteudo_antigo, linha_antiga, teto=TETO_TABELA)
     except Exception as e:
         print(f"Erro ao selecionar as datas: {e}")
+        raise FalhaExtracao(f"Intervalo {start_date} - {end_date} não aplicado: {e}") from e
+
+
+# Retorna em uma unica chamada ao navegador a classe e o texto de cada celula de todas as linhas da tabela
+SCRIPT_TABELA = """
+var tabela = document.getElementById('dividendsCalendarData');
+if (!tabela) { return null; }
+return Array.from(tabela.getElementsByTagName('tr')).map(function (linha) {
+    var celulas = Array.from(linha.getElementsByTagName('td')).map(function (celula) { return celula.innerText; });
+    return [linha.getAttribute('class') || '', celulas];
+});
+"""
+
+
+def normalizar_celula(texto):
+    """
+    Texto da celula com espaços (inclusive &nbsp; e quebras de linha) reduzidos a um unico espaço.
+    O innerText do navegador e o text_content do lxml diferem nesses caracteres, sem a normalização a mesma
+    linha extraida pelos dois caminhos não seria reconhecida como repetida em mesclar_datacom.
+    """
+    return " ".join((texto or "").split())
+
+
+def montar_tabela_dividendos(linhas):
+    """
+    Monta o DataFrame de proventos a partir de uma lista de (classe da linha, textos das celulas).
+    """
+    data = []
+    for classe, cells in linhas:
+        if "theDay" in classe:
+            continue
+
+        if len(cells) == 7:
+            cells = [normalizar_celula(celula) for celula in cells]
+            data.append({
+                "Empresa": cells[1],
+                "Data ex-dividendos": cells[2],
+                "Dividendo": cells[3],
+                "Tipo": cells[4],
+                "Pagamento": cells[5],
+                "Rendimento": cells[6],
+            })
+
+    return pd.DataFrame(data)
+
+
+def linhas_tabela_html(html):
+    """
+    Extrai (classe da linha, textos das celulas) da tabela de proventos a partir do HTML da pagina.
+    Usado com o page_source do navegador ou com paginas salvas. Os textos são normalizados em
+    montar_tabela_dividendos, igual aos do SCRIPT_TABELA.
+    """
+    documento = lxml.html.fromstring(html)
+    tabelas = documento.xpath('//*[@id="dividendsCalendarData"]')
+    if not tabelas:
+        return []
+
+    return [(linha.get("class") or "", [celula.text_content() for celula in linha.iter("td")])
+            for linha in tabelas[0].iter("tr")]
 
 
 def extract_table_data(driver, wait):
@@ -165,32 +286,105 @@ def extract_table_data(driver, wait):
             (By.ID, "dividendsCalendarData")))
         print("Tabela carregada com sucesso!")
 
-        table = driver.find_element(By.ID, "dividendsCalendarData")
-        rows = table.find_elements(By.TAG_NAME, "tr")
-
-        data = []
-        for row in rows:
-            if "theDay" in row.get_attribute("class"):
-                continue
-
-            cells = row.find_elements(By.TAG_NAME, "td")
-            if len(cells) == 7:
-                data.append({
-                    "Empresa": cells[1].text.strip(),
-                    "Data ex-dividendos": cells[2].text.strip(),
-                    "Dividendo": cells[3].text.strip(),
-                    "Tipo": cells[4].text.strip(),
-                    "Pagamento": cells[5].text.strip(),
-                    "Rendimento": cells[6].text.strip(),
-                })
-
-        df = pd.DataFrame(data)
+        # Tabela inteira em uma unica requisição ao WebDriver, processada localmente
+        linhas = driver.execute_script(SCRIPT_TABELA)
+        if linhas is None:
+            linhas = linhas_tabela_html(driver.page_source)
+
+        df = montar_tabela_dividendos(linhas)
         print("Dados extraídos com sucesso!")
         return df
 
     except Exception as e:
         print(f"Erro ao extrair os dados da tabela: {e}")
-        return pd.DataFrame()
+        raise FalhaExtracao(f"Tabela de proventos não extraida: {e}") from e
+
+
+class SessaoDataCom:
+    """
+    Sessão do Chrome reaproveitada entre os meses do DataCom.
+    A pagina e o filtro do Brasil são configurados uma unica vez, cada mês só altera o intervalo de datas.
+    Se o navegador cair ou a extração falhar a sessão é reiniciada e o mês é extraido novamente.
+    """
+
+    def __init__(self, url=URL_DATACOM, tentativas=2, headless=False, diretorio_trabalho=None,
+                 caminho_driver=None):
+        self.url = url
+        self.tentativas = tentativas
+        self.headless = headless
+        self.diretorio_trabalho = diretorio_trabalho
+        self.caminho_driver = caminho_driver
+        self.driver = None
+        self.wait = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.encerrar()
+
+    def iniciar(self):
+        # Inicializar o driver, com download e perfil isolados quando existir diretorio de trabalho
+        if self.diretorio_trabalho:
+            self.driver = initialize_driver(self.headless,
+                                            os.path.join(self.diretorio_trabalho, 'download'),
+                                            os.path.join(self.diretorio_trabalho, 'perfil'),
+                                            caminho_driver=self.caminho_driver)
+        else:
+            self.driver = initialize_driver(self.headless, caminho_driver=self.caminho_driver)
+        self.wait = WebDriverWait(self.driver, 15)
+
+        # Navegar até a página e configurar os filtros
+        self.driver.get(self.url)
+        close_overlays(self.driver)
+        select_countries(self.driver, self.wait)
+
+    def encerrar(self):
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except WebDriverException:
+                pass
+        self.driver = None
+        self.wait = None
+
+    def reiniciar(self):
+        print("Reiniciando o navegador.")
+        self.encerrar()
+        self.iniciar()
+
+    def ativa(self):
+        """
+        Verifica se o navegador ainda responde.
+        """
+        if self.driver is None:
+            return False
+        try:
+            self.driver.current_url
+            return True
+        except WebDriverException:
+            return False
+
+    def extrair_mes(self, data_inicio, data_fim):
+        """
+        Seleciona o intervalo de datas na pagina já filtrada e extrai a tabela de proventos.
+        Retorna None se todas as tentativas falharem, um DataFrame vazio é um mês sem proventos.
+        """
+        for tentativa in range(self.tentativas):
+            try:
+                if self.driver is None:
+                    self.iniciar()
+                elif not self.ativa():
+                    self.reiniciar()
+
+                select_dates(self.driver, self.wait, start_date=data_inicio, end_date=data_fim)
+                return extract_table_data(self.driver, self.wait)
+            except (WebDriverException, FalhaExtracao) as e:
+                # A pagina pode ter ficado em um estado inconsistente, a proxima tentativa usa um navegador novo
+                print(f"Falha no mês {data_inicio} - {data_fim} (tentativa {tentativa + 1}): {e}")
+                self.encerrar()
+
+        return None
 
 
 def lista_datas():
@@ -230,51 +424,150 @@ def lista_datas():
     return datas_extraidas.strftime('%Y-%m-%d')
 
 
+def mesclar_datacom(df, filepath):
+    """
+    Mescla os proventos extraidos com o arquivo mensal já salvo, eventos repetidos são substituidos pelos novos.
+    """
+    if os.path.exists(filepath):
+        dfExistente = pd.read_csv(filepath, sep=';', dtype=str, keep_default_na=False, encoding="utf-8")
+        df = pd.concat([dfExistente, df], ignore_index=True).drop_duplicates(
+            subset=['Empresa', 'Data ex-dividendos', 'Dividendo', 'Tipo'], keep='last')
+    return df
+
+
 def salvar_datacom(data_inicial, output_path):
     """
     Gera o historio mes a mes a partir da data inicial
+    Quando existe manifesto começa na ultima data registrada, mesclando os proventos nos arquivos mensais já salvos.
     """
 
+    manifesto = Manifesto(os.path.join(output_path, ARQUIVO_MANIFESTO))
     data_final = datetime.now()
-    data_atual = datetime.strptime(
+    data_atual = manifesto.ultima_data(CHAVE_MANIFESTO) or datetime.strptime(
         data_inicial, "%Y-%m-%d")  # Data do contexto
-
+    watermark_valido = True
+
+    # Um unico navegador para todos os meses
+    with SessaoDataCom() as sessao:
+        while data_atual < data_final:
+            proximo_mes = (data_atual.replace(day=1) + timedelta(days=31)).replace(day=1)
+            fim_mes = proximo_mes - timedelta(days=1)
+
+            data_inicio = data_atual.strftime("%d/%m/%Y")
+            data_fim = fim_mes.strftime("%d/%m/%Y")
+
+            # Extrair os dados
+            df = sessao.extrair_mes(data_inicio, data_fim)
+            if df is None:
+                # O manifesto para no mês anterior, a proxima execução começa pelo mês que falhou
+                watermark_valido = False
+            else:
+                if not df.empty:
+                    filename = f"DATACOM_{data_fim[2:].replace('/', '_')}.csv"
+                    filepath = os.path.join(output_path, filename)
+                    df = mesclar_datacom(df, filepath)
+                    df.to_csv(filepath, sep=';', index=False, encoding="utf-8")
+
+                # Datas futuras do mês ainda podem receber novos proventos, o registro vai até o dia atual
+                if watermark_valido:
+                    manifesto.atualizar(CHAVE_MANIFESTO, min(fim_mes, data_final))
+                    manifesto.salvar()
+
+            data_atual = proximo_mes
+
+
+def janelas_meses(data_atual, data_final):
+    """
+    Divide o periodo em janelas mensais (inicio, fim do mês), a primeira começando na data atual.
+    """
+    janelas = []
     while data_atual < data_final:
-        proximo_mes = data_atual + timedelta(days=31)
-        fim_mes = (proximo_mes.replace(day=1) - timedelta(days=1))
+        proximo_mes = (data_atual.replace(day=1) + timedelta(days=31)).replace(day=1)
+        janelas.append((data_atual, proximo_mes - timedelta(days=1)))
+        data_atual = proximo_mes
+    return janelas
 
-        data_inicio = data_atual.strftime("%d/%m/%Y")
-        data_fim = fim_mes.strftime("%d/%m/%Y")
-        
-        # Inicializar o driver
-        driver = initialize_driver()
-        wait = WebDriverWait(driver, 15)
 
-        # Navegar até a página e configurar os filtros
-        url = "https://br.investing.com/dividends-calendar/"
-        driver.get(url)
-        close_overlays(driver)
-        select_countries(driver, wait)
-        select_dates(driver, wait, start_date=data_inicio,
-                     end_date=data_fim)
+def salvar_datacom_paralelo(data_inicial, output_path, max_workers=3, url=URL_DATACOM, tentativas_janela=2,
+                            headless=True):
+    """
+    Gera o historico dividindo o periodo em janelas mensais extraidas em paralelo por até `max_workers`
+    navegadores headless. Cada worker mantem uma sessão propria com diretorio de download e perfil temporarios.
+    Janelas com erro (navegador fora do ar, filtro ou tabela não carregados) são repetidas com um navegador novo
+    até `tentativas_janela` vezes. Os meses são mesclados nos arquivos DATACOM_MM_YYYY.csv e o manifesto avança
+    somente até a janela anterior à primeira que falhou.
 
-        # Extrair os dados
-        df = extract_table_data(driver, wait)
-        if not df.empty:
-            filename = f"DATACOM_{data_fim[2:].replace('/', '_')}.csv"
-            filepath = os.path.join(output_path, filename)
-            df.to_csv(filepath, sep=';', index=False, encoding="utf-8")
+    :param url: Endereço do calendario de proventos (pode apontar para um site local de teste).
+    """
+    manifesto = Manifesto(os.path.join(output_path, ARQUIVO_MANIFESTO))
+    data_final = datetime.now()
+    data_atual = manifesto.ultima_data(CHAVE_MANIFESTO) or datetime.strptime(data_inicial, "%Y-%m-%d")
+
+    janelas = janelas_meses(data_atual, data_final)
+    if not janelas:
+        return
+
+    # Resolvido antes das threads: chamadas simultaneas ao ChromeDriverManager disputam o mesmo download
+    caminho_driver = caminho_chromedriver()
+
+    local = threading.local()
+    sessoes = []
+    trava = threading.Lock()
+
+    def sessao_worker():
+        # Uma sessão por thread, criada no primeiro uso e reaproveitada nas proximas janelas
+        if getattr(local, 'sessao', None) is None:
+            diretorio_trabalho = tempfile.mkdtemp(prefix='datacom_')
+            os.makedirs(os.path.join(diretorio_trabalho, 'download'))
+            local.sessao = SessaoDataCom(url=url, tentativas=tentativas_janela, headless=headless,
+                                         diretorio_trabalho=diretorio_trabalho, caminho_driver=caminho_driver)
+            with trava:
+                sessoes.append(local.sessao)
+        return local.sessao
+
+    def extrair_janela(janela):
+        # None quando todas as tentativas falharam
+        inicio, fim_mes = janela
+        df = sessao_worker().extrair_mes(inicio.strftime("%d/%m/%Y"), fim_mes.strftime("%d/%m/%Y"))
+        if df is None:
+            print(f"Falha na janela {inicio:%d/%m/%Y} - {fim_mes:%d/%m/%Y} após {tentativas_janela} tentativas.")
+        return df
 
-        driver.quit()
+    try:
+        resultados = executar_concorrente(extrair_janela, janelas, max_workers=min(max_workers, len(janelas)))
+    finally:
+        for sessao in sessoes:
+            sessao.encerrar()
+            shutil.rmtree(sessao.diretorio_trabalho, ignore_errors=True)
+
+    # Gravação sequencial na ordem das janelas
+    watermark_valido = True
+    for (inicio, fim_mes), df in zip(janelas, resultados):
+        if df is None:
+            watermark_valido = False
+            continue
 
-        data_atual = proximo_mes.replace(day=1)
+        if not df.empty:
+            data_fim = fim_mes.strftime("%d/%m/%Y")
+            filepath = os.path.join(output_path, f"DATACOM_{data_fim[2:].replace('/', '_')}.csv")
+            df = mesclar_datacom(df, filepath)
+            df.to_csv(filepath, sep=';', index=False, encoding="utf-8")
 
+        if watermark_valido:
+            manifesto.atualizar(CHAVE_MANIFESTO, min(fim_mes, data_final))
 
+    manifesto.salvar()
 
 
-# Configurações Gerais
-output_path = os.path.join(diretorio_projeto(), 'DataCom Proventos')
-data_inicial = lista_datas()
+if __name__ == "__main__":
+    # Configurações Gerais
+    output_path = os.path.join(diretorio_projeto(), 'DataCom Proventos')
+    data_inicial = lista_datas()
 
+    # Navegadores headless em paralelo (1 mantem a extração sequencial em um unico navegador)
+    max_workers = 3
 
-salvar_datacom(data_inicial, output_path)
+    if max_workers > 1:
+        salvar_datacom_paralelo(data_inicial, output_path, max_workers=max_workers)
+    else:
+        salvar_datacom(data_inicial, output_path)
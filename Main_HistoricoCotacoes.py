@@ -0,0 +1,77 @@
+import os
+from metricas import Metricas, salvar_execucao
+from motor_ingestao import executar_ingestao, executar_intraday, reparar_ingestao
+
+
+def diretorio_projeto(nome_projeto="ProjetoInvestimento"):
+    """
+    Busca recursivamente o diretório base do projeto, partindo do arquivo atual.
+
+    :param nome_projeto: Nome da pasta do projeto (padrão: 'ProjetoInvestimento').
+    :return: Caminho absoluto para a pasta do projeto.
+    """
+    caminho_atual = os.path.abspath(__file__)  # Caminho do script atual
+    while True:
+        if os.path.basename(caminho_atual) == nome_projeto:
+            return caminho_atual
+        caminho_superior = os.path.dirname(caminho_atual)
+        if caminho_superior == caminho_atual:  # Chegou ao root e não encontrou
+            raise FileNotFoundError(f"Pasta '{nome_projeto}' não encontrada.")
+        caminho_atual = caminho_superior
+
+
+if __name__ == "__main__":
+    # Variaveis para execução de codigos e caminhos para arquivos
+    projeto = diretorio_projeto()
+
+    # Armazenamento opcional em parquet (requer pyarrow), None salva somente os CSVs
+    raiz_parquet = None  # os.path.join(projeto, "Historico cotações", "Parquet")
+
+    # Fechamento ajustado e retorno total atualizados após cada ingestão (requer pyarrow), None desativa
+    raiz_ajustados = None  # os.path.join(projeto, "Historico cotações", "Ajustados")
+
+    # Fechamento, volume e proventos em matrizes mapeadas em memoria (tickers x pregões), None desativa
+    raiz_cubo = None  # os.path.join(projeto, "Historico cotações", "Cubo")
+
+    # Relatorio JSON de cada execução e arquivo opcional para o textfile collector do node exporter
+    diretorio_metricas = os.path.join(projeto, "Historico cotações", "Metricas")
+    caminho_prometheus = None  # "/var/lib/node_exporter/textfile_collector/projeto_investimento_ingestao.prom"
+    metricas = Metricas('ingestao')
+
+    # Cache das respostas do Yahoo: meses fechados já baixados não são consultados novamente, None desativa
+    diretorio_cache = os.path.join(projeto, "Historico cotações", "Cache")
+
+    # Quantidade de tickers por download (None consulta um ticker por vez)
+    tamanho_lote = 100
+
+    # Downloads simultâneos e limite de requisições por segundo usados no modo por ticker
+    max_workers = 8
+    taxa_requisicoes = 5
+
+    # Motor de download: 'yfinance' (yf.download) ou 'async' (endpoint de grafico com aiohttp, sem cache)
+    motor = 'yfinance'
+
+    # True baixa novamente, sem o ajuste de proventos, os diretorios salvos antes do manifesto com "formato"
+    # (historico completo de todos os tickers desde o primeiro mês salvo). False somente exibe a estimativa
+    migrar_formato = False
+
+    # True baixa somente os pares (ticker, mês) do registro de falhas (falhas.json) de cada classe
+    modo_reparo = False
+
+    # Intervalo das barras intraday ('1m', '5m', '1h'...) atualizadas depois do diario, None desativa
+    intervalo_intraday = None
+
+    if modo_reparo:
+        reparar_ingestao(projeto, ['acoes', 'fii'], tamanho_lote=tamanho_lote, max_workers=max_workers,
+                         taxa_requisicoes=taxa_requisicoes, raiz_parquet=raiz_parquet, metricas=metricas)
+    else:
+        # Ações e FII atualizados no mesmo processo, compartilhando o pool de downloads e a sessão HTTP
+        # Cada classe continua salva na propria pasta de "Historico cotações"
+        executar_ingestao(projeto, ['acoes', 'fii'], tamanho_lote=tamanho_lote, max_workers=max_workers,
+                          taxa_requisicoes=taxa_requisicoes, raiz_parquet=raiz_parquet,
+                          raiz_ajustados=raiz_ajustados, metricas=metricas, diretorio_cache=diretorio_cache,
+                          motor=motor, raiz_cubo=raiz_cubo, migrar_formato=migrar_formato)
+        if intervalo_intraday:
+            executar_intraday(projeto, ['acoes', 'fii'], interval=intervalo_intraday,
+                              taxa_requisicoes=taxa_requisicoes, raiz_parquet=raiz_parquet, metricas=metricas)
+    salvar_execucao(metricas, diretorio_metricas, caminho_prometheus)
@@ -5,8 +5,14 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.common.by import By
-import time
 import os
+import shutil
+import tempfile
+from agendador import executar_concorrente
+from esperas import esperar_download, esperar_pagina_carregada
+from historico_indicadores import HistoricoIndicadores
+from indicadores_http import baixar_indicadores, criar_sessao
+from leitor_indicadores import carregar_indicadores
 
 
 def diretorio_projeto(nome_projeto="ProjetoInvestimento"):
@@ -26,18 +32,24 @@ def diretorio_projeto(nome_projeto="ProjetoInvestimento"):
         caminho_atual = caminho_superior
 
 
-def indicadores_AcoesIBOV():
+# Nome do arquivo gerado pelo botão de download da busca avançada
+ARQUIVO_BUSCA_AVANCADA = 'statusinvest-busca-avancada.csv'
+
+
+def indicadores_navegador(url, nome_arquivo):
+    """
+    Baixa os indicadores pela pagina de busca avançada do Status Invest usando o Chrome.
+    Cada execução baixa em um diretorio temporario proprio, permitindo atualizar Ações e FII ao mesmo tempo,
+    e o arquivo completo é movido de forma atomica para 'Indicadores Financeiros/<nome_arquivo>'.
 
-    url = 'https://statusinvest.com.br/acoes/busca-avancada'
-    indicadores_antigo = os.path.join(
-        projeto, 'Indicadores Financeiros', 'statusinvest-busca-avancada.csv')
-    indicadores_novo = os.path.join(
-        projeto, 'Indicadores Financeiros', 'Indicadores_AcoesIBOV.csv')
+    :return: Caminho do arquivo atualizado, ou None se o download não terminou.
+    """
+    diretorio_indicadores = os.path.join(diretorio_projeto(), 'Indicadores Financeiros')
+    indicadores_novo = os.path.join(diretorio_indicadores, nome_arquivo)
     servico = Service(ChromeDriverManager().install())
 
-    # Configurando diretorio para download e do Chrome
-    diretorio_download = os.path.join(
-        diretorio_projeto(), 'Indicadores Financeiros')
+    # Diretorio temporario no mesmo disco do destino para a troca atomica do arquivo
+    diretorio_download = tempfile.mkdtemp(prefix='download_', dir=diretorio_indicadores)
     options = Options()
     prefs = {
         "download.default_directory": diretorio_download,  # Define o diretorio padrao
@@ -51,41 +63,30 @@ def indicadores_AcoesIBOV():
 
     # Aciona o webdriver
     driver = webdriver.Chrome(service=servico, options=options)
-    driver.get(url)
-    time.sleep(2)
-
-    # Aciona o botao de filtrar e aguarda o popup
-    try:
-        button_buscar = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable(
-                (By.XPATH, '//*[@id="main-2"]/div[3]/div/div/div/button[2]'))
-        )
-        button_buscar.click()
-    except Exception as e:
-        print(f'Erro ao clicar no botao de busca: {e}')
-
-    # Fechar popup de anuncios
     try:
-        button_close = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.CLASS_NAME, 'btn-close'))
-        )
-        button_close.click()
-    except Exception as e:
-        print(f'Erro ao clicar no botao de busca: {e}')
-
-    # Fazendo o download e apagando arquivo anterior
-    if os.path.exists(indicadores_novo):
-        os.remove(indicadores_novo)
+        driver.get(url)
+        esperar_pagina_carregada(driver)
+
+        # Aciona o botao de filtrar e aguarda o popup
         try:
-            button_download = WebDriverWait(driver, 10).until(
+            button_buscar = WebDriverWait(driver, 10).until(
                 EC.element_to_be_clickable(
-                    (By.XPATH, '//div/a[contains(@class, "btn-download")]'))
+                    (By.XPATH, '//*[@id="main-2"]/div[3]/div/div/div/button[2]'))
             )
-            button_download.click()
+            button_buscar.click()
+        except Exception as e:
+            print(f'Erro ao clicar no botao de busca: {e}')
+
+        # Fechar popup de anuncios
+        try:
+            button_close = WebDriverWait(driver, 10).until(
+                EC.element_to_be_clickable((By.CLASS_NAME, 'btn-close'))
+            )
+            button_close.click()
         except Exception as e:
             print(f'Erro ao clicar no botao de busca: {e}')
 
-    else:
+        # Fazendo o download, o arquivo anterior só é substituido quando o novo estiver completo
         try:
             button_download = WebDriverWait(driver, 10).until(
                 EC.element_to_be_clickable(
@@ -95,106 +96,67 @@ def indicadores_AcoesIBOV():
         except Exception as e:
             print(f'Erro ao clicar no botao de busca: {e}')
 
-    # Loop para esperar o arquivo
-    tempo_maximo = 60
-    tempo_inicio = time.time()
-    while not os.path.exists(indicadores_antigo):
-        time.sleep(1)
-        if time.time() - tempo_inicio > tempo_maximo:
-            break
-    else:
-        os.rename(indicadores_antigo, indicadores_novo)
+        # Aguarda o download terminar (sem arquivo parcial e com tamanho estavel), no maximo 60 segundos
+        baixado = esperar_download(diretorio_download, ARQUIVO_BUSCA_AVANCADA, teto=60)
+        if not baixado:
+            return None
+        os.replace(baixado, indicadores_novo)
+        return indicadores_novo
+    finally:
+        # Finaliza a sessão
+        driver.quit()
+        shutil.rmtree(diretorio_download, ignore_errors=True)
 
-    # Finaliza a sessão
-    driver.quit()
+
+def indicadores_AcoesIBOV():
+    return indicadores_navegador('https://statusinvest.com.br/acoes/busca-avancada', 'Indicadores_AcoesIBOV.csv')
 
 
 def indicadores_FiiIBOV():
+    return indicadores_navegador('https://statusinvest.com.br/fundos-imobiliarios/busca-avancada',
+                                 'Indicadores_FiiIBOV.csv')
 
-    url = 'https://statusinvest.com.br/fundos-imobiliarios/busca-avancada'
-    indicadores_antigo = os.path.join(diretorio_projeto(
-    ), 'Indicadores Financeiros', 'statusinvest-busca-avancada.csv')
-    indicadores_novo = os.path.join(
-        diretorio_projeto(), 'Indicadores Financeiros', 'Indicadores_FiiIBOV.csv')
-    servico = Service(ChromeDriverManager().install())
 
-    # Configurando diretorio para download e do Chrome
-    diretorio_download = os.path.join(
-        diretorio_projeto(), 'Indicadores Financeiros')
-    options = Options()
-    prefs = {
-        "download.default_directory": diretorio_download,  # Define o diretorio padrao
-        "download.promp_for_download": False,  # Desativa o prompt de download
-        "download.directory_uprade": True,  # Atualiza o diretorio automaticamente
-        "safebrosing.enabled": True  # Evita alertas de seguranças
-    }
-    options.add_experimental_option("prefs", prefs)
-    # options.add_argument('--headless') Ativa o modo headless por algum movito o codigo não faz o download
-    options.add_argument('window-size=1920,1080')
-
-    # Aciona o webdriver
-    driver = webdriver.Chrome(service=servico, options=options)
-    driver.get(url)
-    time.sleep(2)
+def atualizar_indicadores(sessao=None):
+    """
+    Atualiza os CSVs de indicadores de Ações e FII em paralelo, direto por HTTP.
+    Se o download direto falhar a classe é atualizada pelo navegador (Selenium).
+    Cada atualização é registrada em 'Indicadores Financeiros/Historico/<classe>'. Se os dois caminhos falharem o
+    historico não é alterado, evitando registrar novamente o arquivo do dia anterior como um snapshot de hoje.
+    """
+    sessao = sessao or criar_sessao()
+    classes = [('acoes', 'Indicadores_AcoesIBOV.csv', indicadores_AcoesIBOV),
+               ('fii', 'Indicadores_FiiIBOV.csv', indicadores_FiiIBOV)]
 
-    # Aciona o botao de filtrar e aguarda o popup
-    try:
-        button_buscar = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable(
-                (By.XPATH, '//*[@id="main-2"]/div[3]/div/div/div/button[2]'))
-        )
-        button_buscar.click()
-    except Exception as e:
-        print(f'Erro ao clicar no botao de busca: {e}')
-
-    # Fechar popup de anuncios
-    try:
-        button_close = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.CLASS_NAME, 'btn-close'))
-        )
-        button_close.click()
-    except Exception as e:
-        print(f'Erro ao clicar no botao de busca: {e}')
-
-    # Fazendo o download e apagando arquivo anterior
-    if os.path.exists(indicadores_novo):
-        os.remove(indicadores_novo)
+    def atualizar_classe(classe):
+        categoria, nome_arquivo, indicadores_chrome = classe
+        destino = os.path.join(projeto, 'Indicadores Financeiros', nome_arquivo)
         try:
-            button_download = WebDriverWait(driver, 10).until(
-                EC.element_to_be_clickable(
-                    (By.XPATH, '//div/a[contains(@class, "btn-download")]'))
-            )
-            button_download.click()
+            baixar_indicadores(categoria, destino, sessao=sessao)
+            print(f'Indicadores salvos em: {destino}')
         except Exception as e:
-            print(f'Erro ao clicar no botao de busca: {e}')
-
-    else:
+            print(f'Erro no download direto de {nome_arquivo}: {e}. Usando o navegador.')
+            try:
+                atualizado = indicadores_chrome()
+            except Exception as erro:
+                print(f'Erro no download pelo navegador de {nome_arquivo}: {erro}')
+                atualizado = None
+            if not atualizado:
+                print(f'{nome_arquivo} não atualizado, historico mantido.')
+                return
+
+        # Guarda o snapshot do dia no historico versionado da classe
         try:
-            button_download = WebDriverWait(driver, 10).until(
-                EC.element_to_be_clickable(
-                    (By.XPATH, '//div/a[contains(@class, "btn-download")]'))
-            )
-            button_download.click()
+            historico = HistoricoIndicadores(os.path.join(projeto, 'Indicadores Financeiros', 'Historico', categoria))
+            historico.registrar(carregar_indicadores(destino, categoria))
         except Exception as e:
-            print(f'Erro ao clicar no botao de busca: {e}')
-
-    # Loop para esperar o arquivo
-    tempo_maximo = 60
-    tempo_inicio = time.time()
-    while not os.path.exists(indicadores_antigo):
-        time.sleep(1)
-        if time.time() - tempo_inicio > tempo_maximo:
-            break
-    else:
-        os.rename(indicadores_antigo, indicadores_novo)
-
-    # Finaliza a sessão
-    driver.quit()
+            print(f'Erro ao registrar o historico de {nome_arquivo}: {e}')
 
+    executar_concorrente(atualizar_classe, classes, max_workers=len(classes))
 
-# Diretorio projeto
-projeto = diretorio_projeto()
 
+if __name__ == "__main__":
+    # Diretorio projeto
+    projeto = diretorio_projeto()
 
-indicadores_AcoesIBOV()
-indicadores_FiiIBOV()
+    atualizar_indicadores()
@@ -0,0 +1,27 @@
+import os
+from proventos_cotacoes import JuncaoProventos
+
+
+def diretorio_projeto(nome_projeto="ProjetoInvestimento"):
+    """
+    Busca recursivamente o diretório base do projeto, partindo do arquivo atual.
+
+    :param nome_projeto: Nome da pasta do projeto (padrão: 'ProjetoInvestimento').
+    :return: Caminho absoluto para a pasta do projeto.
+    """
+    caminho_atual = os.path.abspath(__file__)  # Caminho do script atual
+    while True:
+        if os.path.basename(caminho_atual) == nome_projeto:
+            return caminho_atual
+        caminho_superior = os.path.dirname(caminho_atual)
+        if caminho_superior == caminho_atual:  # Chegou ao root e não encontrou
+            raise FileNotFoundError(f"Pasta '{nome_projeto}' não encontrada.")
+        caminho_atual = caminho_superior
+
+
+if __name__ == "__main__":
+    # Associa cada provento do DataCom ao ultimo fechamento na data ex, recalculando só os meses alterados
+    projeto = diretorio_projeto()
+
+    juncao = JuncaoProventos(projeto).atualizar()
+    print(f'{len(juncao)} proventos associados, {juncao["Close"].isna().sum()} sem cotação.')
@@ -0,0 +1,118 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Tarefa em execução na thread atual, usada por tarefa_cancelada
+_local = threading.local()
+
+
+class TempoEsgotado(Exception):
+    """
+    Tarefa abandonada por exceder o tempo máximo de execução.
+    """
+
+
+def tarefa_cancelada():
+    """
+    True se a tarefa da thread atual foi abandonada por executar_concorrente (tempo esgotado).
+    A thread continua rodando até a chamada bloqueante terminar: o resultado tardio deve ser descartado, sem
+    registrar metricas ou falhas, pois a tarefa já foi contada como falha.
+    """
+    cancelada = getattr(_local, 'cancelada', None)
+    return cancelada is not None and cancelada.is_set()
+
+
+class LimitadorTaxa:
+    """
+    Limitador de taxa no formato token bucket.
+    Libera até `taxa` requisições por segundo, permitindo rajadas de até `capacidade` requisições.
+    """
+
+    def __init__(self, taxa, capacidade=None):
+        self.taxa = float(taxa)
+        self.capacidade = float(capacidade or max(1.0, self.taxa))
+        self._fichas = self.capacidade
+        self._ultimo = time.monotonic()
+        self._trava = threading.Lock()
+
+    def adquirir(self):
+        """
+        Bloqueia até existir uma ficha disponivel e a consome.
+        """
+        while True:
+            with self._trava:
+                agora = time.monotonic()
+                self._fichas = min(self.capacidade, self._fichas + (agora - self._ultimo) * self.taxa)
+                self._ultimo = agora
+
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+
+                espera = (1 - self._fichas) / self.taxa
+
+            time.sleep(espera)
+
+
+def executar_concorrente(funcao, itens, max_workers=8, taxa=None, timeout=None, ao_expirar=None):
+    """
+    Executa funcao(item) para cada item em um pool limitado de threads.
+    Retorna os resultados na mesma ordem dos itens, independente da ordem de conclusão.
+    Itens com erro ou que excederem `timeout` segundos de execução retornam None.
+
+    :param max_workers: Quantidade máxima de requisições simultâneas.
+    :param taxa: Requisições por segundo (None sem limite).
+    :param timeout: Tempo máximo em segundos de cada requisição (None sem limite). A tarefa abandonada é
+        marcada como cancelada (ver tarefa_cancelada) e seu resultado tardio é ignorado.
+    :param ao_expirar: Função chamada com o item de cada tarefa abandonada, para registrá-la como falha.
+    """
+    itens = list(itens)
+    resultados = [None] * len(itens)
+    if not itens:
+        return resultados
+
+    limitador = LimitadorTaxa(taxa) if taxa else None
+    inicios = {}
+    canceladas = [threading.Event() for _ in itens]
+
+    def tarefa(posicao, item):
+        if limitador:
+            limitador.adquirir()
+        inicios[posicao] = time.monotonic()
+        _local.cancelada = canceladas[posicao]
+        try:
+            return funcao(item)
+        finally:
+            _local.cancelada = None
+
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    try:
+        pendentes = {executor.submit(tarefa, posicao, item): posicao for posicao, item in enumerate(itens)}
+
+        while pendentes:
+            concluidos, _ = wait(pendentes, timeout=0.05 if timeout else None, return_when=FIRST_COMPLETED)
+
+            for futuro in concluidos:
+                posicao = pendentes.pop(futuro)
+                try:
+                    resultados[posicao] = futuro.result()
+                except Exception:
+                    # print(f"Erro ao processar {itens[posicao]}: {e}")
+                    resultados[posicao] = None
+
+            if timeout:
+                # Requisições que passaram do tempo são abandonadas e ficam como None
+                agora = time.monotonic()
+                for futuro, posicao in list(pendentes.items()):
+                    if posicao in inicios and agora - inicios[posicao] > timeout:
+                        # print(f"Tempo esgotado para {itens[posicao]}")
+                        canceladas[posicao].set()
+                        futuro.cancel()
+                        del pendentes[futuro]
+                        if ao_expirar:
+                            ao_expirar(itens[posicao])
+    finally:
+        # Não aguarda threads abandonadas por timeout
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return resultados
@@ -0,0 +1,176 @@
+import os
+import re
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow é opcional, usado somente pelo armazenamento em parquet
+    pa = ds = pq = None
+
+
+# Colunas de valores, salvas no CSV como texto com virgula decimal
+COLUNAS_DECIMAIS = ['Close', 'Dividends', 'High', 'Low', 'Open']
+
+# Linhas por row group, o arquivo é ordenado por ticker para o filtro de tickers pular row groups
+LINHAS_ROW_GROUP = 4096
+
+
+def _exigir_pyarrow():
+    if pa is None:
+        raise ImportError('pyarrow não instalado. Instale com: pip install pyarrow')
+
+
+def esquema_historico():
+    """
+    Esquema tipado do historico de cotações no parquet.
+    """
+    _exigir_pyarrow()
+    return pa.schema([
+        ('Date', pa.timestamp('ns')),
+        ('Close', pa.float64()),
+        ('Dividends', pa.float64()),
+        ('High', pa.float64()),
+        ('Low', pa.float64()),
+        ('Open', pa.float64()),
+        ('Volume', pa.int64()),
+        ('Ticker', pa.string()),
+        ('Stock Splits', pa.float64()),
+    ])
+
+
+def _esquema_particao():
+    return pa.schema([('classe', pa.string()), ('ano', pa.int32()), ('mes', pa.int32())])
+
+
+def para_numerico(dfMes):
+    """
+    Garante os tipos do historico, convertendo valores em texto com virgula decimal quando existirem.
+    """
+    dfMes = dfMes.copy()
+    dfMes['Date'] = pd.to_datetime(dfMes['Date'])
+    for coluna in COLUNAS_DECIMAIS:
+        if not pd.api.types.is_numeric_dtype(dfMes[coluna]):
+            dfMes[coluna] = pd.to_numeric(
+                dfMes[coluna].astype(str).str.strip().str.replace(',', '.', regex=False), errors='coerce')
+    dfMes['Volume'] = pd.to_numeric(dfMes['Volume'], errors='coerce').fillna(0).astype('int64')
+    dfMes['Ticker'] = dfMes['Ticker'].astype(str)
+
+    # CSVs salvos antes da coluna de desdobramentos
+    if 'Stock Splits' not in dfMes.columns:
+        dfMes['Stock Splits'] = 0.0
+    elif not pd.api.types.is_numeric_dtype(dfMes['Stock Splits']):
+        dfMes['Stock Splits'] = pd.to_numeric(
+            dfMes['Stock Splits'].astype(str).str.strip().str.replace(',', '.', regex=False), errors='coerce')
+    dfMes['Stock Splits'] = dfMes['Stock Splits'].fillna(0.0)
+    return dfMes
+
+
+def caminho_particao(raiz, classe, data_mes):
+    """
+    Diretorio da partição 'classe=<classe>/ano=YYYY/mes=MM' do mês informado.
+    """
+    return os.path.join(raiz, f'classe={classe}', f'ano={data_mes.year}', f'mes={data_mes.month:02d}')
+
+
+def salvar_mes_parquet(dfMes, raiz, classe, data_mes):
+    """
+    Salva o mês na partição da classe de ativo, substituindo o conteudo anterior do mês.
+    O arquivo é escrito em um temporario e renomeado para não deixar partições incompletas.
+    """
+    _exigir_pyarrow()
+
+    dfMes = para_numerico(dfMes).sort_values(['Ticker', 'Date'], kind='stable')
+    tabela = pa.Table.from_pandas(dfMes[esquema_historico().names], schema=esquema_historico(),
+                                  preserve_index=False)
+
+    diretorio = caminho_particao(raiz, classe, data_mes)
+    os.makedirs(diretorio, exist_ok=True)
+    nome_arquivo = os.path.join(diretorio, 'historico.parquet')
+
+    pq.write_table(tabela, nome_arquivo + '.tmp', compression='zstd', row_group_size=LINHAS_ROW_GROUP)
+    os.replace(nome_arquivo + '.tmp', nome_arquivo)
+    return nome_arquivo
+
+
+def _filtro_periodo(inicio, fim):
+    """
+    Filtro por data incluindo as colunas de partição, permitindo descartar meses inteiros sem abrir os arquivos.
+    """
+    filtro = None
+    if inicio is not None:
+        inicio = pd.Timestamp(inicio)
+        filtro = ((ds.field('ano') > inicio.year) |
+                  ((ds.field('ano') == inicio.year) & (ds.field('mes') >= inicio.month))) & \
+            (ds.field('Date') >= pa.scalar(inicio.to_pydatetime(), pa.timestamp('ns')))
+    if fim is not None:
+        fim = pd.Timestamp(fim)
+        filtro_fim = ((ds.field('ano') < fim.year) |
+                      ((ds.field('ano') == fim.year) & (ds.field('mes') <= fim.month))) & \
+            (ds.field('Date') <= pa.scalar(fim.to_pydatetime(), pa.timestamp('ns')))
+        filtro = filtro_fim if filtro is None else filtro & filtro_fim
+    return filtro
+
+
+def ler_historico(raiz, classe=None, tickers=None, inicio=None, fim=None, colunas=None):
+    """
+    Le o historico em parquet aplicando os filtros direto na leitura.
+    Partições fora da classe/periodo não são abertas e row groups sem os tickers são descartados pelas estatisticas.
+
+    :param classe: Classe de ativo (ex.: 'Acoes_IBOV') ou lista de classes. None le todas.
+    :param tickers: Lista de tickers. None le todos.
+    :param inicio: Data inicial (inclusiva).
+    :param fim: Data final (inclusiva).
+    :param colunas: Colunas retornadas. None retorna todas as colunas do historico.
+    """
+    _exigir_pyarrow()
+
+    if not os.path.exists(raiz):
+        raise FileNotFoundError(f'Diretorio não encontrado: {raiz}')
+
+    dataset = ds.dataset(raiz, format='parquet', partitioning=ds.partitioning(_esquema_particao(), flavor='hive'),
+                         schema=pa.unify_schemas([esquema_historico(), _esquema_particao()]))
+
+    filtros = []
+    if classe is not None:
+        classes = [classe] if isinstance(classe, str) else list(classe)
+        filtros.append(ds.field('classe').isin(classes))
+    if tickers is not None:
+        filtros.append(ds.field('Ticker').isin(list(tickers)))
+    filtro_periodo = _filtro_periodo(inicio, fim)
+    if filtro_periodo is not None:
+        filtros.append(filtro_periodo)
+
+    filtro = None
+    for expressao in filtros:
+        filtro = expressao if filtro is None else filtro & expressao
+
+    colunas = list(colunas) if colunas is not None else esquema_historico().names
+    return dataset.to_table(columns=colunas, filter=filtro).to_pandas()
+
+
+def converter_csv_para_parquet(diretorio_csv, raiz, classe):
+    """
+    Converte todos os arquivos mensais '<prefixo>_MM_YYYY.csv' de um diretorio para o armazenamento em parquet.
+    Retorna a lista de arquivos parquet gerados.
+    """
+    if not os.path.exists(diretorio_csv):
+        raise FileNotFoundError(f'Diretorio não encontrado: {diretorio_csv}')
+
+    gerados = []
+    for arquivo in sorted(os.listdir(diretorio_csv)):
+        match = re.search(r"_(\d{2})_(\d{4})\.csv$", arquivo)
+        if not match:
+            continue
+
+        data_mes = pd.Timestamp(year=int(match.group(2)), month=int(match.group(1)), day=1)
+        dfMes = pd.read_csv(os.path.join(diretorio_csv, arquivo), sep=';', decimal=',', skipinitialspace=True,
+                            dtype={'Ticker': str})
+        if dfMes.empty:
+            continue
+
+        gerados.append(salvar_mes_parquet(dfMes, raiz, classe, data_mes))
+        # print(f'Convertido {arquivo}')
+
+    return gerados
@@ -0,0 +1,106 @@
+"""
+Micro-benchmark da formatação dos valores do historico.
+Compara o caminho antigo (texto com virgula decimal gerado celula a celula em cada ticker) com o atual
+(colunas numericas até o CSV e formatação vetorizada somente na escrita), para um mês sintetico de
+600 tickers x 21 pregões.
+
+Uso: python benchmarks/bench_formatacao.py [--tickers 600] [--dias 21] [--repeticoes 5]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from historico_cotacoes import COLUNAS_DECIMAIS, formatar_decimal_br
+
+
+def gerar_tickers(qtd_tickers, qtd_dias, semente=0):
+    """
+    Gera uma lista de DataFrames no formato de normalizar_historico, um por ticker.
+    """
+    rng = np.random.default_rng(semente)
+    datas = pd.bdate_range('2025-01-01', periods=qtd_dias)
+    dfTickers = []
+    for posicao in range(qtd_tickers):
+        fechamento = np.round(5 + rng.random(qtd_dias) * 100, 2)
+        dfTickers.append(pd.DataFrame({
+            'Date': datas,
+            'Close': fechamento,
+            'Dividends': np.where(rng.random(qtd_dias) < 0.02, 0.35, 0.0),
+            'High': np.round(fechamento * 1.02, 2),
+            'Low': np.round(fechamento * 0.98, 2),
+            'Open': np.round(fechamento * 1.005, 2),
+            'Volume': rng.integers(1_000, 10_000_000, qtd_dias),
+            'Ticker': f'T{posicao:04d}.SA',
+        }))
+    return dfTickers
+
+
+def caminho_antigo(dfTickers):
+    # Formatação por celula em cada ticker, concat e escrita de colunas object
+    formatados = []
+    for dfTicker in dfTickers:
+        dfTicker = dfTicker.copy()
+        dfTicker[COLUNAS_DECIMAIS] = dfTicker[COLUNAS_DECIMAIS].map(lambda x: f"{x: .2f}".replace('.', ','))
+        formatados.append(dfTicker)
+    dfMes = pd.concat(formatados, ignore_index=True)
+    saida = io.StringIO()
+    dfMes.to_csv(saida, sep=';', index=False)
+    return saida.getvalue()
+
+
+def caminho_atual(dfTickers):
+    # Concat de colunas numericas e uma formatação vetorizada por coluna na escrita
+    dfMes = pd.concat(dfTickers, ignore_index=True)
+    dfCsv = dfMes.assign(**{coluna: formatar_decimal_br(dfMes[coluna]) for coluna in COLUNAS_DECIMAIS})
+    saida = io.StringIO()
+    dfCsv.to_csv(saida, sep=';', index=False, date_format='%Y-%m-%d')
+    return saida.getvalue()
+
+
+def caminho_parquet(dfTickers):
+    # Formato binario: sem formatação de texto
+    dfMes = pd.concat(dfTickers, ignore_index=True)
+    saida = io.BytesIO()
+    dfMes.to_parquet(saida, index=False, compression='zstd')
+    return saida.getvalue()
+
+
+def medir(funcao, dfTickers, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao(dfTickers)
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tickers', type=int, default=600)
+    parser.add_argument('--dias', type=int, default=21)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    dfTickers = gerar_tickers(args.tickers, args.dias)
+    linhas = args.tickers * args.dias
+
+    tempo_antigo, csv_antigo = medir(caminho_antigo, dfTickers, args.repeticoes)
+    tempo_atual, csv_atual = medir(caminho_atual, dfTickers, args.repeticoes)
+    if csv_antigo != csv_atual:
+        raise AssertionError('Os CSVs gerados pelos dois caminhos são diferentes')
+
+    print(f'{args.tickers} tickers x {args.dias} dias = {linhas} linhas (melhor de {args.repeticoes})')
+    print(f'{"antigo (map por celula)":<28} {tempo_antigo * 1000:9.1f} ms')
+    print(f'{"atual (vetorizado no CSV)":<28} {tempo_atual * 1000:9.1f} ms  {tempo_antigo / tempo_atual:5.1f}x')
+
+    try:
+        tempo_parquet, _ = medir(caminho_parquet, dfTickers, args.repeticoes)
+        print(f'{"parquet (sem formatação)":<28} {tempo_parquet * 1000:9.1f} ms  {tempo_antigo / tempo_parquet:5.1f}x')
+    except ImportError:
+        print('parquet: pyarrow não instalado')
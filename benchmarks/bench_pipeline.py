@@ -0,0 +1,221 @@
+"""
+Benchmark offline do pipeline de ingestão: download (yf.download sintetico), transformação e gravação do
+historico de cotações, extração da tabela do DataCom e leitura dos indicadores do Status Invest.
+Nenhuma etapa acessa a rede: as cotações são geradas por um downloader sintetico compativel com yf.download
+e os scrapers usam os arquivos de benchmarks/fixtures.
+
+Para cada etapa mostra o tempo (melhor de N repetições), linhas/s e o pico de memoria (tracemalloc).
+Os resultados podem ser salvos como baseline e comparados entre versões.
+
+Uso:
+    python benchmarks/bench_pipeline.py [--tickers 600] [--meses 84] [--repeticoes 3]
+    python benchmarks/bench_pipeline.py --salvar-baseline v1
+    python benchmarks/bench_pipeline.py --comparar v1 [--tolerancia 0.2]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+DIRETORIO_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(DIRETORIO_BENCHMARKS))
+# Downloader sintetico e driver do DataCom compartilhados com os testes
+sys.path.insert(0, os.path.join(os.path.dirname(DIRETORIO_BENCHMARKS), 'tests'))
+
+from historico_cotacoes import PlanoHistorico, baixar_planos, obter_historico, obter_historico_lote
+from leitor_indicadores import carregar_indicadores, ler_indicadores
+from substitutos import DownloaderSintetico, DriverFixture, EsperaImediata
+
+DIRETORIO_FIXTURES = os.path.join(DIRETORIO_BENCHMARKS, 'fixtures')
+DIRETORIO_BASELINES = os.path.join(DIRETORIO_BENCHMARKS, 'baselines')
+FIXTURE_DATACOM = os.path.join(DIRETORIO_FIXTURES, 'datacom_calendario.html')
+FIXTURE_INDICADORES = os.path.join(os.path.dirname(DIRETORIO_BENCHMARKS), 'statusinvest-busca-avancada.csv')
+
+
+def gerar_html_datacom(qtd_eventos, semente=0):
+    """
+    HTML no formato do calendario de proventos do Investing.com com `qtd_eventos` linhas.
+    """
+    rng = np.random.default_rng(semente)
+    linhas = []
+    for posicao in range(qtd_eventos):
+        if posicao % 25 == 0:
+            linhas.append(f'<tr><td colspan="7" class="theDay">dia {posicao // 25 + 1}</td></tr>')
+        ticker = f'T{posicao % 600:03d}{3 + posicao % 2}'
+        data = pd.Timestamp('2025-01-02') + pd.Timedelta(days=posicao // 25)
+        dividendo = f'{rng.random():.4f}'.replace('.', ',')
+        linhas.append(
+            '<tr><td class="flag"><span title="Brasil"></span></td>'
+            f'<td class="left noWrap"><span class="earnCalCompanyName">Empresa {posicao}</span>&nbsp;'
+            f'(<a href="/equities/{ticker.lower()}">{ticker}</a>)</td>'
+            f'<td>{data:%d.%m.%Y}</td><td>{dividendo}</td><td><span class="divIcon"></span></td>'
+            f'<td>{data + pd.Timedelta(days=30):%d.%m.%Y}</td><td>{rng.random() * 10:.2f}%</td></tr>')
+    return ('<html><body><table id="dividendsCalendarData" class="genTbl closedTbl">'
+            '<thead><tr><th></th><th>Empresa</th><th>Data ex</th><th>Dividendo</th><th>Tipo</th>'
+            f'<th>Pagamento</th><th>Rendimento</th></tr></thead><tbody>{"".join(linhas)}</tbody></table>'
+            '</body></html>')
+
+
+def medir(funcao, repeticoes):
+    """
+    Executa a etapa `repeticoes` vezes e retorna (melhor tempo, resultado). O pico de memoria é medido em uma
+    execução extra com tracemalloc, para não somar o custo do rastreamento aos tempos.
+    """
+    tempos = []
+    resultado = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+
+    tracemalloc.start()
+    funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(tempos), pico, resultado
+
+
+def etapas(args, diretorio_trabalho):
+    """
+    Lista de (nome, função que executa a etapa e retorna a quantidade de linhas processadas).
+    """
+    downloader = DownloaderSintetico()
+    tickers = [f'T{posicao:04d}.SA' for posicao in range(args.tickers)]
+    fim = pd.Timestamp('2025-01-01')
+    inicio_backfill = fim - pd.DateOffset(months=args.meses)
+    inicio_mes = fim - pd.DateOffset(months=1)
+
+    def obter_por_ticker():
+        amostra = tickers[:args.amostra_por_ticker]
+        return sum(len(obter_historico(inicio_mes, fim, ticker, downloader=downloader)) for ticker in amostra)
+
+    def obter_lote():
+        return len(obter_historico_lote(inicio_mes, fim, tickers, downloader=downloader))
+
+    def plano_backfill():
+        # Diretorio vazio: todos os tickers entram no universo e recebem o historico completo
+        diretorio = tempfile.mkdtemp(dir=diretorio_trabalho)
+        data_inicial = inicio_backfill.strftime('%Y-%m-%d')
+        return PlanoHistorico(data_inicial, diretorio, 'Bench', tickers, data_backfill=data_inicial,
+                              agora=fim.to_pydatetime())
+
+    baixados = {}
+
+    def backfill_download():
+        plano = plano_backfill()
+        dfNovos, = baixar_planos([plano], tamanho_lote=100, downloader=downloader)
+        shutil.rmtree(plano.diretorio, ignore_errors=True)
+        baixados['dfNovos'] = dfNovos
+        return sum(len(dfHistorico) for dfHistorico in dfNovos if dfHistorico is not None)
+
+    def backfill_gravacao():
+        # Concat, separação por mês e gravação dos CSVs mensais e do manifesto
+        plano = plano_backfill()
+        plano.gravar(baixados['dfNovos'])
+        shutil.rmtree(plano.diretorio, ignore_errors=True)
+        return sum(len(dfHistorico) for dfHistorico in baixados['dfNovos'] if dfHistorico is not None)
+
+    with open(FIXTURE_DATACOM, encoding='utf-8') as arquivo:
+        html = arquivo.read()
+
+    def tabela_datacom():
+        from Main_DataCom import extract_table_data
+        driver = DriverFixture(html)
+        return len(extract_table_data(driver, EsperaImediata(driver)))
+
+    def indicadores_parser():
+        return len(ler_indicadores(FIXTURE_INDICADORES))
+
+    diretorio_cache = os.path.join(diretorio_trabalho, 'cache')
+    carregar_indicadores(FIXTURE_INDICADORES, diretorio_cache=diretorio_cache)
+
+    def indicadores_cache():
+        return len(carregar_indicadores(FIXTURE_INDICADORES, diretorio_cache=diretorio_cache))
+
+    return [
+        ('obter_historico (por ticker, 1 mês)', obter_por_ticker),
+        ('obter_historico_lote (1 mês)', obter_lote),
+        (f'baixar_planos (backfill {args.meses} meses)', backfill_download),
+        (f'PlanoHistorico.gravar ({args.meses} meses)', backfill_gravacao),
+        ('extract_table_data (fixture html)', tabela_datacom),
+        ('ler_indicadores (csv)', indicadores_parser),
+        ('carregar_indicadores (cache)', indicadores_cache),
+    ]
+
+
+def comparar(resultados, baseline, tolerancia):
+    """
+    Compara os tempos com a baseline. Retorna as etapas mais lentas que a tolerancia.
+    """
+    regressoes = []
+    for nome, atual in resultados.items():
+        anterior = baseline['etapas'].get(nome)
+        if anterior is None:
+            print(f'{nome:<42} sem baseline')
+            continue
+        variacao = atual['segundos'] / anterior['segundos'] - 1
+        situacao = 'REGRESSÃO' if variacao > tolerancia else 'ok'
+        print(f'{nome:<42} {anterior["segundos"] * 1000:9.1f} ms -> {atual["segundos"] * 1000:9.1f} ms '
+              f'{variacao:+7.1%}  {situacao}')
+        if variacao > tolerancia:
+            regressoes.append(nome)
+    return regressoes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tickers', type=int, default=600)
+    parser.add_argument('--meses', type=int, default=84)
+    parser.add_argument('--amostra-por-ticker', type=int, default=100,
+                        help='Tickers consultados um a um na etapa por ticker')
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--salvar-baseline', metavar='NOME')
+    parser.add_argument('--comparar', metavar='NOME')
+    parser.add_argument('--tolerancia', type=float, default=0.2, help='Aumento de tempo aceito (0.2 = 20%%)')
+    parser.add_argument('--gerar-fixtures', action='store_true', help='Regrava o HTML de exemplo do DataCom')
+    args = parser.parse_args()
+
+    if args.gerar_fixtures or not os.path.exists(FIXTURE_DATACOM):
+        os.makedirs(DIRETORIO_FIXTURES, exist_ok=True)
+        with open(FIXTURE_DATACOM, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(gerar_html_datacom(500))
+
+    diretorio_trabalho = tempfile.mkdtemp(prefix='bench_pipeline_')
+    resultados = {}
+    try:
+        print(f'{args.tickers} tickers, {args.meses} meses, melhor de {args.repeticoes}')
+        for nome, funcao in etapas(args, diretorio_trabalho):
+            segundos, pico, linhas = medir(funcao, args.repeticoes)
+            resultados[nome] = {'segundos': segundos, 'linhas': linhas, 'linhas_por_s': linhas / segundos,
+                                'pico_mb': pico / 2 ** 20}
+            print(f'{nome:<42} {segundos * 1000:9.1f} ms {linhas / segundos:12,.0f} linhas/s '
+                  f'{pico / 2 ** 20:8.1f} MB')
+    finally:
+        shutil.rmtree(diretorio_trabalho, ignore_errors=True)
+
+    if args.salvar_baseline:
+        os.makedirs(DIRETORIO_BASELINES, exist_ok=True)
+        caminho = os.path.join(DIRETORIO_BASELINES, f'{args.salvar_baseline}.json')
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            json.dump({'parametros': {'tickers': args.tickers, 'meses': args.meses,
+                                      'amostra_por_ticker': args.amostra_por_ticker},
+                       'ambiente': {'python': platform.python_version(), 'pandas': pd.__version__,
+                                    'numpy': np.__version__, 'maquina': platform.machine()},
+                       'etapas': resultados}, arquivo, indent=2, ensure_ascii=False)
+        print(f'Baseline salva em: {caminho}')
+
+    if args.comparar:
+        with open(os.path.join(DIRETORIO_BASELINES, f'{args.comparar}.json'), encoding='utf-8') as arquivo:
+            baseline = json.load(arquivo)
+        if baseline['parametros'] != {'tickers': args.tickers, 'meses': args.meses,
+                                      'amostra_por_ticker': args.amostra_por_ticker}:
+            print(f'Atenção: baseline gerada com outros parametros {baseline["parametros"]}')
+        if comparar(resultados, baseline, args.tolerancia):
+            sys.exit(1)
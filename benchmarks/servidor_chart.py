@@ -0,0 +1,206 @@
+"""
+Servidor HTTP local que substitui o endpoint de grafico do Yahoo (/v8/finance/chart/<ticker>) para testar e medir o
+coletor assincrono sem acessar a rede. Cada ticker é lido de '<diretorio>/<ticker>.json' (respostas gravadas com
+ColetorYahooAsync(diretorio_gravacao=...) ou geradas com --gerar), filtrado pelo periodo pedido, e respondido
+depois de `latencia` segundos. Tickers sem arquivo recebem 404 com o erro no JSON, como no Yahoo.
+
+benchmarks/fixtures/chart traz as respostas de 2024 de PETR4, VALE3 e ITUB4 (geradas com
+--gerar-tickers PETR4.SA VALE3.SA ITUB4.SA --inicio 2024-01-01 --fim 2025-01-01) e VAZIO3.SA, sem resultado,
+usadas por tests/test_coletor_yahoo_async.py.
+
+Uso:
+    python benchmarks/servidor_chart.py --gerar 600 --diretorio /tmp/chart
+    python benchmarks/servidor_chart.py --latencia 0.15 --porta 8765
+    python benchmarks/servidor_chart.py --medir 600 --diretorio /tmp/chart --latencia 0.15 [--simultaneas 16]
+"""
+import argparse
+import bisect
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pandas as pd
+
+DIRETORIO_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(DIRETORIO_BENCHMARKS))
+sys.path.insert(0, os.path.join(os.path.dirname(DIRETORIO_BENCHMARKS), 'tests'))
+
+from substitutos import DownloaderSintetico
+
+DIRETORIO_PADRAO = os.path.join(DIRETORIO_BENCHMARKS, 'fixtures', 'chart')
+
+
+def gerar_resposta(ticker, inicio='2018-01-01', fim='2025-01-01'):
+    """
+    Resposta no formato do endpoint de grafico com as cotações do DownloaderSintetico (tests/substitutos.py):
+    barras diarias às 10h de Brasilia (13h UTC) e proventos como eventos. O coletor assincrono deve obter os mesmos
+    valores que obter_historico com o DownloaderSintetico.
+    """
+    dfTicker = DownloaderSintetico.serie(ticker, inicio, fim)
+    timestamps = ((dfTicker.index + pd.Timedelta(hours=13)).asi8 // 10 ** 9).tolist()
+
+    proventos = {str(ts): {'amount': valor, 'date': ts}
+                 for ts, valor in zip(timestamps, dfTicker['Dividends'].tolist()) if valor > 0}
+    desdobramentos = {str(ts): {'date': ts, 'numerator': float(valor), 'denominator': 1.0,
+                                'splitRatio': f'{valor:g}:1'}
+                      for ts, valor in zip(timestamps, dfTicker['Stock Splits'].tolist()) if valor > 0}
+    return {'chart': {'result': [{
+        'meta': {'currency': 'BRL', 'symbol': ticker, 'exchangeName': 'SAO', 'instrumentType': 'EQUITY',
+                 'gmtoffset': -10800, 'timezone': 'BRT', 'exchangeTimezoneName': 'America/Sao_Paulo',
+                 'dataGranularity': '1d'},
+        'timestamp': timestamps,
+        'events': {'dividends': proventos, 'splits': desdobramentos},
+        'indicators': {'quote': [{'open': dfTicker['Open'].round(2).tolist(),
+                                  'high': dfTicker['High'].round(2).tolist(),
+                                  'low': dfTicker['Low'].round(2).tolist(),
+                                  'close': dfTicker['Close'].tolist(),
+                                  'volume': dfTicker['Volume'].tolist()}],
+                       'adjclose': [{'adjclose': dfTicker['Close'].tolist()}]},
+    }], 'error': None}}
+
+
+def filtrar_periodo(conteudo, period1, period2):
+    """
+    Mantém somente as barras e eventos com timestamp em [period1, period2), como o Yahoo faz (timestamps em ordem).
+    """
+    if not conteudo['chart'].get('result'):
+        return conteudo
+    resultado = conteudo['chart']['result'][0]
+    timestamps = resultado.get('timestamp', [])
+    inicio, fim = bisect.bisect_left(timestamps, period1), bisect.bisect_left(timestamps, period2)
+
+    filtrado = dict(resultado)
+    filtrado['timestamp'] = timestamps[inicio:fim]
+    filtrado['indicators'] = {nome: [{chave: valores[inicio:fim] for chave, valores in serie[0].items()}]
+                              for nome, serie in resultado['indicators'].items()}
+    filtrado['events'] = {tipo: {chave: evento for chave, evento in eventos.items()
+                                 if period1 <= evento['date'] < period2}
+                          for tipo, eventos in resultado.get('events', {}).items()}
+    if not filtrado['timestamp']:
+        filtrado.pop('timestamp')
+    return {'chart': {'result': [filtrado], 'error': None}}
+
+
+def criar_servidor(diretorio=DIRETORIO_PADRAO, latencia=0.0, variacao=0.0, porta=0):
+    """
+    Cria o servidor (ainda parado). Cada resposta espera latencia ± variacao segundos.
+    servidor.simultaneas guarda as requisições em andamento ('atual') e o maior valor observado ('pico').
+    Retorna (servidor, url_base).
+    """
+    respostas = {}
+    trava = threading.Lock()
+    simultaneas = {'atual': 0, 'pico': 0}
+
+    def carregar(ticker):
+        with trava:
+            if ticker not in respostas:
+                caminho = os.path.join(diretorio, f'{ticker}.json')
+                respostas[ticker] = None
+                if os.path.exists(caminho):
+                    with open(caminho, encoding='utf-8') as arquivo:
+                        respostas[ticker] = json.load(arquivo)
+            return respostas[ticker]
+
+    class Manipulador(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            with trava:
+                simultaneas['atual'] += 1
+                simultaneas['pico'] = max(simultaneas['pico'], simultaneas['atual'])
+            try:
+                self.responder()
+            finally:
+                with trava:
+                    simultaneas['atual'] -= 1
+
+        def responder(self):
+            url = urlparse(self.path)
+            parametros = parse_qs(url.query)
+            ticker = url.path.rsplit('/', 1)[-1]
+            time.sleep(max(0.0, latencia + random.uniform(-variacao, variacao)))
+
+            conteudo = carregar(ticker) if url.path.startswith('/v8/finance/chart/') else None
+            if conteudo is None:
+                status = 404
+                corpo = {'chart': {'result': None, 'error': {'code': 'Not Found',
+                                                             'description': 'No data found, symbol may be delisted'}}}
+            else:
+                status = 200
+                corpo = filtrar_periodo(conteudo, int(parametros.get('period1', [0])[0]),
+                                        int(parametros.get('period2', [2 ** 40])[0]))
+
+            dados = json.dumps(corpo).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(('127.0.0.1', porta), Manipulador)
+    servidor.daemon_threads = True
+    servidor.simultaneas = simultaneas
+    return servidor, f'http://127.0.0.1:{servidor.server_address[1]}'
+
+
+def iniciar_servidor(**kwargs):
+    """
+    Inicia o servidor em uma thread de fundo. Retorna (servidor, url_base), pare com servidor.shutdown().
+    """
+    servidor, url_base = criar_servidor(**kwargs)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, url_base
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--diretorio', default=DIRETORIO_PADRAO)
+    parser.add_argument('--porta', type=int, default=8765)
+    parser.add_argument('--latencia', type=float, default=0.0, help='Segundos de espera de cada resposta')
+    parser.add_argument('--variacao', type=float, default=0.0, help='Variação aleatoria da latencia (segundos)')
+    parser.add_argument('--gerar', type=int, metavar='TICKERS', help='Gera respostas sinteticas e sai')
+    parser.add_argument('--gerar-tickers', nargs='+', metavar='TICKER', help='Gera as respostas destes tickers')
+    parser.add_argument('--inicio', default='2018-01-01', help='Primeiro dia das respostas geradas')
+    parser.add_argument('--fim', default='2025-01-01', help='Dia seguinte ao ultimo das respostas geradas')
+    parser.add_argument('--medir', type=int, metavar='TICKERS', help='Mede o coletor assincrono contra o servidor')
+    parser.add_argument('--simultaneas', type=int, default=16)
+    args = parser.parse_args()
+
+    tickers = args.gerar_tickers or [f'T{posicao:04d}.SA' for posicao in range(args.gerar or args.medir or 0)]
+
+    if args.gerar or args.gerar_tickers:
+        os.makedirs(args.diretorio, exist_ok=True)
+        for ticker in tickers:
+            with open(os.path.join(args.diretorio, f'{ticker}.json'), 'w', encoding='utf-8') as arquivo:
+                json.dump(gerar_resposta(ticker, args.inicio, args.fim), arquivo)
+        print(f'{len(tickers)} respostas geradas em {args.diretorio}')
+
+    elif args.medir:
+        from coletor_yahoo_async import ColetorYahooAsync
+
+        servidor, url_base = iniciar_servidor(diretorio=args.diretorio, latencia=args.latencia,
+                                              variacao=args.variacao)
+        try:
+            coletor = ColetorYahooAsync(url_base=url_base, max_simultaneas=args.simultaneas)
+            inicio = time.perf_counter()
+            resultados = coletor.baixar([(ticker, '2024-01-01', '2025-01-01') for ticker in tickers])
+            segundos = time.perf_counter() - inicio
+        finally:
+            servidor.shutdown()
+
+        linhas = sum(len(dfTicker) for dfTicker in resultados if dfTicker is not None)
+        print(f'{len(tickers)} tickers em {segundos:.2f}s ({len(tickers) / segundos:.1f} tickers/s, {linhas} linhas), '
+              f'{len(coletor.falhas)} falhas, latencia {args.latencia}s, {args.simultaneas} simultaneas '
+              f'(pico no servidor: {servidor.simultaneas["pico"]})')
+
+    else:
+        servidor, url_base = criar_servidor(args.diretorio, args.latencia, args.variacao, args.porta)
+        print(f'Servindo {args.diretorio} em {url_base}')
+        servidor.serve_forever()
@@ -0,0 +1,77 @@
+"""
+Servidor HTTP local que substitui o calendario de dividendos do Investing (/dividends-calendar/) com a pagina
+salva em fixtures, para executar a extração da tabela (SCRIPT_TABELA no navegador e o fallback pelo lxml)
+contra HTML real sem acessar a rede. A pagina salva não tem os filtros de países e datas, somente a tabela.
+
+Uso:
+    python benchmarks/servidor_datacom.py --porta 8767
+    (em outro terminal) driver.get('http://127.0.0.1:8767/dividends-calendar/')
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+DIRETORIO_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(DIRETORIO_BENCHMARKS))
+
+from Main_DataCom import URL_DATACOM  # noqa: E402
+
+ARQUIVO_PADRAO = os.path.join(DIRETORIO_BENCHMARKS, 'fixtures', 'datacom_calendario.html')
+
+# Mesmo caminho da pagina original, para a url do servidor substituir URL_DATACOM
+CAMINHO_CALENDARIO = urlparse(URL_DATACOM).path
+
+
+def criar_servidor(arquivo=ARQUIVO_PADRAO, latencia=0.0, porta=0):
+    """
+    Cria o servidor (ainda parado). Retorna (servidor, url do calendario).
+    """
+
+    class Manipulador(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            time.sleep(latencia)
+            if urlparse(self.path).path != CAMINHO_CALENDARIO:
+                status, tipo, dados = 404, 'text/plain', b'Not Found'
+            else:
+                with open(arquivo, 'rb') as pagina:
+                    status, tipo, dados = 200, 'text/html; charset=utf-8', pagina.read()
+
+            self.send_response(status)
+            self.send_header('Content-Type', tipo)
+            self.send_header('Content-Length', str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(('127.0.0.1', porta), Manipulador)
+    servidor.daemon_threads = True
+    return servidor, f'http://127.0.0.1:{servidor.server_address[1]}{CAMINHO_CALENDARIO}'
+
+
+def iniciar_servidor(**kwargs):
+    """
+    Inicia o servidor em uma thread de fundo. Retorna (servidor, url), pare com servidor.shutdown().
+    """
+    servidor, url = criar_servidor(**kwargs)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, url
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--porta', type=int, default=8767)
+    parser.add_argument('--latencia', type=float, default=0.0, help='Segundos de espera de cada resposta')
+    parser.add_argument('--arquivo', default=ARQUIVO_PADRAO, help='Pagina HTML servida')
+    args = parser.parse_args()
+
+    servidor, url = criar_servidor(arquivo=args.arquivo, latencia=args.latencia, porta=args.porta)
+    print(f'Servindo o calendario de dividendos em {url}')
+    servidor.serve_forever()
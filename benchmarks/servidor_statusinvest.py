@@ -0,0 +1,91 @@
+"""
+Servidor HTTP local que substitui a exportação da busca avançada do Status Invest
+(/category/advancedsearchresultexport) para testar indicadores_http sem acessar a rede. Cada classe de ativo
+responde com o CSV de exemplo correspondente, depois de `latencia` segundos.
+
+Uso:
+    python benchmarks/servidor_statusinvest.py --latencia 0.5 --porta 8766
+    (em outro terminal) baixar_indicadores('acoes', destino, url_base='http://127.0.0.1:8766')
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DIRETORIO_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(DIRETORIO_BENCHMARKS))
+
+from indicadores_http import CAMINHO_EXPORTACAO, CATEGORIAS  # noqa: E402
+
+# CSVs de exemplo: o arquivo de ações baixado pelo navegador, na raiz do projeto, e um de fundos imobiliarios
+ARQUIVOS_PADRAO = {
+    'acoes': os.path.join(os.path.dirname(DIRETORIO_BENCHMARKS), 'statusinvest-busca-avancada.csv'),
+    'fii': os.path.join(DIRETORIO_BENCHMARKS, 'fixtures', 'statusinvest_fii.csv'),
+}
+
+# Pagina devolvida no modo bloqueio, como o Status Invest responde a requisições recusadas
+PAGINA_BLOQUEIO = b'<!DOCTYPE html><html><head><title>Just a moment...</title></head><body></body></html>'
+
+
+def criar_servidor(arquivos=None, latencia=0.0, bloqueio=False, porta=0):
+    """
+    Cria o servidor (ainda parado). Retorna (servidor, url_base).
+
+    :param arquivos: {classe: caminho do CSV} (padrão: ARQUIVOS_PADRAO).
+    :param bloqueio: Responde todas as exportações com uma pagina HTML, como em um bloqueio do site.
+    """
+    arquivos = arquivos or ARQUIVOS_PADRAO
+    classes = {str(categoria): classe for classe, categoria in CATEGORIAS.items()}
+
+    class Manipulador(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            classe = classes.get(parse_qs(url.query).get('CategoryType', [''])[0])
+            time.sleep(latencia)
+
+            if url.path != CAMINHO_EXPORTACAO or classe not in arquivos:
+                status, tipo, dados = 404, 'text/plain', b'Not Found'
+            elif bloqueio:
+                status, tipo, dados = 200, 'text/html', PAGINA_BLOQUEIO
+            else:
+                with open(arquivos[classe], 'rb') as arquivo:
+                    status, tipo, dados = 200, 'text/csv', arquivo.read()
+
+            self.send_response(status)
+            self.send_header('Content-Type', tipo)
+            self.send_header('Content-Length', str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(('127.0.0.1', porta), Manipulador)
+    servidor.daemon_threads = True
+    return servidor, f'http://127.0.0.1:{servidor.server_address[1]}'
+
+
+def iniciar_servidor(**kwargs):
+    """
+    Inicia o servidor em uma thread de fundo. Retorna (servidor, url_base), pare com servidor.shutdown().
+    """
+    servidor, url_base = criar_servidor(**kwargs)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, url_base
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--porta', type=int, default=8766)
+    parser.add_argument('--latencia', type=float, default=0.0, help='Segundos de espera de cada resposta')
+    parser.add_argument('--bloqueio', action='store_true', help='Responde com a pagina HTML de bloqueio')
+    args = parser.parse_args()
+
+    servidor, url_base = criar_servidor(latencia=args.latencia, bloqueio=args.bloqueio, porta=args.porta)
+    print(f'Servindo a exportação do Status Invest em {url_base}')
+    servidor.serve_forever()
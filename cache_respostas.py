@@ -0,0 +1,266 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+from datetime import datetime
+import pandas as pd
+from metricas import METRICAS_NULAS
+
+
+# Tamanho máximo padrão do cache em disco (bytes), os arquivos menos usados são removidos acima dele
+TAMANHO_MAXIMO_PADRAO = 512 * 2 ** 20
+
+# Validade em segundos das respostas que incluem o mês atual, ainda sujeitas a mudança
+TTL_MES_ATUAL = 15 * 60
+
+# Versão do formato dos arquivos, alterar quando o conteudo salvo mudar para invalidar os antigos
+VERSAO_CACHE = 2
+
+
+def meses_periodo(inicio, fim):
+    """
+    Meses (pd.Period) com alguma data no intervalo [inicio, fim).
+    """
+    return pd.period_range(pd.Timestamp(inicio).to_period('M'), (pd.Timestamp(fim) - pd.Timedelta(1)).to_period('M'),
+                           freq='M')
+
+
+def fatiar(dfTicker, inicio, fim):
+    """
+    Linhas do DataFrame (indexado por data) no intervalo [inicio, fim).
+    """
+    inicio, fim = pd.Timestamp(inicio), pd.Timestamp(fim)
+    fuso = getattr(dfTicker.index, 'tz', None)
+    if fuso is not None:
+        inicio, fim = (data.tz_localize(fuso) if data.tz is None else data.tz_convert(fuso) for data in (inicio, fim))
+    return dfTicker[(dfTicker.index >= inicio) & (dfTicker.index < fim)]
+
+
+def periodo_fechado(fim, agora=None):
+    """
+    True se o intervalo [inicio, fim) termina antes do mês atual: os dados desses meses não mudam mais.
+    """
+    if fim is None:
+        return False
+    agora = agora or datetime.now()
+    return pd.Timestamp(fim) <= pd.Timestamp(agora.year, agora.month, 1)
+
+
+class CacheRespostas:
+    """
+    Cache em disco das respostas do yfinance, compatível com yf.download (use no lugar do downloader).
+    Cada consulta é dividida em meses e cada mês de cada ticker é guardado com a chave (ticker, interval, mês):
+    consultas com outro inicio ou fim reaproveitam os meses já guardados. Meses fechados são permanentes e o mês
+    atual vale por `ttl_mes_atual` segundos. Somente os meses ausentes são baixados, em uma unica chamada por
+    grupo de tickers com os mesmos meses ausentes, sempre do inicio do primeiro ao fim do ultimo mês ausente.
+    Consultas sem start ou end não são guardadas.
+    O tamanho total é limitado por `tamanho_maximo` removendo os arquivos usados há mais tempo (LRU).
+
+    :param downloader: Função compatível com yf.download que faz o download de verdade.
+    :param metricas: metricas.Metricas da execução, recebe os contadores cache_acertos e cache_faltas
+        (pares ticker, mês).
+    """
+
+    def __init__(self, diretorio, downloader, tamanho_maximo=TAMANHO_MAXIMO_PADRAO, ttl_mes_atual=TTL_MES_ATUAL,
+                 metricas=None, relogio=time.time):
+        self.diretorio = diretorio
+        self.downloader = downloader
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl_mes_atual = ttl_mes_atual
+        self.metricas = metricas or METRICAS_NULAS
+        self.relogio = relogio
+        self.acertos = 0
+        self.faltas = 0
+        self.removidos = 0
+        self._trava = threading.Lock()
+
+        # Tamanho e ultimo uso (mtime) de cada arquivo, usados na remoção LRU
+        self._arquivos = {}
+        os.makedirs(diretorio, exist_ok=True)
+        for raiz, _, arquivos in os.walk(diretorio):
+            for arquivo in arquivos:
+                if arquivo.endswith('.pkl'):
+                    caminho = os.path.join(raiz, arquivo)
+                    estado = os.stat(caminho)
+                    self._arquivos[caminho] = (estado.st_size, estado.st_mtime)
+
+    def tamanho(self):
+        return sum(tamanho for tamanho, _ in self._arquivos.values())
+
+    def _caminho(self, ticker, interval, mes, variante):
+        chave = f'v{VERSAO_CACHE}|{ticker}|{interval}|{mes.strftime("%Y-%m")}|{variante}'
+        resumo = hashlib.sha1(chave.encode()).hexdigest()
+        return os.path.join(self.diretorio, resumo[:2], f'{resumo}.pkl')
+
+    def _ler(self, caminho):
+        with self._trava:
+            if caminho not in self._arquivos:
+                return None
+        try:
+            with open(caminho, 'rb') as arquivo:
+                conteudo = pickle.load(arquivo)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self._remover(caminho)
+            return None
+
+        if conteudo['expira_em'] is not None and conteudo['expira_em'] <= self.relogio():
+            self._remover(caminho)
+            return None
+
+        # Marca o arquivo como usado agora (ordem do LRU)
+        agora = self.relogio()
+        try:
+            os.utime(caminho, (agora, agora))
+        except OSError:
+            pass
+        with self._trava:
+            if caminho in self._arquivos:
+                self._arquivos[caminho] = (self._arquivos[caminho][0], agora)
+        return conteudo['dados']
+
+    def _gravar(self, caminho, dados, permanente):
+        conteudo = {'dados': dados, 'expira_em': None if permanente else self.relogio() + self.ttl_mes_atual}
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        temporario = f'{caminho}.{threading.get_ident()}.tmp'
+        with open(temporario, 'wb') as arquivo:
+            pickle.dump(conteudo, arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporario, caminho)
+
+        with self._trava:
+            self._arquivos[caminho] = (os.path.getsize(caminho), self.relogio())
+        self._limitar_tamanho()
+
+    def _remover(self, caminho):
+        with self._trava:
+            self._arquivos.pop(caminho, None)
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+
+    def _limitar_tamanho(self):
+        """
+        Remove os arquivos usados há mais tempo até o cache ficar dentro do tamanho máximo.
+        """
+        with self._trava:
+            total = sum(tamanho for tamanho, _ in self._arquivos.values())
+            if total <= self.tamanho_maximo:
+                return
+            excedentes = []
+            for caminho, (tamanho, _) in sorted(self._arquivos.items(), key=lambda item: item[1][1]):
+                if total <= self.tamanho_maximo:
+                    break
+                excedentes.append(caminho)
+                total -= tamanho
+            for caminho in excedentes:
+                del self._arquivos[caminho]
+            self.removidos += len(excedentes)
+
+        for caminho in excedentes:
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+
+    def _contar(self, acertos, faltas):
+        with self._trava:
+            self.acertos += acertos
+            self.faltas += faltas
+        self.metricas.contar('cache_acertos', acertos)
+        self.metricas.contar('cache_faltas', faltas)
+
+    def _baixar(self, tickers, inicio, fim, unico, interval, group_by, kwargs):
+        """
+        Baixa o intervalo dos tickers. Retorna {ticker: DataFrame com colunas simples}, sem os tickers vazios.
+        """
+        dfLote = self.downloader(tickers[0] if unico else tickers, start=inicio.to_pydatetime(),
+                                 end=fim.to_pydatetime(), interval=interval, group_by=group_by, **kwargs)
+        if dfLote is None or dfLote.empty:
+            return {}
+
+        if unico:
+            # yf.download com multi_level_index traz o ticker como nivel das colunas
+            if dfLote.columns.nlevels > 1:
+                dfLote = dfLote.droplevel(0 if group_by == 'ticker' else 1, axis=1)
+            return {tickers[0]: dfLote}
+
+        if group_by != 'ticker':
+            dfLote = dfLote.swaplevel(axis=1)
+        dfTickers = {ticker: dfLote[ticker].dropna(how='all')
+                     for ticker in set(dfLote.columns.get_level_values(0)) & set(tickers)}
+        return {ticker: dfTicker for ticker, dfTicker in dfTickers.items() if not dfTicker.empty}
+
+    def __call__(self, tickers, start=None, end=None, interval='1d', group_by='column', **kwargs):
+        if start is None or end is None or pd.Timestamp(start) >= pd.Timestamp(end):
+            return self.downloader(tickers, start=start, end=end, interval=interval, group_by=group_by, **kwargs)
+
+        agora = datetime.fromtimestamp(self.relogio())
+        unico = isinstance(tickers, str)
+        lista = [tickers] if unico else list(tickers)
+        meses = meses_periodo(start, end)
+        variante = f'actions={kwargs.get("actions", True)}|auto_adjust={kwargs.get("auto_adjust")}'
+
+        # Meses de cada ticker guardados no cache
+        partes = {ticker: {} for ticker in lista}
+        ausentes = {}
+        for ticker in lista:
+            for mes in meses:
+                dfMes = self._ler(self._caminho(ticker, interval, mes, variante))
+                if dfMes is None:
+                    ausentes.setdefault(ticker, []).append(mes)
+                else:
+                    partes[ticker][mes] = dfMes
+        faltas = sum(len(meses_ticker) for meses_ticker in ausentes.values())
+        self._contar(len(lista) * len(meses) - faltas, faltas)
+
+        # Tickers com os mesmos meses ausentes são baixados juntos. Um ticker sem nenhuma linha não é guardado
+        # (pode ser um erro que o yf.download não repassou), um mês vazio de um ticker com dados é guardado vazio
+        grupos = {}
+        for ticker, meses_ticker in ausentes.items():
+            grupos.setdefault((meses_ticker[0], meses_ticker[-1]), []).append(ticker)
+        for (primeiro, ultimo), pendentes in grupos.items():
+            baixados = self._baixar(pendentes, primeiro.start_time, (ultimo + 1).start_time, unico, interval,
+                                    group_by, kwargs)
+            for ticker, dfTicker in baixados.items():
+                for mes in ausentes[ticker]:
+                    fim_mes = (mes + 1).start_time
+                    partes[ticker][mes] = fatiar(dfTicker, mes.start_time, fim_mes)
+                    self._gravar(self._caminho(ticker, interval, mes, variante), partes[ticker][mes],
+                                 periodo_fechado(fim_mes, agora))
+
+        # Resultado montado com os meses de cada ticker, recortado no intervalo pedido
+        dfTickers = {}
+        for ticker in lista:
+            blocos = [partes[ticker][mes] for mes in meses if mes in partes[ticker]]
+            if blocos:
+                dfTicker = fatiar(pd.concat([bloco for bloco in blocos if not bloco.empty] or blocos[:1]), start, end)
+                if unico or not dfTicker.empty:
+                    dfTickers[ticker] = dfTicker.copy()
+
+        if unico:
+            dfTicker = dfTickers.get(tickers, pd.DataFrame())
+            if kwargs.get('multi_level_index', True) and not dfTicker.empty:
+                dfTicker = pd.concat({tickers: dfTicker}, axis=1, names=['Ticker', 'Price'])
+                dfTicker = dfTicker if group_by == 'ticker' else dfTicker.swaplevel(axis=1)
+            return dfTicker
+
+        if not dfTickers:
+            return pd.DataFrame()
+
+        dfLote = pd.concat({ticker: dfTickers[ticker] for ticker in lista if ticker in dfTickers}, axis=1,
+                           names=['Ticker', 'Price'])
+        return dfLote if group_by == 'ticker' else dfLote.swaplevel(axis=1)
+
+    def registrar_falha(self, ticker, start, end, erro=None):
+        """
+        Repassa ao downloader (registro_falhas.DownloaderResiliente) a falha de uma consulta abandonada.
+        """
+        if hasattr(self.downloader, 'registrar_falha'):
+            self.downloader.registrar_falha(ticker, start, end, erro)
+
+    def resumo_texto(self):
+        total = self.acertos + self.faltas
+        taxa = self.acertos / total if total else 0
+        return (f'Cache: {self.acertos} acertos, {self.faltas} faltas ({taxa:.0%}), '
+                f'{len(self._arquivos)} arquivos, {self.tamanho() / 2 ** 20:.1f} MB, {self.removidos} removidos')
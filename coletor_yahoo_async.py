@@ -0,0 +1,231 @@
+import asyncio
+import json
+import os
+import numpy as np
+import pandas as pd
+from historico_cotacoes import COLUNAS_YF, INTERVALO_DIARIO, normalizar_historico
+from metricas import METRICAS_NULAS
+from registro_falhas import ESPERA_BASE, ESPERA_MAXIMA, TENTATIVAS_DOWNLOAD, aplicar_resultados, atraso_backoff
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp é opcional, usado somente pelo coletor assincrono
+    aiohttp = None
+
+
+# Endpoint de grafico (v8) do Yahoo Finance, o mesmo consultado pelo yfinance
+URL_BASE = 'https://query2.finance.yahoo.com'
+CAMINHO_CHART = '/v8/finance/chart/{ticker}'
+
+CABECALHOS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+                  'Chrome/131.0.0.0 Safari/537.36',
+    'Accept': 'application/json',
+}
+
+# Intervalos em que as barras representam o dia inteiro (o horario é descartado, igual ao yfinance)
+INTERVALOS_DIARIOS = ('1d', '5d', '1wk', '1mo', '3mo')
+
+# Requisições simultâneas padrão
+MAX_SIMULTANEAS = 16
+
+
+def _exigir_aiohttp():
+    if aiohttp is None:
+        raise ImportError('aiohttp não instalado. Instale com: pip install aiohttp')
+
+
+class ErroChart(Exception):
+    """
+    Resposta do endpoint de grafico com erro (ticker inexistente, periodo invalido...).
+    """
+
+
+def _epoch(data):
+    """
+    Segundos desde 1970 (UTC) da data, datas sem fuso são consideradas em UTC.
+    """
+    data = pd.Timestamp(data)
+    return int((data if data.tz is not None else data.tz_localize('UTC')).timestamp())
+
+
+def _datas_locais(timestamps, meta, interval):
+    datas = pd.to_datetime(np.asarray(timestamps, dtype='int64'), unit='s', utc=True)
+    fuso = meta.get('exchangeTimezoneName')
+    if fuso:
+        datas = datas.tz_convert(fuso).tz_localize(None)
+    else:
+        datas = datas.tz_localize(None) + pd.Timedelta(seconds=meta.get('gmtoffset', 0))
+    return datas.normalize() if interval in INTERVALOS_DIARIOS else datas
+
+
+def converter_chart(conteudo, interval=INTERVALO_DIARIO):
+    """
+    Converte a resposta JSON do endpoint de grafico no mesmo DataFrame do yf.download de um ticker
+    (actions=True, auto_adjust=False, ignore_tz=True, rounding=True): index Date e colunas COLUNAS_YF.
+    """
+    chart = conteudo.get('chart', {})
+    if chart.get('error'):
+        raise ErroChart(f"{chart['error'].get('code')}: {chart['error'].get('description')}")
+
+    # Sem resultado e sem erro a resposta veio incompleta, diferente de um periodo sem pregões (sem 'timestamp')
+    if not chart.get('result'):
+        raise ErroChart('resposta sem resultado')
+
+    resultado = chart['result'][0]
+    if not resultado.get('timestamp'):
+        return pd.DataFrame(columns=COLUNAS_YF, index=pd.DatetimeIndex([], name='Date'))
+
+    meta = resultado.get('meta', {})
+    cotacao = resultado['indicators']['quote'][0]
+    datas = _datas_locais(resultado['timestamp'], meta, interval)
+
+    dfTicker = pd.DataFrame({coluna.capitalize(): np.array(cotacao.get(coluna, []), dtype='float64')
+                             for coluna in ('open', 'high', 'low', 'close', 'volume')}, index=datas)
+
+    # Proventos e desdobramentos chegam como eventos, associados à barra da mesma data
+    eventos = resultado.get('events', {})
+    for tipo, coluna, valor in (('dividends', 'Dividends', lambda evento: evento['amount']),
+                                ('splits', 'Stock Splits',
+                                 lambda evento: evento['numerator'] / evento['denominator'])):
+        valores = np.zeros(len(dfTicker))
+        registros = list(eventos.get(tipo, {}).values())
+        if registros:
+            posicoes = dfTicker.index.get_indexer(_datas_locais([evento['date'] for evento in registros],
+                                                                meta, interval))
+            encontrados = posicoes >= 0
+            valores[posicoes[encontrados]] = np.array([valor(evento) for evento in registros])[encontrados]
+        dfTicker[coluna] = valores
+
+    # Barras sem negociação chegam com valores nulos
+    dfTicker = dfTicker.dropna(subset=['Close'])
+    precos = ['Open', 'High', 'Low', 'Close']
+    dfTicker[precos] = dfTicker[precos].round(2)
+    dfTicker['Volume'] = dfTicker['Volume'].fillna(0).astype('int64')
+    dfTicker.index.name = 'Date'
+    return dfTicker[COLUNAS_YF]
+
+
+class ColetorYahooAsync:
+    """
+    Coletor assincrono do historico de cotações pelo endpoint de grafico do Yahoo (v8).
+    Usa uma unica sessão aiohttp com conexões keep-alive e no máximo `max_simultaneas` requisições em andamento.
+    O resultado de cada consulta tem o mesmo formato de historico_cotacoes.obter_historico.
+
+    :param url_base: Endereço do Yahoo, pode apontar para um servidor local (benchmarks/servidor_chart.py).
+    :param diretorio_gravacao: Se informado, grava o JSON de cada resposta em '<ticker>.json' para reprodução.
+    :param metricas: metricas.Metricas da execução (etapas fetch e transform, resultado de cada ticker).
+    """
+
+    def __init__(self, url_base=URL_BASE, max_simultaneas=MAX_SIMULTANEAS, timeout=10,
+                 tentativas=TENTATIVAS_DOWNLOAD, espera_base=ESPERA_BASE, espera_maxima=ESPERA_MAXIMA,
+                 diretorio_gravacao=None, metricas=None):
+        _exigir_aiohttp()
+        self.url_base = url_base.rstrip('/')
+        self.max_simultaneas = max_simultaneas
+        self.timeout = timeout
+        self.tentativas = tentativas
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.diretorio_gravacao = diretorio_gravacao
+        self.metricas = metricas or METRICAS_NULAS
+        self.falhas = []
+        self.sucessos = []
+
+    def _gravar_resposta(self, ticker, texto):
+        os.makedirs(self.diretorio_gravacao, exist_ok=True)
+        caminho = os.path.join(self.diretorio_gravacao, f'{ticker}.json')
+        with open(caminho + '.tmp', 'w', encoding='utf-8') as arquivo:
+            arquivo.write(texto)
+        os.replace(caminho + '.tmp', caminho)
+
+    async def _consultar(self, sessao, ticker, inicio, fim, interval):
+        parametros = {'period1': _epoch(inicio), 'period2': _epoch(fim), 'interval': interval,
+                      'events': 'div,splits', 'includePrePost': 'false'}
+        url = self.url_base + CAMINHO_CHART.format(ticker=ticker)
+
+        for tentativa in range(1, self.tentativas + 1):
+            try:
+                with self.metricas.etapa('fetch'):
+                    async with sessao.get(url, params=parametros) as resposta:
+                        texto = await resposta.text()
+                        # 404 traz o erro no JSON (ticker inexistente), demais status são repetidos
+                        if resposta.status >= 500 or resposta.status == 429:
+                            resposta.raise_for_status()
+                return texto
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if tentativa == self.tentativas:
+                    raise
+                self.metricas.retentativa()
+                await asyncio.sleep(atraso_backoff(tentativa, self.espera_base, self.espera_maxima))
+
+    async def _obter(self, sessao, semaforo, ticker, inicio, fim, interval):
+        async with semaforo:
+            try:
+                texto = await self._consultar(sessao, ticker, inicio, fim, interval)
+                if self.diretorio_gravacao:
+                    self._gravar_resposta(ticker, texto)
+
+                with self.metricas.etapa('transform'):
+                    dfTicker = converter_chart(json.loads(texto), interval)
+                    dfTicker = normalizar_historico(dfTicker, ticker) if not dfTicker.empty else None
+            except Exception as e:
+                self.metricas.resultado(ticker, 'falha', erro=e)
+                self.falhas.append((ticker, inicio, fim, repr(e)))
+                return None
+
+        self.sucessos.append((ticker, inicio, fim))
+        if dfTicker is None:
+            self.metricas.resultado(ticker, 'vazio')
+        else:
+            self.metricas.resultado(ticker, 'ok', linhas=len(dfTicker))
+        return dfTicker
+
+    async def baixar_async(self, consultas, interval=INTERVALO_DIARIO):
+        """
+        Baixa as consultas [(ticker, inicio, fim), ...] e retorna os DataFrames na mesma ordem (None quando o
+        ticker falhou ou não tem dados no periodo).
+        """
+        semaforo = asyncio.Semaphore(self.max_simultaneas)
+        conector = aiohttp.TCPConnector(limit=self.max_simultaneas, keepalive_timeout=30)
+        async with aiohttp.ClientSession(connector=conector, headers=CABECALHOS,
+                                         timeout=aiohttp.ClientTimeout(total=self.timeout)) as sessao:
+            return await asyncio.gather(*[self._obter(sessao, semaforo, ticker, inicio, fim, interval)
+                                          for ticker, inicio, fim in consultas])
+
+    def baixar(self, consultas, interval=INTERVALO_DIARIO):
+        """
+        Versão sincrona de baixar_async, para uso fora de um event loop.
+        """
+        return asyncio.run(self.baixar_async(consultas, interval))
+
+    def atualizar_registro(self, registro, tickers=None):
+        """
+        Aplica as falhas e sucessos das consultas ao registro de falhas, igual a DownloaderResiliente.
+        """
+        aplicar_resultados(registro, self.sucessos, self.falhas, tickers)
+
+
+def baixar_planos_async(planos, coletor):
+    """
+    Equivalente a historico_cotacoes.baixar_planos usando o coletor assincrono: uma consulta por ticker,
+    todas as classes na mesma sessão. Retorna a lista de DataFrames de cada plano, na ordem dos planos.
+    """
+    tarefas = [(plano, inicio, ticker) for plano in planos for inicio, ticker in plano.tarefas()]
+    resultados = coletor.baixar([(ticker, inicio, plano.fim_periodo) for plano, inicio, ticker in tarefas])
+
+    dfPlanos = [[] for _ in planos]
+    posicoes = {id(plano): posicao for posicao, plano in enumerate(planos)}
+    for (plano, _, _), dfHistorico in zip(tarefas, resultados):
+        dfPlanos[posicoes[id(plano)]].append(dfHistorico)
+    return dfPlanos
+
+
+def obter_historico_async(StartDate, EndDate, Tickers, interval=INTERVALO_DIARIO, **kwargs):
+    """
+    Historico de uma lista de tickers no mesmo formato de obter_historico_lote (None se nenhum ticker retornou).
+    Demais parametros iguais aos de ColetorYahooAsync.
+    """
+    resultados = ColetorYahooAsync(**kwargs).baixar([(ticker, StartDate, EndDate) for ticker in Tickers], interval)
+    resultados = [dfTicker for dfTicker in resultados if dfTicker is not None]
+    return pd.concat(resultados, ignore_index=True) if resultados else None
@@ -0,0 +1,262 @@
+import json
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from historico_cotacoes import COLUNA_SPLITS, ler_mes, meses_salvos
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow é opcional, usado somente pelas series ajustadas em parquet
+    pa = ds = pq = None
+
+
+# Estado de cada ticker (fator acumulado, ultimo fechamento e indice de retorno total)
+ARQUIVO_FATORES = 'fatores.json'
+
+# Valor inicial do indice de retorno total
+BASE_RETORNO_TOTAL = 100.0
+
+# Colunas do historico usadas no ajuste
+COLUNAS_AJUSTE = ['Ticker', 'Date', 'Close', 'Dividends', COLUNA_SPLITS]
+
+# Diferença tolerada entre o valor do historico e o já processado
+TOLERANCIA_ALTERACAO = 1e-9
+
+
+def _exigir_pyarrow():
+    if pa is None:
+        raise ImportError('pyarrow não instalado. Instale com: pip install pyarrow')
+
+
+def esquema_ajustados():
+    """
+    Esquema das series ajustadas. 'Base' é o fechamento dividido pelo fator acumulado até a data:
+    o fechamento ajustado é Base * fator atual do ticker, e um novo provento só altera o fator do ticker.
+    """
+    _exigir_pyarrow()
+    return pa.schema([
+        ('Ticker', pa.string()),
+        ('Date', pa.timestamp('ns')),
+        ('Close', pa.float64()),
+        ('Dividends', pa.float64()),
+        ('Stock Splits', pa.float64()),
+        ('Base', pa.float64()),
+        ('Total Return', pa.float64()),
+    ])
+
+
+def assinatura(caminho):
+    """
+    Tamanho e data de modificação do arquivo, alterados a cada gravação do mês.
+    """
+    info = os.stat(caminho)
+    return [info.st_size, info.st_mtime_ns]
+
+
+def calcular_series(dfNovos, estado):
+    """
+    Calcula Base e Total Return das linhas novas de todos os tickers em uma unica passada vetorizada,
+    continuando do estado salvo de cada ticker.
+
+    Eventos na data t (com fechamento anterior C[t-1] em unidades pós-desdobramento P = C[t-1] / r):
+        fator  f = (1 / r) * (1 - D / P)       aplicado a todas as datas anteriores
+        retorno g = (C[t] + D) / P
+    onde r é a proporção do desdobramento (1 sem evento, ou quando C[t-1] já está ajustado pelo desdobramento)
+    e D o provento por ação.
+
+    :param dfNovos: Linhas com Ticker, Date, Close, Dividends e Stock Splits, somente datas ainda não processadas.
+    :param estado: {ticker: {'fator', 'ultimo_close', 'retorno_total', 'ultima_data'}}.
+    :return: (DataFrame calculado, estado atualizado).
+    """
+    df = dfNovos.sort_values(['Ticker', 'Date'], kind='stable').reset_index(drop=True)
+    tickers = df['Ticker']
+    primeiras = ~tickers.duplicated()
+
+    fechamento = df['Close'].to_numpy(dtype='float64')
+    proventos = df['Dividends'].fillna(0).to_numpy(dtype='float64')
+    splits = df[COLUNA_SPLITS].fillna(0).to_numpy(dtype='float64')
+
+    # Fechamento anterior: linha anterior do mesmo ticker, ou o ultimo fechamento já processado
+    anterior = df.groupby('Ticker', sort=False)['Close'].shift(1)
+    anterior[primeiras] = tickers[primeiras].map(
+        lambda ticker: estado.get(ticker, {}).get('ultimo_close')).astype('float64')
+    anterior = anterior.to_numpy(dtype='float64')
+
+    # O Yahoo devolve o historico baixado depois do desdobramento já ajustado por ele, sem salto de preço na data.
+    # A proporção só é aplicada quando o salto entre C[t-1] e C[t] está mais perto de r do que de 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        salto = np.log(anterior / fechamento)
+        bruto = np.abs(salto - np.log(np.where(splits > 0, splits, 1.0))) < np.abs(salto)
+    proporcao = np.where((splits > 0) & bruto, splits, 1.0)
+    anterior = anterior / proporcao
+
+    # Primeira data do ticker não tem fechamento anterior: fator e retorno neutros
+    sem_anterior = np.isnan(anterior) | (anterior <= 0)
+    divisor = np.where(sem_anterior, 1.0, anterior)
+    fator = np.where(sem_anterior, 1.0, (1.0 / proporcao) * (1.0 - proventos / divisor))
+    retorno = np.where(sem_anterior, 1.0, (fechamento + proventos) / divisor)
+
+    fator_inicial = tickers.map(lambda ticker: estado.get(ticker, {}).get('fator', 1.0)).to_numpy(dtype='float64')
+    retorno_inicial = tickers.map(
+        lambda ticker: estado.get(ticker, {}).get('retorno_total', BASE_RETORNO_TOTAL)).to_numpy(dtype='float64')
+
+    grupos = df.groupby('Ticker', sort=False)
+    fator_acumulado = fator_inicial * pd.Series(fator).groupby(grupos.ngroup()).cumprod().to_numpy()
+    df['Base'] = fechamento / fator_acumulado
+    df['Total Return'] = retorno_inicial * pd.Series(retorno).groupby(grupos.ngroup()).cumprod().to_numpy()
+
+    estado = dict(estado)
+    retorno_total = df['Total Return'].to_numpy()
+    for posicao in np.flatnonzero(~tickers.duplicated(keep='last').to_numpy()):
+        estado[tickers[posicao]] = {'fator': float(fator_acumulado[posicao]),
+                                    'ultimo_close': float(fechamento[posicao]),
+                                    'retorno_total': float(retorno_total[posicao]),
+                                    'ultima_data': df['Date'].iat[posicao].strftime('%Y-%m-%d')}
+
+    return df[esquema_ajustados().names], estado
+
+
+class CotacoesAjustadas:
+    """
+    Fechamento ajustado por proventos e desdobramentos e indice de retorno total de uma classe de ativo.
+    A atualização só le os arquivos mensais alterados desde a execução anterior (tamanho e data de modificação
+    guardados em fatores.json), processa as datas posteriores à ultima processada de cada ticker e grava somente
+    os meses alterados. Proventos novos atualizam apenas o fator do ticker: o historico anterior é reescalado na
+    leitura, sem recalcular ou regravar os meses antigos.
+
+    Linhas regravadas em datas já processadas (modo reparo ou novo download do mês) invalidam o fator acumulado:
+    o ticker é recalculado desde a primeira data. Os preços devem estar salvos sem ajuste de proventos
+    (auto_adjust=False), diretorios baixados com ajuste são baixados novamente por historico_cotacoes.PlanoHistorico
+    e recalculados desta forma. Os fechamentos podem estar ou não ajustados pelos desdobramentos (o Yahoo ajusta o
+    historico baixado depois do evento), ver calcular_series.
+
+    Estrutura do diretorio:
+        fatores.json
+        dados/ano=YYYY/mes=MM/ajustados.parquet
+    """
+
+    def __init__(self, raiz):
+        _exigir_pyarrow()
+        self.raiz = raiz
+        self.caminho_fatores = os.path.join(raiz, ARQUIVO_FATORES)
+        self.diretorio_dados = os.path.join(raiz, 'dados')
+        self.estado = {}
+        self.assinaturas = {}
+
+        if os.path.exists(self.caminho_fatores):
+            with open(self.caminho_fatores, encoding='utf-8') as arquivo:
+                conteudo = json.load(arquivo)
+            self.estado = conteudo.get('tickers', {})
+            self.assinaturas = conteudo.get('arquivos', {})
+
+    def _caminho_mes(self, data_mes):
+        return os.path.join(self.diretorio_dados, f'ano={data_mes.year}', f'mes={data_mes.month:02d}',
+                            'ajustados.parquet')
+
+    def _tickers_alterados(self, df, meses):
+        """
+        Tickers com linhas em datas já processadas diferentes das gravadas nas series ajustadas dos meses.
+        """
+        ultimas = pd.to_datetime(df['Ticker'].map(lambda ticker: self.estado.get(ticker, {}).get('ultima_data')))
+        dfProcessadas = df[ultimas.notna() & (df['Date'] <= ultimas)]
+        if dfProcessadas.empty:
+            return set()
+
+        gravadas = [pq.read_table(self._caminho_mes(mes), columns=COLUNAS_AJUSTE).to_pandas()
+                    for mes in meses if os.path.exists(self._caminho_mes(mes))]
+        dfGravadas = pd.concat(gravadas, ignore_index=True) if gravadas else pd.DataFrame(columns=COLUNAS_AJUSTE)
+
+        comparacao = dfProcessadas.merge(dfGravadas, on=['Ticker', 'Date'], how='left', suffixes=('', ' gravado'),
+                                         indicator=True)
+        alterados = (comparacao['_merge'] != 'both').to_numpy()
+        for coluna in COLUNAS_AJUSTE[2:]:
+            alterados |= ~np.isclose(comparacao[coluna].fillna(0).to_numpy(dtype='float64'),
+                                     comparacao[f'{coluna} gravado'].fillna(0).to_numpy(dtype='float64'),
+                                     rtol=0, atol=TOLERANCIA_ALTERACAO)
+        return set(comparacao.loc[alterados, 'Ticker'])
+
+    def _salvar_fatores(self):
+        # Fatores gravados por ultimo: se a execução parar antes, os meses são reprocessados na proxima
+        os.makedirs(self.raiz, exist_ok=True)
+        with open(self.caminho_fatores + '.tmp', 'w', encoding='utf-8') as arquivo:
+            json.dump({'atualizado_em': datetime.now().isoformat(timespec='seconds'),
+                       'tickers': dict(sorted(self.estado.items())),
+                       'arquivos': dict(sorted(self.assinaturas.items()))}, arquivo, indent=2)
+        os.replace(self.caminho_fatores + '.tmp', self.caminho_fatores)
+
+    def atualizar(self, diretorio, prefixo):
+        """
+        Processa as novas datas do historico '<prefixo>_MM_YYYY.csv' do diretorio.
+        Retorna a quantidade de linhas processadas.
+        """
+        # Assinaturas lidas antes dos arquivos: um mês regravado durante a leitura é lido de novo na proxima vez
+        meses = meses_salvos(diretorio, prefixo)
+        assinaturas = {os.path.basename(caminho): assinatura(caminho) for caminho in meses.values()}
+        alterados = [mes for mes in sorted(meses)
+                     if self.assinaturas.get(os.path.basename(meses[mes])) != assinaturas[os.path.basename(meses[mes])]]
+        if not alterados:
+            return 0
+
+        df = pd.concat([ler_mes(meses[mes])[COLUNAS_AJUSTE] for mes in alterados], ignore_index=True)
+        df = df.dropna(subset=['Close'])
+
+        # Tickers com datas já processadas regravadas são recalculados com todos os meses salvos
+        refazer = self._tickers_alterados(df, alterados)
+        if refazer:
+            print(f'{prefixo}: {len(refazer)} tickers com datas já processadas alteradas, recalculando.')
+            for ticker in refazer:
+                self.estado.pop(ticker, None)
+            restantes = [ler_mes(meses[mes])[COLUNAS_AJUSTE] for mes in sorted(meses) if mes not in alterados]
+            df = pd.concat([df] + [dfMes[dfMes['Ticker'].isin(refazer)].dropna(subset=['Close'])
+                                   for dfMes in restantes], ignore_index=True)
+
+        # Somente datas posteriores à ultima processada de cada ticker
+        ultimas = pd.to_datetime(df['Ticker'].map(lambda ticker: self.estado.get(ticker, {}).get('ultima_data')))
+        df = df[ultimas.isna() | (df['Date'] > ultimas)]
+        self.assinaturas = assinaturas
+        if df.empty:
+            self._salvar_fatores()
+            return 0
+
+        dfNovos, self.estado = calcular_series(df, self.estado)
+
+        for periodo, dfMes in dfNovos.groupby(dfNovos['Date'].dt.to_period('M'), sort=True):
+            caminho = self._caminho_mes(periodo.to_timestamp())
+            if os.path.exists(caminho):
+                dfMes = pd.concat([pq.read_table(caminho).to_pandas(), dfMes], ignore_index=True).drop_duplicates(
+                    subset=['Ticker', 'Date'], keep='last')
+            dfMes = dfMes.sort_values(['Ticker', 'Date'], kind='stable')
+
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            pq.write_table(pa.Table.from_pandas(dfMes, schema=esquema_ajustados(), preserve_index=False),
+                           caminho + '.tmp', compression='zstd')
+            os.replace(caminho + '.tmp', caminho)
+
+        self._salvar_fatores()
+        return len(dfNovos)
+
+    def ler(self, tickers=None, inicio=None, fim=None):
+        """
+        Series ajustadas com as colunas Ticker, Date, Close, Adj Close e Total Return.
+        """
+        if not os.path.exists(self.diretorio_dados):
+            raise FileNotFoundError(f'Diretorio não encontrado: {self.diretorio_dados}')
+
+        filtro = None
+        for expressao in [ds.field('Ticker').isin(list(tickers)) if tickers is not None else None,
+                          ds.field('Date') >= pa.scalar(pd.Timestamp(inicio).to_pydatetime(), pa.timestamp('ns'))
+                          if inicio is not None else None,
+                          ds.field('Date') <= pa.scalar(pd.Timestamp(fim).to_pydatetime(), pa.timestamp('ns'))
+                          if fim is not None else None]:
+            if expressao is not None:
+                filtro = expressao if filtro is None else filtro & expressao
+
+        dataset = ds.dataset(self.diretorio_dados, format='parquet', schema=esquema_ajustados())
+        df = dataset.to_table(filter=filtro).to_pandas().sort_values(['Ticker', 'Date'], kind='stable')
+
+        fatores = df['Ticker'].map(lambda ticker: self.estado.get(ticker, {}).get('fator', 1.0))
+        df['Adj Close'] = df['Base'] * fatores
+        return df[['Ticker', 'Date', 'Close', 'Adj Close', 'Total Return']].reset_index(drop=True)
@@ -0,0 +1,313 @@
+import json
+import os
+import re
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from historico_cotacoes import ler_mes
+
+
+# Campos do cubo: coluna do historico, tipo e valor das posições sem cotação
+CAMPOS_CUBO = {
+    'close': ('Close', 'float64', np.nan),
+    'volume': ('Volume', 'int64', 0),
+    'dividends': ('Dividends', 'float64', 0.0),
+}
+
+ARQUIVO_METADADOS = 'cubo.json'
+ARQUIVO_TICKERS = 'tickers.txt'
+ARQUIVO_DATAS = 'datas.npy'
+
+# Capacidade inicial dos arquivos (tickers x pregões), dobrada quando falta espaço
+CAPACIDADE_TICKERS = 128
+CAPACIDADE_DATAS = 2048
+
+# Versão do formato, alterar quando a estrutura dos arquivos mudar para forçar a reconstrução
+VERSAO_CUBO = 1
+
+
+def _arquivos_mensais(diretorio, prefixo):
+    """
+    Arquivos '<prefixo>_MM_YYYY.csv' do diretorio em ordem cronologica.
+    """
+    arquivos = {}
+    for arquivo in os.listdir(diretorio):
+        match = re.match(rf'{re.escape(prefixo)}_(\d{{2}})_(\d{{4}})\.csv$', arquivo)
+        if match:
+            arquivos[(int(match.group(2)), int(match.group(1)))] = arquivo
+    return [arquivos[mes] for mes in sorted(arquivos)]
+
+
+def _nova_capacidade(atual, minima, necessaria):
+    """
+    Capacidade dobrada até comportar a quantidade necessaria.
+    """
+    capacidade = max(atual, minima)
+    while capacidade < necessaria:
+        capacidade *= 2
+    return capacidade
+
+
+def _assinatura(caminho):
+    estado = os.stat(caminho)
+    return [estado.st_size, estado.st_mtime_ns]
+
+
+class CuboCotacoes:
+    """
+    Historico de uma classe de ativo compilado em matrizes NumPy mapeadas em memoria (tickers x pregões),
+    uma por campo de CAMPOS_CUBO. Varios processos podem abrir o mesmo cubo e ler fatias sem copiar nem
+    interpretar os CSVs: as paginas do arquivo são compartilhadas pelo sistema operacional.
+
+    Cada linha é um ticker (serie de um ticker contigua na memoria) e cada coluna um pregão. Posições sem
+    cotação têm close NaN e volume e proventos zerados. Os arquivos têm folga de capacidade para novos tickers
+    e pregões, só são recriados (com o dobro da capacidade) quando ela acaba.
+
+    A atualização só lê os arquivos mensais novos ou alterados desde a ultima execução. cubo.json é gravado por
+    ultimo e define as dimensões validas: leitores nunca veem tickers ou pregões ainda não gravados.
+    Posições já visiveis nunca são alteradas no lugar: se um mês regravado muda valores de pregões já
+    publicados, as matrizes são gravadas em arquivos novos (sombra) e trocadas com os.replace. Leitores com o
+    arquivo anterior aberto continuam com a versão anterior completa até chamarem recarregar().
+
+    Estrutura do diretorio:
+        cubo.json                   dimensões, capacidade e assinatura dos arquivos mensais já processados
+        tickers.txt                 um ticker por linha, na ordem das linhas das matrizes
+        datas.npy                   pregões (datetime64[D]) em ordem crescente
+        close.npy, volume.npy, dividends.npy
+    """
+
+    def __init__(self, raiz):
+        self.raiz = raiz
+        self.caminho_metadados = os.path.join(raiz, ARQUIVO_METADADOS)
+        self._mapas = {}
+        self.recarregar()
+
+    def _caminho(self, nome):
+        return os.path.join(self.raiz, nome if nome.endswith(('.npy', '.txt')) else f'{nome}.npy')
+
+    def recarregar(self):
+        """
+        Le novamente cubo.json e tickers.txt, para enxergar as atualizações feitas por outro processo.
+        """
+        self._mapas = {}
+        self.metadados = {'versao': VERSAO_CUBO, 'tickers': 0, 'datas': 0, 'capacidade': [0, 0], 'arquivos': {}}
+        self.tickers = []
+
+        if os.path.exists(self.caminho_metadados):
+            with open(self.caminho_metadados, encoding='utf-8') as arquivo:
+                metadados = json.load(arquivo)
+            if metadados.get('versao') == VERSAO_CUBO:
+                self.metadados = metadados
+                with open(self._caminho(ARQUIVO_TICKERS), encoding='utf-8') as arquivo:
+                    self.tickers = arquivo.read().split('\n')[:metadados['tickers']]
+        self.posicoes = {ticker: posicao for posicao, ticker in enumerate(self.tickers)}
+
+    def _mapa(self, nome, modo='r'):
+        """
+        Matriz inteira (com a folga de capacidade) mapeada em memoria.
+        """
+        chave = (nome, modo)
+        if chave not in self._mapas:
+            self._mapas[chave] = np.load(self._caminho(nome), mmap_mode=modo)
+        return self._mapas[chave]
+
+    # Leitura
+
+    @property
+    def datas(self):
+        """
+        Pregões do cubo (view somente leitura de datas.npy).
+        """
+        if not self.metadados['datas']:
+            return np.array([], dtype='datetime64[D]')
+        return self._mapa(ARQUIVO_DATAS)[:self.metadados['datas']]
+
+    def fatia_datas(self, inicio=None, fim=None):
+        """
+        slice das colunas dos pregões entre inicio e fim (inclusive).
+        """
+        datas = self.datas
+        primeira = np.searchsorted(datas, np.datetime64(pd.Timestamp(inicio).date(), 'D')) \
+            if inicio is not None else 0
+        ultima = np.searchsorted(datas, np.datetime64(pd.Timestamp(fim).date(), 'D'), side='right') \
+            if fim is not None else len(datas)
+        return slice(int(primeira), int(ultima))
+
+    def matriz(self, campo, inicio=None, fim=None):
+        """
+        Matriz tickers x pregões do campo entre inicio e fim (inclusive), sem copia: view somente leitura
+        do arquivo mapeado. As linhas seguem self.tickers e as colunas self.datas.
+        """
+        if campo not in CAMPOS_CUBO:
+            raise ValueError(f'Campo invalido: {campo!r} (use {", ".join(CAMPOS_CUBO)})')
+        if not self.metadados['datas']:
+            return np.empty((0, 0), dtype=CAMPOS_CUBO[campo][1])
+        return self._mapa(campo)[:self.metadados['tickers'], self.fatia_datas(inicio, fim)]
+
+    def serie(self, campo, ticker, inicio=None, fim=None):
+        """
+        Serie de um ticker entre inicio e fim (inclusive), sem copia. As posições seguem self.datas.
+        """
+        if ticker not in self.posicoes:
+            raise KeyError(f'Ticker não encontrado no cubo: {ticker}')
+        return self.matriz(campo, inicio, fim)[self.posicoes[ticker]]
+
+    def dataframe(self, campo, inicio=None, fim=None, tickers=None):
+        """
+        DataFrame pregões x tickers do campo. Sem tickers é uma view da matriz (sem copia), com uma lista de
+        tickers as linhas escolhidas são copiadas.
+        """
+        fatia = self.fatia_datas(inicio, fim)
+        matriz = self.matriz(campo, inicio, fim)
+        colunas = self.tickers
+        if tickers is not None:
+            colunas = list(tickers)
+            matriz = matriz[[self.posicoes[ticker] for ticker in colunas]]
+        return pd.DataFrame(matriz.T, index=pd.DatetimeIndex(self.datas[fatia], name='Date'), columns=colunas,
+                            copy=False)
+
+    # Atualização
+
+    def _criar_arquivos(self, capacidade_tickers, capacidade_datas, datas, blocos, inicio):
+        """
+        Grava arquivos novos com a capacidade informada: pregões `datas`, colunas anteriores a `inicio` copiadas
+        das matrizes atuais e os blocos (tickers x pregões a partir de `inicio`) de cada campo. Os arquivos
+        novos só substituem os antigos (os.replace) depois de todos gravados.
+        """
+        os.makedirs(self.raiz, exist_ok=True)
+        tickers = self.metadados['tickers']
+
+        arquivos = {ARQUIVO_DATAS: ((capacidade_datas,), 'datetime64[D]', np.datetime64('NaT'))}
+        arquivos.update({campo: ((capacidade_tickers, capacidade_datas), tipo, vazio)
+                         for campo, (_, tipo, vazio) in CAMPOS_CUBO.items()})
+
+        for nome, (forma, tipo, vazio) in arquivos.items():
+            novo = np.lib.format.open_memmap(self._caminho(nome) + '.tmp', mode='w+', dtype=tipo, shape=forma)
+            novo[...] = vazio
+            if nome == ARQUIVO_DATAS:
+                novo[:len(datas)] = datas
+            else:
+                if tickers and inicio:
+                    novo[:tickers, :inicio] = self._mapa(nome)[:tickers, :inicio]
+                novo[:blocos[nome].shape[0], inicio:inicio + blocos[nome].shape[1]] = blocos[nome]
+            novo.flush()
+            del novo
+
+        for nome in arquivos:
+            os.replace(self._caminho(nome) + '.tmp', self._caminho(nome))
+        self._mapas = {}
+        self.metadados['capacidade'] = [capacidade_tickers, capacidade_datas]
+
+    def _salvar_metadados(self):
+        with open(self._caminho(ARQUIVO_TICKERS) + '.tmp', 'w', encoding='utf-8') as arquivo:
+            arquivo.write('\n'.join(self.tickers))
+        os.replace(self._caminho(ARQUIVO_TICKERS) + '.tmp', self._caminho(ARQUIVO_TICKERS))
+
+        self.metadados['atualizado_em'] = datetime.now().isoformat(timespec='seconds')
+        with open(self.caminho_metadados + '.tmp', 'w', encoding='utf-8') as arquivo:
+            json.dump(self.metadados, arquivo, indent=2)
+        os.replace(self.caminho_metadados + '.tmp', self.caminho_metadados)
+
+    def reconstruir(self, diretorio, prefixo):
+        """
+        Descarta o cubo e compila novamente todo o historico do diretorio.
+        """
+        self.metadados = {'versao': VERSAO_CUBO, 'tickers': 0, 'datas': 0, 'capacidade': [0, 0], 'arquivos': {}}
+        self.tickers, self.posicoes, self._mapas = [], {}, {}
+        return self.atualizar(diretorio, prefixo)
+
+    def atualizar(self, diretorio, prefixo):
+        """
+        Compila no cubo os arquivos mensais '<prefixo>_MM_YYYY.csv' novos ou alterados do diretorio.
+        Pregões novos posteriores ao ultimo do cubo são acrescentados no fim. Um pregão anterior ainda
+        ausente do cubo (mês antigo baixado depois) exige a reconstrução completa, feita automaticamente.
+        Retorna a quantidade de linhas do historico lidas.
+        """
+        if not os.path.exists(diretorio):
+            raise FileNotFoundError(f'Diretorio não encontrado: {diretorio}')
+
+        processados = self.metadados['arquivos']
+        pendentes = {arquivo: _assinatura(os.path.join(diretorio, arquivo))
+                     for arquivo in _arquivos_mensais(diretorio, prefixo)}
+        pendentes = {arquivo: assinatura for arquivo, assinatura in pendentes.items()
+                     if processados.get(arquivo) != assinatura}
+        if not pendentes:
+            return 0
+
+        campos = [coluna for coluna, _, _ in CAMPOS_CUBO.values()]
+        dfMeses = [ler_mes(os.path.join(diretorio, arquivo))[['Ticker', 'Date'] + campos] for arquivo in pendentes]
+        df = pd.concat(dfMeses, ignore_index=True)
+        datas_arquivo = df['Date'].to_numpy(dtype='datetime64[D]')
+
+        # Pregões ainda ausentes do cubo
+        datas = self.datas
+        novas = np.unique(datas_arquivo)
+        novas = novas[~np.isin(novas, datas)]
+        if len(novas) and len(datas) and novas[0] < datas[-1]:
+            print(f'{prefixo}: pregões anteriores ao fim do cubo, reconstruindo o cubo')
+            return self.reconstruir(diretorio, prefixo)
+
+        novos_tickers = sorted(set(df['Ticker']) - set(self.posicoes))
+        tickers_visiveis, datas_visiveis = len(self.tickers), len(datas)
+        total_tickers = tickers_visiveis + len(novos_tickers)
+        total_datas = datas_visiveis + len(novas)
+        self.tickers = self.tickers + novos_tickers
+        self.posicoes = {ticker: posicao for posicao, ticker in enumerate(self.tickers)}
+
+        datas = np.concatenate([np.asarray(datas), novas])
+        linhas = df['Ticker'].map(self.posicoes).to_numpy()
+        colunas = np.searchsorted(datas, datas_arquivo)
+
+        # Colunas dos meses lidos: o arquivo mensal tem o mês completo da classe e substitui as colunas do mês
+        meses = []
+        for dfMes in dfMeses:
+            datas_mes = dfMes['Date'].to_numpy(dtype='datetime64[M]')
+            if len(datas_mes):
+                meses.append((np.searchsorted(datas, datas_mes.min().astype('datetime64[D]')),
+                              np.searchsorted(datas, (datas_mes.max() + 1).astype('datetime64[D]'))))
+        inicio = min([total_datas] + [inicio_mes for inicio_mes, _ in meses])
+
+        # Blocos tickers x pregões a partir do primeiro mês lido, montados em memoria a partir dos valores atuais
+        blocos = {}
+        alterado = False
+        for campo, (coluna, tipo, vazio) in CAMPOS_CUBO.items():
+            bloco = np.full((total_tickers, total_datas - inicio), vazio, dtype=tipo)
+            publicado = None
+            if inicio < datas_visiveis:
+                publicado = self._mapa(campo)[:tickers_visiveis, inicio:datas_visiveis]
+                bloco[:tickers_visiveis, :datas_visiveis - inicio] = publicado
+            for inicio_mes, fim_mes in meses:
+                bloco[:, inicio_mes - inicio:fim_mes - inicio] = vazio
+            valores = df[coluna].to_numpy()
+            if vazio == 0:
+                valores = np.nan_to_num(valores, nan=0)
+            bloco[linhas, colunas - inicio] = valores.astype(tipo)
+            blocos[campo] = bloco
+
+            if publicado is not None:
+                alterado |= not np.array_equal(publicado, bloco[:tickers_visiveis, :datas_visiveis - inicio],
+                                               equal_nan=True)
+
+        capacidade_tickers, capacidade_datas = self.metadados['capacidade']
+        if alterado or total_tickers > capacidade_tickers or total_datas > capacidade_datas:
+            # Valores publicados alterados (ou falta de capacidade): arquivos novos trocados com os.replace
+            self._criar_arquivos(_nova_capacidade(capacidade_tickers, CAPACIDADE_TICKERS, total_tickers),
+                                 _nova_capacidade(capacidade_datas, CAPACIDADE_DATAS, total_datas),
+                                 datas, blocos, inicio)
+        else:
+            # Somente posições ainda não visiveis mudam, as publicadas recebem os mesmos valores
+            mapa_datas = self._mapa(ARQUIVO_DATAS, 'r+')
+            mapa_datas[datas_visiveis:total_datas] = novas
+            mapa_datas.flush()
+            for campo, (_, _, vazio) in CAMPOS_CUBO.items():
+                matriz = self._mapa(campo, 'r+')
+                matriz[tickers_visiveis:total_tickers, :inicio] = vazio
+                matriz[:total_tickers, inicio:total_datas] = blocos[campo]
+                matriz.flush()
+
+        # Metadados por ultimo: definem as dimensões visiveis para os leitores
+        self.metadados['tickers'] = total_tickers
+        self.metadados['datas'] = total_datas
+        self.metadados['arquivos'] = {**processados, **pendentes}
+        self._salvar_metadados()
+        return len(df)
@@ -0,0 +1,169 @@
+import os
+import threading
+import time
+from selenium.common.exceptions import StaleElementReferenceException, WebDriverException
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # watchdog é opcional, sem ele a chegada do download é verificada por polling
+    FileSystemEventHandler = object
+    Observer = None
+
+
+# Teto padrão em segundos de cada espera
+TETO_PADRAO = 20
+
+# Extensões de arquivos de download ainda em andamento
+EXTENSOES_PARCIAIS = ('.crdownload', '.part', '.tmp')
+
+
+def registrar_espera(descricao, inicio, concluida):
+    """
+    Mostra o tempo efetivamente gasto na espera.
+    """
+    situacao = "" if concluida else " (teto atingido)"
+    print(f"Espera '{descricao}': {time.monotonic() - inicio:.2f}s{situacao}")
+
+
+def esperar(driver, condicao, descricao, teto=TETO_PADRAO, intervalo=0.1):
+    """
+    Aguarda até a condição retornar um valor verdadeiro ou até o teto em segundos.
+    Retorna o valor da condição, ou None quando o teto é atingido.
+    """
+    inicio = time.monotonic()
+    try:
+        resultado = WebDriverWait(driver, teto, poll_frequency=intervalo,
+                                  ignored_exceptions=(StaleElementReferenceException,)).until(condicao)
+    except WebDriverException:
+        registrar_espera(descricao, inicio, False)
+        return None
+    registrar_espera(descricao, inicio, True)
+    return resultado
+
+
+def esperar_pagina_carregada(driver, teto=TETO_PADRAO):
+    """
+    Aguarda o document.readyState da pagina chegar em 'complete'.
+    """
+    return esperar(driver, lambda d: d.execute_script("return document.readyState") == "complete",
+                   "pagina carregada", teto)
+
+
+def esperar_clicavel(driver, elemento_ou_localizador, teto=5):
+    """
+    Aguarda um elemento (ou localizador (By, valor)) ficar visivel e habilitado.
+    """
+    return esperar(driver, EC.element_to_be_clickable(elemento_ou_localizador), "elemento clicavel", teto)
+
+
+def esperar_overlay_sumir(driver, localizador, teto=5):
+    """
+    Aguarda um overlay/popup deixar de estar visivel (ou deixar de existir).
+    """
+    return esperar(driver, EC.invisibility_of_element_located(localizador), "overlay fechado", teto)
+
+
+def conteudo_elemento(driver, localizador):
+    """
+    Texto atual do elemento, usado para detectar mudanças de conteudo. Retorna None se não existir.
+    """
+    try:
+        return driver.find_element(*localizador).get_attribute("innerText")
+    except WebDriverException:
+        return None
+
+
+def esperar_conteudo_alterado(driver, localizador, conteudo_antigo, elemento_antigo=None, teto=TETO_PADRAO):
+    """
+    Aguarda a atualização de uma tabela: o elemento antigo sair do DOM (staleness) ou o texto mudar.
+    """
+    def alterado(d):
+        if elemento_antigo is not None and EC.staleness_of(elemento_antigo)(d):
+            return True
+        conteudo = conteudo_elemento(d, localizador)
+        return conteudo is not None and conteudo != conteudo_antigo
+
+    return esperar(driver, alterado, "conteudo alterado", teto)
+
+
+def tamanho_download(diretorio, caminho):
+    """
+    Tamanho do arquivo baixado, ou None enquanto ele não existir, estiver vazio ou houver arquivos parciais.
+    """
+    if any(arquivo.endswith(EXTENSOES_PARCIAIS) for arquivo in os.listdir(diretorio)):
+        return None
+    if not os.path.exists(caminho):
+        return None
+    return os.path.getsize(caminho) or None
+
+
+class _SinalDiretorio(FileSystemEventHandler):
+    """
+    Sinaliza qualquer evento (criação, escrita, renomeação) no diretorio observado.
+    """
+
+    def __init__(self):
+        self.evento = threading.Event()
+
+    def on_any_event(self, event):
+        self.evento.set()
+
+
+def _esperar_download_eventos(diretorio, caminho, teto, intervalo):
+    inicio = time.monotonic()
+    sinal = _SinalDiretorio()
+    observador = Observer()
+    observador.schedule(sinal, diretorio, recursive=False)
+    observador.start()
+
+    try:
+        while (restante := teto - (time.monotonic() - inicio)) > 0:
+            tamanho = tamanho_download(diretorio, caminho)
+            if tamanho:
+                # Arquivo completo: confirma que nenhum evento chegou e o tamanho não mudou durante o intervalo
+                sinal.evento.clear()
+                if not sinal.evento.wait(min(intervalo, restante)) and \
+                        tamanho_download(diretorio, caminho) == tamanho:
+                    registrar_espera("download concluido", inicio, True)
+                    return caminho
+                continue
+
+            sinal.evento.wait(restante)
+            sinal.evento.clear()
+    finally:
+        observador.stop()
+        observador.join()
+
+    registrar_espera("download concluido", inicio, False)
+    return None
+
+
+def _esperar_download_polling(diretorio, caminho, teto, intervalo):
+    inicio = time.monotonic()
+    tamanho_anterior = None
+
+    while time.monotonic() - inicio < teto:
+        tamanho = tamanho_download(diretorio, caminho)
+        if tamanho and tamanho == tamanho_anterior:
+            registrar_espera("download concluido", inicio, True)
+            return caminho
+        tamanho_anterior = tamanho
+        time.sleep(intervalo)
+
+    registrar_espera("download concluido", inicio, False)
+    return None
+
+
+def esperar_download(diretorio, nome_arquivo, teto=60, intervalo=0.5):
+    """
+    Aguarda o arquivo de download existir, sem arquivos parciais no diretorio e com o tamanho estavel.
+    Com o watchdog instalado reage aos eventos do sistema de arquivos, sem ele verifica a cada `intervalo`.
+    Retorna o caminho do arquivo, ou None quando o teto é atingido.
+    """
+    caminho = os.path.join(diretorio, nome_arquivo)
+    if Observer is None:
+        return _esperar_download_polling(diretorio, caminho, teto, intervalo)
+    return _esperar_download_eventos(diretorio, caminho, teto, intervalo)
@@ -0,0 +1,708 @@
+import os
+import re
+import shutil
+import numpy as np
+import pandas as pd
+import requests
+import yfinance as yf
+from datetime import datetime, timedelta
+from agendador import TempoEsgotado, executar_concorrente, tarefa_cancelada
+from armazenamento_parquet import COLUNAS_DECIMAIS, salvar_mes_parquet
+from manifesto import ARQUIVO_MANIFESTO, Manifesto, ultimo_dia_fechado
+from metricas import METRICAS_NULAS
+from registro_tickers import ARQUIVO_UNIVERSO, diferenca_universo, salvar_universo
+
+
+# Colunas retornadas pelo yfinance (actions=True) e colunas salvas no historico
+COLUNAS_YF = ['Close', 'Dividends', 'High', 'Low', 'Open', 'Stock Splits', 'Volume']
+COLUNAS_HISTORICO = ['Date', 'Close', 'Dividends', 'High', 'Low', 'Open', 'Volume']
+
+# Coluna de desdobramentos/grupamentos, gravada depois do Ticker para manter a posição das colunas anteriores
+COLUNA_SPLITS = 'Stock Splits'
+
+# Casas decimais de cada coluna no CSV: desdobramentos como 1:3 (0,333333) perderiam precisão com duas casas
+CASAS_DECIMAIS = {COLUNA_SPLITS: 6}
+
+# Formato dos arquivos do historico registrado no manifesto. 2: preços sem ajuste (auto_adjust=False), os
+# diretorios sem o campo foram baixados com auto_adjust=True e são baixados novamente (ver PlanoHistorico)
+FORMATO_HISTORICO = 2
+
+# Data inicial do historico completo baixado para tickers que entram no universo
+DATA_BACKFILL_PADRAO = '2018-01-01'
+
+# Quantidade padrão de tickers por chamada no modo em lote
+TAMANHO_LOTE_PADRAO = 100
+
+# Intervalo das barras do historico diario
+INTERVALO_DIARIO = '1d'
+
+# Dias de historico disponiveis no Yahoo para cada intervalo intraday
+LIMITE_DIAS_INTRADAY = {'1m': 7, '2m': 59, '5m': 59, '15m': 59, '30m': 59, '60m': 729, '90m': 59, '1h': 729}
+
+# Formato da coluna Date nos arquivos intraday
+FORMATO_DATA_INTRADAY = '%Y-%m-%d %H:%M:%S'
+
+# Linhas lidas por vez do arquivo existente ao finalizar uma partição intraday
+LINHAS_POR_BLOCO = 200_000
+
+# Valores com modulo a partir deste limite (com duas casas) são formatados pelo f-string, acima dele os centavos
+# perdem precisão. Cada casa adicional divide o limite por 10
+LIMITE_FORMATACAO_VETORIZADA = 1e13
+
+# Parte decimal "00" a "99" usada na formatação dos valores
+_CENTAVOS = np.array([f'{centavos:02d}' for centavos in range(100)])
+
+
+def formatar_decimal_br(valores, casas=2):
+    """
+    Formata um array de valores com `casas` casas e virgula decimal, igual a f"{x: .2f}".replace('.', ',').
+    A formatação é feita sobre o array inteiro, valores vazios (NaN) viram texto vazio.
+    """
+    valores = np.asarray(valores, dtype='float64')
+    vazios = np.isnan(valores)
+    multiplicador = 10 ** casas
+
+    # Infinitos e valores fora da faixa exata dos centavos em int64 usam o f-string
+    fora_faixa = ~vazios & ~(np.abs(valores) < LIMITE_FORMATACAO_VETORIZADA / 10 ** (casas - 2))
+    escala = np.where(vazios | fora_faixa, 0.0, valores) * multiplicador
+    centavos = np.rint(escala)
+
+    # Valores na metade de um centavo dependem da representação binaria, seguem a regra do f-string
+    empates = np.abs(np.abs(escala - np.trunc(escala)) - 0.5) < 1e-6
+    if empates.any():
+        centavos[empates] = [round(float(f'{valor:.{casas}f}') * multiplicador) for valor in valores[empates]]
+
+    centavos = np.abs(centavos).astype('int64')
+    # O sinal segue o valor original: -0.0 e negativos arredondados para zero ficam "-0,00"
+    sinal = np.where(np.signbit(valores), '-', ' ')
+
+    texto = np.strings.add(np.strings.add(sinal, (centavos // multiplicador).astype(str)), ',')
+    decimais = _CENTAVOS[centavos % 100] if casas == 2 else \
+        np.strings.zfill((centavos % multiplicador).astype(str), casas)
+    texto = np.strings.add(texto, decimais)
+    if fora_faixa.any():
+        texto = texto.astype(object)
+        texto[fora_faixa] = [f'{valor: .{casas}f}'.replace('.', ',') for valor in valores[fora_faixa]]
+    return np.where(vazios, '', texto)
+
+
+def formatar_csv(dfMes):
+    """
+    Colunas de valores e de desdobramentos formatadas como texto com virgula decimal para o CSV.
+    """
+    colunas = COLUNAS_DECIMAIS + [COLUNA_SPLITS] if COLUNA_SPLITS in dfMes.columns else COLUNAS_DECIMAIS
+    return dfMes.assign(**{coluna: formatar_decimal_br(dfMes[coluna], CASAS_DECIMAIS.get(coluna, 2))
+                           for coluna in colunas})
+
+
+def normalizar_historico(dfTicker, Ticker):
+    """
+    Converte o DataFrame bruto do yfinance de um ticker no formato salvo no historico.
+    As colunas de valores continuam numericas, a formatação com virgula decimal é feita somente ao salvar o CSV.
+    Os preços são salvos sem o ajuste de proventos (auto_adjust=False), o ajuste é feito por cotacoes_ajustadas.
+    """
+
+    # Resentando o index do data frame para retirar a coluna "Date" do index
+    dfTicker = dfTicker.reset_index()
+    dfTicker = dfTicker.rename(columns={dfTicker.columns[0]: 'Date'})[COLUNAS_HISTORICO + [COLUNA_SPLITS]]
+    # O resultado em lote traz o nome do nivel das colunas ('Price'), removido para igualar ao download por ticker
+    dfTicker.columns.name = None
+    dfTicker['Volume'] = dfTicker['Volume'].astype('int64')
+
+    # Adicionando a coluna dos Tickers e todos os tickers em um unico DataFrame
+    dfTicker.insert(len(COLUNAS_HISTORICO), 'Ticker', Ticker)
+
+    return dfTicker
+
+
+def criar_sessao(max_conexoes=10):
+    """
+    Sessão HTTP com pool de conexões keep-alive compartilhada pelos downloads.
+    """
+    sessao = requests.Session()
+    adaptador = requests.adapters.HTTPAdapter(pool_connections=max_conexoes, pool_maxsize=max_conexoes)
+    sessao.mount('https://', adaptador)
+    sessao.mount('http://', adaptador)
+    return sessao
+
+
+def baixar_ticker(Tickers, start=None, end=None, actions=True, ignore_tz=True, rounding=True, timeout=10,
+                  session=None, interval=INTERVALO_DIARIO, **kwargs):
+    """
+    Download de um unico ticker via yf.Ticker().history, no mesmo formato de yf.download.
+    O yf.download guarda os resultados em variaveis globais do modulo e não pode ser chamado
+    em paralelo, por isso esta função é usada quando há mais de uma thread de download.
+    """
+    dfTicker = yf.Ticker(Tickers, session=session).history(start=start, end=end, interval=interval, actions=actions,
+                                          auto_adjust=False, rounding=rounding, timeout=timeout, raise_errors=True)
+
+    if ignore_tz and dfTicker.index.tz is not None:
+        dfTicker.index = dfTicker.index.tz_localize(None)
+    dfTicker.index.name = 'Date'
+
+    # Mesma ordem de colunas do yf.download
+    return dfTicker.reindex(columns=COLUNAS_YF, fill_value=0)
+
+
+def erros_yfinance():
+    """
+    Tickers com erro na ultima chamada do yf.download. O yf.download não gera exceção quando um ticker
+    falha, somente registra o erro e devolve o ticker vazio.
+    """
+    return dict(getattr(yf.shared, '_ERRORS', {}) or {})
+
+
+def tickers_falhos_lote(dfLote, tickers, group_by='ticker'):
+    """
+    Tickers de uma consulta em lote que falharam dentro de um resultado com dados: ausentes das colunas ou com
+    todas as colunas vazias. O yf.download preenche com NaN o bloco dos tickers que falharam no lote.
+
+    :param group_by: Agrupamento das colunas do resultado ('ticker' ou 'column'), como no yf.download.
+    """
+    if dfLote is None or dfLote.empty or not isinstance(dfLote.columns, pd.MultiIndex):
+        return []
+    preenchidos = dfLote.notna().any().groupby(level=0 if group_by == 'ticker' else 1).any()
+    return [ticker for ticker in tickers if not preenchidos.get(ticker, False)]
+
+
+def downloader_padrao(downloader=None, tamanho_lote=None, max_workers=1):
+    """
+    Downloader usado quando nenhum é informado: yf.download, ou baixar_ticker no modo por ticker com mais de
+    uma thread.
+    """
+    if downloader is not None:
+        return downloader
+    if not tamanho_lote and max_workers > 1:
+        return baixar_ticker
+    return yf.download
+
+
+def registrar_expiracao(ticker, inicio, fim, timeout, downloader=None, metricas=None):
+    """
+    Registra como falha o ticker abandonado por tempo esgotado (ver agendador.executar_concorrente): nas metricas
+    e no downloader que guarda o resultado das consultas (registro_falhas.DownloaderResiliente), se houver.
+    """
+    erro = TempoEsgotado(f'{ticker}: sem resposta em {timeout}s')
+    (metricas or METRICAS_NULAS).resultado(ticker, 'falha', erro=erro)
+    if hasattr(downloader, 'registrar_falha'):
+        downloader.registrar_falha(ticker, inicio, fim, repr(erro))
+
+
+def obter_historico(StartDate, EndDate, Tickers, downloader=None, timeout=10, session=None, metricas=None,
+                    interval=INTERVALO_DIARIO):
+    """
+    Obtem o historico de cada ticker na data especificada.
+    É feita cada consulta separadamente reduzindo o tempo de cada consulta.
+
+    :param downloader: Função compatível com yf.download (padrão: yf.download).
+    :param timeout: Tempo máximo em segundos da requisição.
+    :param session: Sessão HTTP compartilhada entre as requisições (None usa a sessão do yfinance).
+    :param metricas: metricas.Metricas da execução, registra as etapas fetch/transform e o resultado do ticker.
+    :param interval: Intervalo das barras ('1d', ou intraday como '5m'). No intraday a coluna Date tem o horario.
+    """
+    downloader = downloader or yf.download
+    metricas = metricas or METRICAS_NULAS
+
+    try:
+        # Download das cotações do yfinance
+        with metricas.etapa('fetch'):
+            dfTicker = downloader(Tickers, start=StartDate, end=EndDate, actions=True, auto_adjust=False,
+                                  ignore_tz=True, rounding=True, multi_level_index=False, progress=False,
+                                  timeout=timeout, session=session, interval=interval)
+
+        # Resposta que chegou depois do tempo esgotado: a tarefa já foi registrada como falha
+        if tarefa_cancelada():
+            return None
+
+        if dfTicker is None or dfTicker.empty:
+            # print(f"Nenhum dado encontrado para o ticker: {Tickers}")
+            metricas.resultado(Tickers, 'vazio')
+            return None
+
+        with metricas.etapa('transform'):
+            dfTicker = normalizar_historico(dfTicker, Tickers)
+        metricas.resultado(Tickers, 'ok', linhas=len(dfTicker))
+        return dfTicker
+
+    except Exception as e:
+        # print(f"Erro ao processar o ticker {Tickers}: {e}")
+        if not tarefa_cancelada():
+            metricas.resultado(Tickers, 'falha', erro=e)
+        return None
+
+
+def obter_historico_lote(StartDate, EndDate, Tickers, tamanho_lote=TAMANHO_LOTE_PADRAO, downloader=None,
+                         session=None, metricas=None):
+    """
+    Obtem o historico de varios tickers com uma chamada ao yfinance para cada lote de `tamanho_lote` tickers.
+    O resultado tem o mesmo formato de obter_historico e segue a ordem da lista de tickers.
+
+    :param downloader: Função compatível com yf.download (padrão: yf.download).
+    :param session: Sessão HTTP compartilhada entre as requisições (None usa a sessão do yfinance).
+    :param metricas: metricas.Metricas da execução. Um lote com erro conta como falha de todos os seus tickers.
+    """
+    downloader = downloader or yf.download
+    metricas = metricas or METRICAS_NULAS
+    dfTickers = []
+
+    for inicio in range(0, len(Tickers), tamanho_lote):
+        lote = list(Tickers[inicio:inicio + tamanho_lote])
+
+        try:
+            # Download de todos os tickers do lote agrupados por ticker no primeiro nivel das colunas
+            with metricas.etapa('fetch'):
+                dfLote = downloader(lote, start=StartDate, end=EndDate, actions=True, auto_adjust=False,
+                                    ignore_tz=True, rounding=True, group_by='ticker', progress=False,
+                                    session=session)
+        except Exception as e:
+            # print(f"Erro ao processar o lote {lote}: {e}")
+            for ticker in lote:
+                metricas.resultado(ticker, 'falha', erro=e)
+            continue
+
+        if dfLote is None or dfLote.empty:
+            for ticker in lote:
+                metricas.resultado(ticker, 'vazio')
+            continue
+
+        # O yf.download não gera exceção para os tickers que falharam dentro do lote: eles são omitidos do
+        # resultado ou vêm com todas as colunas vazias, e o erro fica somente em yf.shared._ERRORS
+        falhos = set(tickers_falhos_lote(dfLote, lote))
+        erros = erros_yfinance() if falhos else {}
+        with metricas.etapa('transform'):
+            for ticker in lote:
+                if ticker in falhos:
+                    metricas.resultado(ticker, 'falha', erro=erros.get(ticker.upper()))
+                    continue
+
+                # O index do lote é a uniao das datas de todos os tickers, dias sem negociação ficam vazios
+                dfTicker = dfLote[ticker][COLUNAS_YF].dropna(subset=['Close'])
+                if dfTicker.empty:
+                    metricas.resultado(ticker, 'vazio')
+                    continue
+
+                dfTicker = dfTicker.copy()
+                dfTicker['Volume'] = dfTicker['Volume'].fillna(0).astype('int64')
+                dfTickers.append(normalizar_historico(dfTicker, ticker))
+                metricas.resultado(ticker, 'ok', linhas=len(dfTicker))
+
+    if not dfTickers:
+        return None
+
+    with metricas.etapa('concat'):
+        return pd.concat(dfTickers, ignore_index=True)
+
+
+def separar_por_mes(dfHistorico):
+    """
+    Divide o historico em meses, mantendo a ordem original das linhas dentro de cada mês.
+    Retorna uma lista de tuplas (primeiro dia do mês, DataFrame do mês).
+    """
+    meses = dfHistorico['Date'].dt.to_period('M')
+    return [(periodo.to_timestamp().to_pydatetime(), dfMes.reset_index(drop=True))
+            for periodo, dfMes in dfHistorico.groupby(meses, sort=True)]
+
+
+def caminho_mes(diretorio, prefixo, data_mes):
+    """
+    Caminho do arquivo mensal '<prefixo>_MM_YYYY.csv' do diretorio.
+    """
+    return os.path.join(diretorio, f'{prefixo}_{data_mes.strftime("%m")}_{data_mes.strftime("%Y")}.csv')
+
+
+def meses_salvos(diretorio, prefixo):
+    """
+    Arquivos mensais '<prefixo>_MM_YYYY.csv' do diretorio, {primeiro dia do mês: caminho}.
+    """
+    meses = {}
+    for arquivo in os.listdir(diretorio) if os.path.exists(diretorio) else []:
+        match = re.match(rf'{re.escape(prefixo)}_(\d{{2}})_(\d{{4}})\.csv$', arquivo)
+        if match:
+            meses[pd.Timestamp(year=int(match.group(2)), month=int(match.group(1)), day=1)] = \
+                os.path.join(diretorio, arquivo)
+    return meses
+
+
+def ler_mes(nome_arquivo):
+    """
+    Le um arquivo mensal do historico com as colunas já numericas.
+    Arquivos salvos antes da coluna 'Stock Splits' recebem a coluna zerada.
+    """
+    dfMes = pd.read_csv(nome_arquivo, sep=';', decimal=',', skipinitialspace=True, parse_dates=['Date'],
+                        dtype={'Ticker': str, 'Volume': 'int64'})
+    if COLUNA_SPLITS not in dfMes.columns:
+        dfMes[COLUNA_SPLITS] = 0.0
+    return dfMes
+
+
+def mesclar_mes(dfMes, diretorio, prefixo, data_mes):
+    """
+    Mescla os dados novos de um mês com o arquivo mensal já salvo.
+    Datas repetidas de um mesmo ticker são substituidas pelos dados novos.
+    """
+    nome_arquivo = caminho_mes(diretorio, prefixo, data_mes)
+    if os.path.exists(nome_arquivo):
+        dfExistente = ler_mes(nome_arquivo)
+        dfMes = pd.concat([dfExistente, dfMes], ignore_index=True).drop_duplicates(
+            subset=['Ticker', 'Date'], keep='last')
+
+    return dfMes.sort_values(['Ticker', 'Date'], kind='stable').reset_index(drop=True)
+
+
+def salvar_mes(dfMes, diretorio, prefixo, data_mes, raiz_parquet=None):
+    """
+    Salva o DataFrame de um mês no arquivo '<prefixo>_MM_YYYY.csv' do diretorio.
+    Com raiz_parquet o mês também é gravado no armazenamento em parquet, na partição da classe '<prefixo>'.
+    """
+
+    # Criando o nome do arquivo para o mes e ano
+    nome_arquivo = caminho_mes(diretorio, prefixo, data_mes)
+
+    # Formatação com virgula decimal aplicada somente no CSV
+    dfCsv = formatar_csv(dfMes)
+
+    # Salvar o arquivo
+    dfCsv.to_csv(nome_arquivo, sep=';', decimal=',', index=False, date_format='%Y-%m-%d')
+    # print(f'Arquivo salvo em: {nome_arquivo}')
+
+    if raiz_parquet:
+        salvar_mes_parquet(dfMes, raiz_parquet, prefixo, data_mes)
+
+    return nome_arquivo
+
+
+class PlanoHistorico:
+    """
+    Dias faltantes de cada ticker de um diretorio de historico e gravação incremental do resultado.
+    O manifesto do diretorio guarda a ultima data salva de cada ticker, somente os dias seguintes são baixados.
+    Tickers sem registro no manifesto começam na data inicial. O universo de tickers é comparado com o da
+    execução anterior: tickers novos recebem o historico completo a partir de data_backfill e tickers
+    removidos são aposentados no manifesto.
+
+    Diretorios salvos antes de FORMATO_HISTORICO têm os preços ajustados pelo Yahoo. Com migrar_formato o
+    manifesto é migrado e os tickers já salvos são baixados novamente desde o primeiro mês salvo (ou data_backfill,
+    se anterior), substituindo os preços ajustados nos arquivos mensais. Sem migrar_formato o diretorio continua
+    no formato anterior e somente a estimativa da migração é exibida.
+    """
+
+    def __init__(self, data_inicial, diretorio, prefixo, tickers, data_backfill=DATA_BACKFILL_PADRAO, agora=None,
+                 migrar_formato=False):
+        self.diretorio = diretorio
+        self.prefixo = prefixo
+        self.tickers = list(tickers)
+
+        # A data final do yfinance é exclusiva, por isso usa o dia seguinte para incluir o dia atual
+        self.agora = agora or datetime.now()
+        self.fim_periodo = self.agora.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        data_padrao = datetime.strptime(data_inicial, "%Y-%m-%d")
+        data_novos = datetime.strptime(data_backfill, "%Y-%m-%d")
+
+        self.manifesto = Manifesto(os.path.join(diretorio, ARQUIVO_MANIFESTO))
+
+        # Tickers do formato anterior ficam no legado até serem gravados novamente, mesmo se a execução falhar
+        meses = sorted(meses_salvos(diretorio, prefixo))
+        data_migracao = min([data_novos] + [mes.to_pydatetime() for mes in meses[:1]])
+        if self.manifesto.formato != FORMATO_HISTORICO:
+            if meses:
+                qtd_meses = (self.fim_periodo.year - data_migracao.year) * 12 + self.fim_periodo.month - \
+                    data_migracao.month + 1
+                estimativa = (f'{len(self.tickers)} tickers desde {data_migracao:%Y-%m-%d}, '
+                              f'cerca de {len(self.tickers) * qtd_meses} pares (ticker, mês)')
+                if not migrar_formato:
+                    print(f'{prefixo}: historico salvo com preços ajustados. A migração para preços sem ajuste '
+                          f'baixa novamente {estimativa}, use migrar_formato=True para executá-la.')
+                else:
+                    print(f'{prefixo}: historico salvo com preços ajustados, baixando novamente sem ajuste '
+                          f'{estimativa}.')
+                    legado = {ticker: meses[-1].strftime('%Y-%m-%d') for ticker in self.tickers}
+                    legado.update(self.manifesto.datas)
+                    self.manifesto.datas = legado
+                    self.manifesto.migrar(FORMATO_HISTORICO)
+            else:
+                self.manifesto.migrar(FORMATO_HISTORICO)
+
+        # Diferença do universo de tickers em relação à execução anterior
+        self.caminho_universo = os.path.join(diretorio, ARQUIVO_UNIVERSO)
+        novos, removidos = diferenca_universo(self.caminho_universo, self.tickers)
+        for ticker in removidos:
+            self.manifesto.aposentar(ticker)
+        for ticker in novos:
+            self.manifesto.reativar(ticker)
+        novos = set(novos)
+
+        # Agrupa os tickers pela data do primeiro dia faltante
+        self.grupos = {}
+        for ticker in self.tickers:
+            ultima_data = self.manifesto.ultima_data(ticker)
+            if ultima_data:
+                inicio = ultima_data + timedelta(days=1)
+            elif ticker in self.manifesto.legado:
+                inicio = data_migracao
+            else:
+                inicio = data_novos if ticker in novos else data_padrao
+            if inicio < self.fim_periodo:
+                self.grupos.setdefault(inicio, []).append(ticker)
+
+    def tarefas(self):
+        """
+        Lista de (data inicial, ticker) a baixar, na ordem dos grupos.
+        """
+        return [(inicio, ticker) for inicio, tickers in self.grupos.items() for ticker in tickers]
+
+    def gravar(self, dfNovos, raiz_parquet=None, metricas=None):
+        """
+        Mescla os DataFrames baixados nos arquivos mensais e atualiza o manifesto e o universo salvo.
+        """
+        metricas = metricas or METRICAS_NULAS
+        dfNovos = [dfHistorico for dfHistorico in dfNovos if dfHistorico is not None]
+
+        if dfNovos:
+            # Concatena os dados de todos os tickers e mescla cada mês com o arquivo existente
+            with metricas.etapa('concat'):
+                dfNovos = pd.concat(dfNovos, ignore_index=True)
+                meses = separar_por_mes(dfNovos)
+            for data_mes, dfMes in meses:
+                with metricas.etapa('write'):
+                    dfMes = mesclar_mes(dfMes, self.diretorio, self.prefixo, data_mes)
+                    salvar_mes(dfMes, self.diretorio, self.prefixo, data_mes, raiz_parquet=raiz_parquet)
+                metricas.contar('meses_gravados')
+
+            # O dia atual só é registrado após o fechamento, durante o pregão ele é baixado novamente
+            dia_fechado = ultimo_dia_fechado(self.agora)
+            for ticker, data in dfNovos.groupby('Ticker')['Date'].max().items():
+                self.manifesto.atualizar(ticker, min(data.to_pydatetime(), dia_fechado))
+
+        self.manifesto.salvar()
+        salvar_universo(self.caminho_universo, self.tickers)
+
+
+def baixar_planos(planos, tamanho_lote=None, downloader=None, max_workers=1, taxa_requisicoes=None,
+                  timeout_requisicao=10, session=None, metricas=None):
+    """
+    Baixa os dias faltantes de varios planos com um unico pool de threads e uma unica sessão HTTP.
+    Retorna uma lista com os DataFrames baixados de cada plano, na mesma ordem dos planos.
+    """
+
+    if tamanho_lote:
+        # Um download por lote de tickers com a mesma data inicial. O yf.download não pode ser chamado
+        # em paralelo, os lotes seguem em sequencia e cada um é baixado com as threads do proprio yfinance
+        return [[obter_historico_lote(inicio, plano.fim_periodo, tickers, tamanho_lote=tamanho_lote,
+                                      downloader=downloader, session=session, metricas=metricas)
+                 for inicio, tickers in plano.grupos.items()]
+                for plano in planos]
+
+    downloader = downloader_padrao(downloader, tamanho_lote, max_workers)
+
+    # Processa os tickers de todos os planos no mesmo pool, o resultado mantém a ordem das tarefas
+    def processar(tarefa):
+        plano, inicio, ticker = tarefa
+        # print(f'Processando {ticker} de {inicio} a {plano.fim_periodo}')
+        return obter_historico(inicio, plano.fim_periodo, ticker, downloader=downloader,
+                               timeout=timeout_requisicao, session=session, metricas=metricas)
+
+    def expirar(tarefa):
+        plano, inicio, ticker = tarefa
+        registrar_expiracao(ticker, inicio, plano.fim_periodo, timeout_requisicao, downloader, metricas)
+
+    tarefas = [(plano, inicio, ticker) for plano in planos for inicio, ticker in plano.tarefas()]
+    resultados = executar_concorrente(processar, tarefas, max_workers=max_workers, taxa=taxa_requisicoes,
+                                      timeout=timeout_requisicao, ao_expirar=expirar)
+
+    dfPlanos = [[] for _ in planos]
+    posicoes = {id(plano): posicao for posicao, plano in enumerate(planos)}
+    for (plano, _, _), dfHistorico in zip(tarefas, resultados):
+        dfPlanos[posicoes[id(plano)]].append(dfHistorico)
+    return dfPlanos
+
+
+def salvar_historico(data_inicial, diretorio, prefixo, obter_tickers, tamanho_lote=None, downloader=None,
+                     max_workers=1, taxa_requisicoes=None, timeout_requisicao=10, raiz_parquet=None,
+                     data_backfill=DATA_BACKFILL_PADRAO, metricas=None, interval=INTERVALO_DIARIO,
+                     migrar_formato=False):
+    """
+    Atualiza o histórico de forma incremental e salva todos os tickers em arquivos mensais.
+    Somente os dias faltantes de cada ticker (ver PlanoHistorico) são baixados e mesclados nos arquivos existentes.
+    Salva no diretorio especifico criando um "DataBase"
+
+    :param prefixo: Prefixo dos arquivos mensais (ex.: 'Acoes_IBOV').
+    :param obter_tickers: Função que retorna a lista de tickers.
+    :param tamanho_lote: Quantidade de tickers por download. None consulta um ticker por vez.
+    :param downloader: Função compatível com yf.download (padrão: yf.download, ou baixar_ticker com mais de uma thread).
+    :param max_workers: Quantidade de downloads simultâneos no modo por ticker.
+    :param taxa_requisicoes: Limite de requisições por segundo no modo por ticker (None sem limite).
+    :param timeout_requisicao: Tempo máximo em segundos de cada requisição.
+    :param raiz_parquet: Diretorio do armazenamento em parquet (None salva somente os CSVs).
+    :param data_backfill: Data inicial dos tickers que entraram no universo desde a execução anterior.
+    :param metricas: metricas.Metricas que recebe os tempos das etapas e o resultado de cada ticker.
+    :param interval: '1d' (padrão) ou um intervalo intraday, gravado em streaming por salvar_intraday.
+    :param migrar_formato: Baixa novamente sem ajuste os diretorios salvos com preços ajustados (ver PlanoHistorico).
+    """
+    if interval != INTERVALO_DIARIO:
+        return salvar_intraday(diretorio, prefixo, obter_tickers(), interval=interval, downloader=downloader,
+                               max_workers=max_workers, taxa_requisicoes=taxa_requisicoes,
+                               timeout_requisicao=timeout_requisicao, raiz_parquet=raiz_parquet, metricas=metricas)
+
+    plano = PlanoHistorico(data_inicial, diretorio, prefixo, obter_tickers(), data_backfill=data_backfill,
+                           migrar_formato=migrar_formato)
+    dfNovos, = baixar_planos([plano], tamanho_lote=tamanho_lote, downloader=downloader, max_workers=max_workers,
+                             taxa_requisicoes=taxa_requisicoes, timeout_requisicao=timeout_requisicao,
+                             metricas=metricas)
+    plano.gravar(dfNovos, raiz_parquet=raiz_parquet, metricas=metricas)
+
+
+class EscritorParticoes:
+    """
+    Gravação em streaming do historico intraday nos arquivos mensais '<prefixo>_MM_YYYY.csv'.
+    Cada bloco de um ticker é acrescentado ao arquivo '.parcial' do mês assim que chega, sem acumular o
+    universo em memoria. finalizar() junta cada parcial com o arquivo já existente, lido em blocos, e
+    substitui o arquivo final de uma vez (os.replace): leitores nunca veem um mês pela metade.
+    """
+
+    def __init__(self, diretorio, prefixo, raiz_parquet=None):
+        self.diretorio = diretorio
+        self.prefixo = prefixo
+        self.raiz_parquet = raiz_parquet
+
+        # Por mês: {ticker: primeiro horario recebido}, as linhas existentes a partir dele são substituidas
+        self.inicios = {}
+        # Ultimo horario recebido de cada ticker, usado no manifesto
+        self.ultimas = {}
+        self.linhas = 0
+
+        # Parciais de uma execução interrompida nunca ficaram visiveis e são baixados de novo
+        os.makedirs(diretorio, exist_ok=True)
+        for arquivo in os.listdir(diretorio):
+            if arquivo.endswith('.parcial'):
+                os.remove(os.path.join(diretorio, arquivo))
+
+    def adicionar(self, dfTicker):
+        """
+        Acrescenta o historico de um ticker (formato de normalizar_historico) aos parciais dos meses.
+        """
+        if dfTicker is None or dfTicker.empty:
+            return
+
+        ticker = dfTicker['Ticker'].iat[0]
+        for data_mes, dfMes in separar_por_mes(dfTicker):
+            caminho = caminho_mes(self.diretorio, self.prefixo, data_mes) + '.parcial'
+            novo = data_mes not in self.inicios
+            inicios = self.inicios.setdefault(data_mes, {})
+            inicios[ticker] = min(inicios.get(ticker, dfMes['Date'].iat[0]), dfMes['Date'].min())
+
+            dfCsv = formatar_csv(dfMes)
+            dfCsv.to_csv(caminho, sep=';', decimal=',', index=False, header=novo, mode='w' if novo else 'a',
+                         date_format=FORMATO_DATA_INTRADAY)
+
+        self.ultimas[ticker] = max(self.ultimas.get(ticker, dfTicker['Date'].max()), dfTicker['Date'].max())
+        self.linhas += len(dfTicker)
+
+    def _finalizar_mes(self, data_mes, inicios):
+        nome_arquivo = caminho_mes(self.diretorio, self.prefixo, data_mes)
+        parcial = nome_arquivo + '.parcial'
+        inicios = pd.Series({ticker: inicio.strftime(FORMATO_DATA_INTRADAY) for ticker, inicio in inicios.items()},
+                            dtype=object)
+
+        with open(nome_arquivo + '.tmp', 'w', encoding='utf-8', newline='') as destino:
+            with open(parcial, encoding='utf-8', newline='') as origem:
+                cabecalho = origem.readline()
+            destino.write(cabecalho)
+
+            # Linhas existentes anteriores ao primeiro horario recebido de cada ticker, lidas em blocos como texto
+            if os.path.exists(nome_arquivo):
+                for bloco in pd.read_csv(nome_arquivo, sep=';', dtype=str, keep_default_na=False,
+                                         chunksize=LINHAS_POR_BLOCO):
+                    limite = bloco['Ticker'].map(inicios)
+                    bloco = bloco[limite.isna() | (bloco['Date'] < limite.fillna(''))]
+                    bloco.to_csv(destino, sep=';', index=False, header=False)
+
+            with open(parcial, encoding='utf-8', newline='') as origem:
+                origem.readline()
+                shutil.copyfileobj(origem, destino)
+
+        os.replace(nome_arquivo + '.tmp', nome_arquivo)
+        os.remove(parcial)
+
+        if self.raiz_parquet:
+            salvar_mes_parquet(ler_mes(nome_arquivo), self.raiz_parquet, self.prefixo, data_mes)
+        return nome_arquivo
+
+    def finalizar(self):
+        """
+        Torna visiveis os meses recebidos. Retorna a lista de arquivos finalizados.
+        """
+        arquivos = [self._finalizar_mes(data_mes, inicios) for data_mes, inicios in sorted(self.inicios.items())]
+        self.inicios = {}
+        return arquivos
+
+    def descartar(self):
+        for data_mes in self.inicios:
+            parcial = caminho_mes(self.diretorio, self.prefixo, data_mes) + '.parcial'
+            if os.path.exists(parcial):
+                os.remove(parcial)
+        self.inicios = {}
+
+
+def diretorio_intraday(diretorio, interval):
+    """
+    Subdiretorio do historico intraday de um intervalo, com manifesto proprio.
+    """
+    return os.path.join(diretorio, f'Intraday {interval}')
+
+
+def salvar_intraday(diretorio, prefixo, tickers, interval='5m', downloader=None, max_workers=4,
+                    taxa_requisicoes=None, timeout_requisicao=30, raiz_parquet=None, metricas=None,
+                    tickers_por_bloco=None, agora=None):
+    """
+    Atualiza o historico intraday ('1m', '5m', '1h', ...) em 'Intraday <interval>/<prefixo>_<interval>_MM_YYYY.csv'.
+    Cada ticker recomeça no dia seguinte ao ultimo dia fechado do manifesto, limitado à janela que o Yahoo
+    disponibiliza para o intervalo. Os tickers são baixados em blocos de `tickers_por_bloco` e gravados por um
+    EscritorParticoes, a memoria usada não depende do tamanho do universo.
+    Retorna a quantidade de linhas gravadas.
+    """
+    if interval not in LIMITE_DIAS_INTRADAY:
+        raise ValueError(f'Intervalo intraday não suportado: {interval}. Use um de {list(LIMITE_DIAS_INTRADAY)}')
+
+    metricas = metricas or METRICAS_NULAS
+    downloader = downloader_padrao(downloader, None, max_workers)
+    agora = agora or datetime.now()
+    hoje = agora.replace(hour=0, minute=0, second=0, microsecond=0)
+    fim = hoje + timedelta(days=1)
+    inicio_minimo = hoje - timedelta(days=LIMITE_DIAS_INTRADAY[interval] - 1)
+
+    diretorio = diretorio_intraday(diretorio, interval)
+    escritor = EscritorParticoes(diretorio, f'{prefixo}_{interval}', raiz_parquet=raiz_parquet)
+    manifesto = Manifesto(os.path.join(diretorio, ARQUIVO_MANIFESTO))
+
+    def inicio_ticker(ticker):
+        ultima_data = manifesto.ultima_data(ticker)
+        return max(inicio_minimo, ultima_data + timedelta(days=1)) if ultima_data else inicio_minimo
+
+    def processar(ticker):
+        return obter_historico(inicio_ticker(ticker), fim, ticker, downloader=downloader,
+                               timeout=timeout_requisicao, metricas=metricas, interval=interval)
+
+    def expirar(ticker):
+        registrar_expiracao(ticker, inicio_ticker(ticker), fim, timeout_requisicao, downloader, metricas)
+
+    tickers = list(tickers)
+    tickers_por_bloco = tickers_por_bloco or max(1, max_workers) * 4
+    try:
+        for inicio in range(0, len(tickers), tickers_por_bloco):
+            bloco = tickers[inicio:inicio + tickers_por_bloco]
+            for dfTicker in executar_concorrente(processar, bloco, max_workers=max_workers, taxa=taxa_requisicoes,
+                                                 timeout=timeout_requisicao, ao_expirar=expirar):
+                with metricas.etapa('write'):
+                    escritor.adicionar(dfTicker)
+
+        with metricas.etapa('finalize'):
+            escritor.finalizar()
+    except BaseException:
+        escritor.descartar()
+        raise
+
+    # Somente dias encerrados vão para o manifesto, o dia atual é baixado novamente na proxima execução
+    dia_fechado = ultimo_dia_fechado(agora)
+    for ticker, data in escritor.ultimas.items():
+        manifesto.atualizar(ticker, min(data.to_pydatetime().replace(hour=0, minute=0, second=0), dia_fechado))
+    manifesto.salvar()
+    return escritor.linhas
@@ -0,0 +1,262 @@
+import json
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow é opcional, usado somente pelo historico de indicadores em parquet
+    pa = ds = pq = None
+
+
+# Indice com as datas de cada snapshot, o tipo (keyframe ou delta) e a ordem das colunas
+ARQUIVO_INDICE = 'indice.json'
+
+# A cada N snapshots é gravada uma copia completa, limitando quantos deltas são aplicados na reconstrução
+INTERVALO_KEYFRAME = 30
+
+COLUNA_TICKER = 'TICKER'
+
+# Operações registradas no delta
+VALOR, INCLUSAO, REMOCAO = 'valor', 'inclusao', 'remocao'
+
+
+def _exigir_pyarrow():
+    if pa is None:
+        raise ImportError('pyarrow não instalado. Instale com: pip install pyarrow')
+
+
+def esquema_delta():
+    """
+    Esquema do delta em formato longo: uma linha por celula alterada, inclusão ou remoção de ticker.
+    Colunas numericas usam 'Valor' e colunas de texto (ex.: GESTAO dos FIIs) usam 'Texto'.
+    """
+    _exigir_pyarrow()
+    return pa.schema([
+        ('Data', pa.string()),
+        ('Ticker', pa.string()),
+        ('Coluna', pa.string()),
+        ('Operacao', pa.string()),
+        ('Valor', pa.float64()),
+        ('Texto', pa.string()),
+    ])
+
+
+def _celulas_alteradas(anterior, atual):
+    """
+    Mascara das celulas diferentes entre dois blocos alinhados, tratando NaN igual a NaN.
+    """
+    anterior = anterior.to_numpy()
+    atual = atual.to_numpy()
+    iguais = anterior == atual
+    iguais |= pd.isna(anterior) & pd.isna(atual)
+    return ~iguais
+
+
+def calcular_delta(anterior, atual):
+    """
+    Diferença entre dois snapshots indexados por ticker, em formato longo.
+    Tickers novos geram uma linha de inclusão e todos os valores preenchidos, tickers retirados uma linha de remoção.
+    """
+    removidos = anterior.index.difference(atual.index)
+    incluidos = atual.index.difference(anterior.index)
+
+    linhas = [pd.DataFrame({'Ticker': removidos, 'Operacao': REMOCAO}),
+              pd.DataFrame({'Ticker': incluidos, 'Operacao': INCLUSAO})]
+
+    # Tickers novos e colunas novas são comparados contra NaN
+    base = anterior.reindex(index=atual.index, columns=atual.columns)
+    numericas = [coluna for coluna in atual.columns if pd.api.types.is_numeric_dtype(atual[coluna])]
+    textos = [coluna for coluna in atual.columns if coluna not in numericas]
+
+    for colunas, campo in ((numericas, 'Valor'), (textos, 'Texto')):
+        if not colunas:
+            continue
+        bloco_atual = atual[colunas] if campo == 'Texto' else atual[colunas].astype('float64')
+        bloco_anterior = base[colunas] if campo == 'Texto' else \
+            base[colunas].apply(pd.to_numeric, errors='coerce').astype('float64')
+
+        posicao_linha, posicao_coluna = np.nonzero(_celulas_alteradas(bloco_anterior, bloco_atual))
+        linhas.append(pd.DataFrame({
+            'Ticker': atual.index[posicao_linha],
+            'Coluna': np.asarray(colunas, dtype=object)[posicao_coluna],
+            'Operacao': VALOR,
+            campo: bloco_atual.to_numpy()[posicao_linha, posicao_coluna],
+        }))
+
+    delta = pd.concat(linhas, ignore_index=True)
+    return delta.reindex(columns=['Ticker', 'Coluna', 'Operacao', 'Valor', 'Texto'])
+
+
+def aplicar_delta(estado, delta, colunas):
+    """
+    Aplica um delta ao estado (indexado por ticker) e retorna o novo estado com as colunas na ordem informada.
+    """
+    operacoes = delta['Operacao']
+    estado = estado.drop(index=delta.loc[operacoes == REMOCAO, 'Ticker'], errors='ignore')
+
+    incluidos = pd.Index(delta.loc[operacoes == INCLUSAO, 'Ticker']).difference(estado.index)
+    if len(incluidos):
+        estado = pd.concat([estado, pd.DataFrame(index=incluidos)])
+
+    estado = estado.reindex(columns=colunas)
+    valores = delta[operacoes == VALOR]
+    for coluna, grupo in valores.groupby('Coluna', sort=False):
+        # Colunas de texto chegam em 'Texto' ou já existem no estado como object
+        if grupo['Texto'].notna().any() or estado[coluna].dtype == object:
+            estado[coluna] = estado[coluna].astype(object)
+            novos = grupo['Texto'].where(grupo['Texto'].notna(), grupo['Valor'])
+        else:
+            estado[coluna] = estado[coluna].astype('float64')
+            novos = grupo['Valor']
+        estado.loc[grupo['Ticker'].to_numpy(), coluna] = novos.to_numpy()
+
+    return estado
+
+
+class HistoricoIndicadores:
+    """
+    Historico versionado dos CSVs de indicadores de uma classe de ativo.
+    Cada atualização é gravada como delta em parquet contra o snapshot anterior, com um keyframe completo
+    a cada `intervalo_keyframe` snapshots. A reconstrução de uma data aplica no maximo esse numero de deltas.
+
+    Estrutura do diretorio:
+        indice.json
+        keyframes/YYYY-MM-DD.parquet
+        deltas/YYYY-MM-DD.parquet
+    """
+
+    def __init__(self, raiz, intervalo_keyframe=INTERVALO_KEYFRAME):
+        _exigir_pyarrow()
+        self.raiz = raiz
+        self.intervalo_keyframe = intervalo_keyframe
+        self.snapshots = []
+
+        caminho_indice = os.path.join(raiz, ARQUIVO_INDICE)
+        if os.path.exists(caminho_indice):
+            with open(caminho_indice, encoding='utf-8') as arquivo:
+                self.snapshots = json.load(arquivo).get('snapshots', [])
+
+    def datas(self):
+        return [snapshot['data'] for snapshot in self.snapshots]
+
+    def _caminho(self, tipo, data):
+        return os.path.join(self.raiz, f'{tipo}s', f'{data}.parquet')
+
+    def _salvar_indice(self):
+        caminho_indice = os.path.join(self.raiz, ARQUIVO_INDICE)
+        with open(caminho_indice + '.tmp', 'w', encoding='utf-8') as arquivo:
+            json.dump({'atualizado_em': datetime.now().isoformat(timespec='seconds'),
+                       'snapshots': self.snapshots}, arquivo, indent=2, ensure_ascii=False)
+        os.replace(caminho_indice + '.tmp', caminho_indice)
+
+    def _gravar(self, tabela, tipo, data):
+        caminho = self._caminho(tipo, data)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        pq.write_table(tabela, caminho + '.tmp', compression='zstd')
+        os.replace(caminho + '.tmp', caminho)
+
+    def registrar(self, df, data=None):
+        """
+        Registra um snapshot do CSV de indicadores na data informada (padrão: hoje).
+        Uma nova atualização no mesmo dia substitui o snapshot do dia.
+
+        :param df: DataFrame com a coluna TICKER e os indicadores.
+        :return: Tipo gravado ('keyframe' ou 'delta').
+        """
+        data = pd.Timestamp(data or datetime.now()).strftime('%Y-%m-%d')
+        datas = self.datas()
+        if datas and data < datas[-1]:
+            raise ValueError(f'Snapshot de {data} anterior ao ultimo registrado ({datas[-1]}).')
+        substituido = self.snapshots.pop() if datas and data == datas[-1] else None
+
+        atual = df.drop_duplicates(subset=COLUNA_TICKER).set_index(COLUNA_TICKER)
+        colunas = list(atual.columns)
+
+        desde_keyframe = 0
+        for snapshot in reversed(self.snapshots):
+            if snapshot['tipo'] == 'keyframe':
+                break
+            desde_keyframe += 1
+
+        if not self.snapshots or desde_keyframe + 1 >= self.intervalo_keyframe:
+            tipo = 'keyframe'
+            self._gravar(pa.Table.from_pandas(atual.reset_index(), preserve_index=False), tipo, data)
+        else:
+            tipo = 'delta'
+            delta = calcular_delta(self.estado_em(self.snapshots[-1]['data']), atual)
+            delta.insert(0, 'Data', data)
+            self._gravar(pa.Table.from_pandas(delta, schema=esquema_delta(), preserve_index=False), tipo, data)
+
+        self.snapshots.append({'data': data, 'tipo': tipo, 'colunas': colunas})
+        self._salvar_indice()
+
+        # O snapshot substituido só é removido depois que o indice aponta para o novo arquivo
+        if substituido and substituido['tipo'] != tipo:
+            os.remove(self._caminho(substituido['tipo'], data))
+        return tipo
+
+    def estado_em(self, data):
+        """
+        Indicadores como estavam na data informada (ultimo snapshot até a data), indexados por ticker.
+        """
+        data = pd.Timestamp(data).strftime('%Y-%m-%d')
+        posicao = max((i for i, snapshot in enumerate(self.snapshots) if snapshot['data'] <= data), default=None)
+        if posicao is None:
+            raise KeyError(f'Nenhum snapshot até {data}.')
+
+        inicio = max(i for i in range(posicao + 1) if self.snapshots[i]['tipo'] == 'keyframe')
+        estado = pq.read_table(self._caminho('keyframe', self.snapshots[inicio]['data'])).to_pandas()
+        estado = estado.set_index(COLUNA_TICKER)
+
+        for snapshot in self.snapshots[inicio + 1:posicao + 1]:
+            delta = pq.read_table(self._caminho('delta', snapshot['data'])).to_pandas()
+            estado = aplicar_delta(estado, delta, snapshot['colunas'])
+
+        return estado
+
+    def serie_ticker(self, ticker, colunas=None):
+        """
+        Serie temporal dos indicadores de um ticker, uma linha por snapshot em que o ticker existia.
+        Somente as linhas do ticker são lidas dos keyframes e deltas (filtro aplicado na leitura).
+        """
+        if not self.snapshots:
+            return pd.DataFrame()
+
+        caminhos = {tipo: [self._caminho(tipo, snapshot['data']) for snapshot in self.snapshots
+                           if snapshot['tipo'] == tipo] for tipo in ('keyframe', 'delta')}
+
+        keyframes = {}
+        for caminho in caminhos['keyframe']:
+            tabela = pq.read_table(caminho, filters=[(COLUNA_TICKER, '=', ticker)])
+            keyframes[os.path.basename(caminho)[:-len('.parquet')]] = tabela.to_pandas().set_index(COLUNA_TICKER)
+
+        deltas = pd.DataFrame(columns=esquema_delta().names)
+        if caminhos['delta']:
+            deltas = ds.dataset(caminhos['delta'], format='parquet', schema=esquema_delta()).to_table(
+                filter=ds.field('Ticker') == ticker).to_pandas()
+        deltas_por_data = dict(tuple(deltas.groupby('Data', sort=False)))
+
+        estado = pd.DataFrame()
+        serie = {}
+        for snapshot in self.snapshots:
+            if snapshot['tipo'] == 'keyframe':
+                estado = keyframes[snapshot['data']]
+            elif snapshot['data'] in deltas_por_data:
+                estado = aplicar_delta(estado, deltas_por_data[snapshot['data']], snapshot['colunas'])
+            else:
+                estado = estado.reindex(columns=snapshot['colunas'])
+
+            if ticker in estado.index:
+                serie[snapshot['data']] = estado.loc[ticker]
+
+        if not serie:
+            return pd.DataFrame()
+
+        serie = pd.DataFrame.from_dict(serie, orient='index')
+        serie.index = pd.to_datetime(serie.index)
+        serie.index.name = 'Data'
+        return serie[list(colunas)] if colunas is not None else serie
@@ -0,0 +1,55 @@
+import os
+import requests
+
+
+# Exportação da busca avançada do Status Invest, a mesma usada pelo botão de download da pagina
+URL_BASE = 'https://statusinvest.com.br'
+CAMINHO_EXPORTACAO = '/category/advancedsearchresultexport'
+
+# CategoryType da busca avançada de cada classe de ativo
+CATEGORIAS = {'acoes': 1, 'fii': 2}
+
+CABECALHOS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+                  'Chrome/131.0.0.0 Safari/537.36',
+    'Accept': 'text/csv,application/octet-stream,*/*',
+}
+
+
+def criar_sessao(max_conexoes=4):
+    """
+    Sessão HTTP com conexões keep-alive reaproveitadas entre os downloads.
+    """
+    sessao = requests.Session()
+    sessao.headers.update(CABECALHOS)
+    adaptador = requests.adapters.HTTPAdapter(pool_connections=max_conexoes, pool_maxsize=max_conexoes)
+    sessao.mount('https://', adaptador)
+    sessao.mount('http://', adaptador)
+    return sessao
+
+
+def baixar_indicadores(categoria, destino, sessao=None, url_base=URL_BASE, timeout=30):
+    """
+    Baixa o CSV da busca avançada do Status Invest direto por HTTP, sem abrir o navegador.
+    O arquivo é gravado em um temporario e movido para o destino somente quando completo.
+
+    :param categoria: Chave de CATEGORIAS ('acoes' ou 'fii').
+    :param destino: Caminho final do CSV (ex.: 'Indicadores Financeiros/Indicadores_AcoesIBOV.csv').
+    :param url_base: Endereço do Status Invest (pode apontar para um servidor local com CSVs de exemplo).
+    :return: Caminho do arquivo salvo.
+    """
+    sessao = sessao or criar_sessao()
+    resposta = sessao.get(url_base + CAMINHO_EXPORTACAO, params={'search': '{}', 'CategoryType': CATEGORIAS[categoria]},
+                          timeout=timeout)
+    resposta.raise_for_status()
+
+    # Respostas de bloqueio/erro chegam como HTML, o CSV valido começa pelo cabeçalho TICKER
+    conteudo = resposta.content
+    if not conteudo.lstrip(b'\xef\xbb\xbf').startswith(b'TICKER;'):
+        raise ValueError(f'Resposta inesperada do Status Invest para {categoria}: {conteudo[:80]!r}')
+
+    os.makedirs(os.path.dirname(destino) or '.', exist_ok=True)
+    with open(destino + '.tmp', 'wb') as arquivo:
+        arquivo.write(conteudo)
+    os.replace(destino + '.tmp', destino)
+    return destino
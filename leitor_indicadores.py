@@ -0,0 +1,106 @@
+import hashlib
+import os
+import pandas as pd
+
+
+# Colunas do CSV da busca avançada de ações do Status Invest (nomes já sem espaços nas pontas)
+COLUNAS_ACOES = [
+    'TICKER', 'PRECO', 'DY', 'P/L', 'P/VP', 'P/ATIVOS', 'MARGEM BRUTA', 'MARGEM EBIT', 'MARG. LIQUIDA', 'P/EBIT',
+    'EV/EBIT', 'DIVIDA LIQUIDA / EBIT', 'DIV. LIQ. / PATRI.', 'PSR', 'P/CAP. GIRO', 'P. AT CIR. LIQ.',
+    'LIQ. CORRENTE', 'ROE', 'ROA', 'ROIC', 'PATRIMONIO / ATIVOS', 'PASSIVOS / ATIVOS', 'GIRO ATIVOS',
+    'CAGR RECEITAS 5 ANOS', 'CAGR LUCROS 5 ANOS', 'LIQUIDEZ MEDIA DIARIA', 'VPA', 'LPA', 'PEG Ratio',
+    'VALOR DE MERCADO',
+]
+
+# Colunas do CSV da busca avançada de fundos imobiliarios
+COLUNAS_FII = [
+    'TICKER', 'PRECO', 'ULTIMO DIVIDENDO', 'DY', 'VALOR PATRIMONIAL COTA', 'P/VP', 'LIQUIDEZ MEDIA DIARIA',
+    'PERCENTUAL EM CAIXA', 'CAGR DIVIDENDOS 3 ANOS', 'CAGR VALOR CORA 3 ANOS', 'PATRIMONIO', 'N COTISTAS',
+    'GESTAO', 'N COTAS',
+]
+
+ESQUEMAS = {'acoes': COLUNAS_ACOES, 'fii': COLUNAS_FII}
+
+# Colunas mantidas como texto, todas as demais são lidas como float64
+COLUNAS_TEXTO = ('TICKER', 'GESTAO')
+
+# Versão do formato do cache, alterar quando o parser mudar para invalidar os arquivos antigos
+VERSAO_CACHE = 1
+
+
+def normalizar_colunas(colunas):
+    """
+    Remove espaços nas pontas dos nomes das colunas (ex.: ' LIQUIDEZ MEDIA DIARIA').
+    """
+    return [str(coluna).strip() for coluna in colunas]
+
+
+def identificar_classe(colunas):
+    """
+    Classe do CSV pelo cabeçalho: a coluna GESTAO só existe na busca de fundos imobiliarios.
+    """
+    return 'fii' if 'GESTAO' in colunas else 'acoes'
+
+
+def ler_indicadores(caminho_csv, classe=None):
+    """
+    Le o CSV de indicadores do Status Invest em uma unica passada do parser C do pandas.
+    Separador ';', virgula decimal e ponto de milhar, celulas vazias viram NaN e valores numericos float64.
+
+    :param classe: 'acoes' ou 'fii'. None identifica pelo cabeçalho.
+    :return: DataFrame com as colunas do esquema da classe, na ordem declarada.
+    """
+    with open(caminho_csv, encoding='utf-8-sig') as arquivo:
+        colunas = normalizar_colunas(arquivo.readline().rstrip('\r\n').split(';'))
+
+    classe = classe or identificar_classe(colunas)
+    dtypes = {coluna: str if coluna in COLUNAS_TEXTO else 'float64' for coluna in colunas}
+
+    df = pd.read_csv(caminho_csv, sep=';', decimal=',', thousands='.', header=0, names=colunas, dtype=dtypes,
+                     encoding='utf-8-sig')
+
+    # Colunas do esquema ausentes no arquivo ficam vazias, colunas extras são mantidas no final
+    esquema = ESQUEMAS[classe]
+    faltantes = [coluna for coluna in esquema if coluna not in df.columns]
+    if faltantes:
+        print(f'Colunas ausentes em {os.path.basename(caminho_csv)}: {faltantes}')
+    extras = [coluna for coluna in df.columns if coluna not in esquema]
+    return df.reindex(columns=esquema + extras)
+
+
+def hash_arquivo(caminho):
+    """
+    sha1 do conteudo do arquivo.
+    """
+    with open(caminho, 'rb') as arquivo:
+        return hashlib.sha1(arquivo.read()).hexdigest()
+
+
+def carregar_indicadores(caminho_csv, classe=None, diretorio_cache=None):
+    """
+    Le o CSV de indicadores usando um cache binario (pickle) identificado pelo hash do conteudo.
+    Enquanto o arquivo não mudar a leitura é feita direto do cache, sem passar pelo parser do CSV.
+
+    :param diretorio_cache: Diretorio do cache (padrão: '.cache' ao lado do CSV).
+    """
+    if not os.path.exists(caminho_csv):
+        raise FileNotFoundError(f'Diretorio não encontrado: {caminho_csv}')
+
+    diretorio_cache = diretorio_cache or os.path.join(os.path.dirname(os.path.abspath(caminho_csv)), '.cache')
+    nome_base = os.path.splitext(os.path.basename(caminho_csv))[0]
+    chave = f'{nome_base}.{classe or "auto"}.v{VERSAO_CACHE}'
+    caminho_cache = os.path.join(diretorio_cache, f'{chave}.{hash_arquivo(caminho_csv)[:16]}.pkl')
+
+    if os.path.exists(caminho_cache):
+        return pd.read_pickle(caminho_cache)
+
+    df = ler_indicadores(caminho_csv, classe)
+
+    # Substitui o cache da versão anterior do arquivo
+    os.makedirs(diretorio_cache, exist_ok=True)
+    for arquivo in os.listdir(diretorio_cache):
+        if arquivo.startswith(chave + '.'):
+            os.remove(os.path.join(diretorio_cache, arquivo))
+    df.to_pickle(caminho_cache + '.tmp')
+    os.replace(caminho_cache + '.tmp', caminho_cache)
+    return df
@@ -0,0 +1,103 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+
+# Nome do arquivo de manifesto salvo em cada diretorio de historico
+ARQUIVO_MANIFESTO = 'manifesto.json'
+
+# Hora a partir da qual o pregão do dia é considerado fechado
+HORA_FECHAMENTO = 19
+
+
+def ultimo_dia_fechado(agora=None):
+    """
+    Ultimo dia com dados completos: o dia atual após o fechamento, ou o dia anterior durante o pregão.
+    """
+    agora = agora or datetime.now()
+    hoje = agora.replace(hour=0, minute=0, second=0, microsecond=0)
+    return hoje if agora.hour >= HORA_FECHAMENTO else hoje - timedelta(days=1)
+
+
+class Manifesto:
+    """
+    Registro da ultima data salva de cada chave (ticker ou fonte) de um diretorio de historico.
+    Salvo em JSON no formato {"formato": 2, "datas": {"PETR4.SA": "2025-01-31", ...}, "aposentados": {...}}.
+    Tickers que sairam do universo ficam em "aposentados" com a data em que foram retirados.
+    "formato" identifica o conteudo dos arquivos do diretorio (None em manifestos anteriores ao campo). Após uma
+    troca de formato as datas anteriores ficam em "legado" até a chave ser gravada novamente no formato atual.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.formato = None
+        self.datas = {}
+        self.aposentados = {}
+        self.legado = {}
+
+        if os.path.exists(caminho):
+            with open(caminho, encoding='utf-8') as arquivo:
+                conteudo = json.load(arquivo)
+            self.formato = conteudo.get('formato')
+            self.datas = conteudo.get('datas', {})
+            self.aposentados = conteudo.get('aposentados', {})
+            self.legado = conteudo.get('legado', {})
+
+    def __contains__(self, chave):
+        return chave in self.datas
+
+    def __len__(self):
+        return len(self.datas)
+
+    def ultima_data(self, chave):
+        """
+        Ultima data salva da chave, ou None se a chave ainda não foi registrada.
+        """
+        data = self.datas.get(chave)
+        return datetime.strptime(data, '%Y-%m-%d') if data else None
+
+    def atualizar(self, chave, data):
+        """
+        Registra a data salva da chave, mantendo sempre a maior data já registrada.
+        """
+        data = data.strftime('%Y-%m-%d')
+        if data > self.datas.get(chave, ''):
+            self.datas[chave] = data
+        self.legado.pop(chave, None)
+
+    def migrar(self, formato):
+        """
+        Troca o formato do diretorio. As datas registradas no formato anterior deixam de valer e passam para o
+        legado, as chaves voltam a ser gravadas desde o inicio.
+        """
+        self.legado.update(self.datas)
+        self.datas = {}
+        self.formato = formato
+
+    def aposentar(self, chave, data=None):
+        """
+        Marca a chave como retirada do universo, mantendo a ultima data salva.
+        """
+        self.aposentados[chave] = (data or datetime.now()).strftime('%Y-%m-%d')
+
+    def reativar(self, chave):
+        """
+        Remove a marcação de aposentado de uma chave que voltou ao universo.
+        """
+        self.aposentados.pop(chave, None)
+
+    def salvar(self):
+        """
+        Grava o manifesto em um arquivo temporario e substitui o anterior.
+        """
+        os.makedirs(os.path.dirname(self.caminho) or '.', exist_ok=True)
+        with open(self.caminho + '.tmp', 'w', encoding='utf-8') as arquivo:
+            conteudo = {'atualizado_em': datetime.now().isoformat(timespec='seconds')}
+            if self.formato is not None:
+                conteudo['formato'] = self.formato
+            conteudo['datas'] = dict(sorted(self.datas.items()))
+            conteudo['aposentados'] = dict(sorted(self.aposentados.items()))
+            if self.legado:
+                conteudo['legado'] = dict(sorted(self.legado.items()))
+            json.dump(conteudo, arquivo, indent=2)
+        os.replace(self.caminho + '.tmp', self.caminho)
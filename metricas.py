@@ -0,0 +1,267 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+
+# Limites (em segundos) dos histogramas de latencia de cada etapa
+LIMITES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Classificação do resultado de cada ticker consultado
+RESULTADOS = ('ok', 'vazio', 'falha')
+
+# Prefixo das metricas no arquivo do Prometheus
+PREFIXO_PROMETHEUS = 'projeto_investimento'
+
+# Quantidade máxima de falhas detalhadas (ticker e erro) guardadas no relatorio
+MAXIMO_FALHAS_RELATORIO = 200
+
+
+class Histograma:
+    """
+    Histograma cumulativo de latencias no formato do Prometheus (contagem por limite superior, soma e total).
+    """
+
+    def __init__(self, limites=LIMITES_LATENCIA):
+        self.limites = tuple(limites)
+        self.contagens = [0] * (len(self.limites) + 1)
+        self.soma = 0.0
+        self.total = 0
+        self.maximo = 0.0
+
+    def observar(self, valor):
+        posicao = len(self.limites)
+        for indice, limite in enumerate(self.limites):
+            if valor <= limite:
+                posicao = indice
+                break
+        self.contagens[posicao] += 1
+        self.soma += valor
+        self.total += 1
+        self.maximo = max(self.maximo, valor)
+
+    def cumulativo(self):
+        """
+        Lista de (limite, quantidade de observações <= limite), terminando em '+Inf'.
+        """
+        acumulado, resultado = 0, []
+        for limite, contagem in zip(self.limites + ('+Inf',), self.contagens):
+            acumulado += contagem
+            resultado.append((limite, acumulado))
+        return resultado
+
+    def quantil(self, q):
+        """
+        Quantil aproximado pelo limite superior do intervalo (o maximo observado no ultimo intervalo).
+        """
+        if not self.total:
+            return None
+        alvo = q * self.total
+        for limite, acumulado in self.cumulativo():
+            if acumulado >= alvo:
+                return self.maximo if limite == '+Inf' else min(limite, self.maximo)
+        return self.maximo
+
+    def resumo(self):
+        return {'quantidade': self.total, 'total_s': round(self.soma, 6),
+                'media_s': round(self.soma / self.total, 6) if self.total else None,
+                'p50_s': self.quantil(0.5), 'p95_s': self.quantil(0.95), 'maximo_s': round(self.maximo, 6),
+                'histograma': {str(limite): acumulado for limite, acumulado in self.cumulativo()}}
+
+
+class Metricas:
+    """
+    Metricas de uma execução da ingestão: latencia das etapas (fetch, transform, concat, write), resultado de
+    cada ticker (ok, vazio ou falha), retentativas e contadores livres. Segura para uso entre threads.
+
+    Uso:
+        metricas = Metricas()
+        with metricas.etapa('fetch'):
+            ...
+        metricas.resultado('PETR4.SA', 'ok', linhas=21)
+        metricas.salvar_relatorio('execucao.json')
+        metricas.salvar_prometheus('/var/lib/node_exporter/textfile/projeto_investimento.prom')
+    """
+
+    def __init__(self, nome='ingestao'):
+        self.nome = nome
+        self.inicio = time.time()
+        self.fim = None
+        self.etapas = {}
+        self.resultados = dict.fromkeys(RESULTADOS, 0)
+        self.falhas = []
+        self.retentativas = 0
+        self.contadores = {}
+        self._trava = threading.Lock()
+
+    @contextmanager
+    def etapa(self, nome):
+        """
+        Mede o tempo do bloco e registra no histograma da etapa, inclusive quando o bloco gera exceção.
+        """
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nome, time.perf_counter() - inicio)
+
+    def observar(self, etapa, segundos):
+        with self._trava:
+            if etapa not in self.etapas:
+                self.etapas[etapa] = Histograma()
+            self.etapas[etapa].observar(segundos)
+
+    def resultado(self, ticker, situacao, linhas=0, erro=None):
+        """
+        Registra o resultado da consulta de um ticker: 'ok', 'vazio' (sem dados no periodo) ou 'falha'.
+        """
+        with self._trava:
+            self.resultados[situacao] += 1
+            self.contadores['linhas'] = self.contadores.get('linhas', 0) + linhas
+            if situacao == 'falha' and len(self.falhas) < MAXIMO_FALHAS_RELATORIO:
+                self.falhas.append({'ticker': ticker, 'erro': repr(erro) if erro is not None else None})
+
+    def retentativa(self, quantidade=1):
+        with self._trava:
+            self.retentativas += quantidade
+
+    def contar(self, nome, quantidade=1):
+        with self._trava:
+            self.contadores[nome] = self.contadores.get(nome, 0) + quantidade
+
+    def finalizar(self):
+        self.fim = self.fim or time.time()
+        return self
+
+    def duracao(self):
+        return (self.fim or time.time()) - self.inicio
+
+    def relatorio(self):
+        """
+        Relatorio da execução em um dict serializavel em JSON.
+        """
+        with self._trava:
+            consultados = sum(self.resultados.values())
+            duracao = self.duracao()
+            return {
+                'nome': self.nome,
+                'inicio': datetime.fromtimestamp(self.inicio).isoformat(timespec='seconds'),
+                'fim': datetime.fromtimestamp(self.fim).isoformat(timespec='seconds') if self.fim else None,
+                'duracao_s': round(duracao, 3),
+                'tickers': {**self.resultados, 'total': consultados,
+                            'por_segundo': round(consultados / duracao, 3) if duracao > 0 else None},
+                'retentativas': self.retentativas,
+                'contadores': dict(self.contadores),
+                'etapas': {nome: histograma.resumo() for nome, histograma in self.etapas.items()},
+                'falhas': list(self.falhas),
+            }
+
+    def resumo_texto(self):
+        relatorio = self.relatorio()
+        tickers = relatorio['tickers']
+        linhas = [f"{self.nome}: {tickers['total']} tickers em {relatorio['duracao_s']:.1f}s "
+                  f"({tickers['por_segundo'] or 0:.1f}/s) - ok {tickers['ok']}, vazios {tickers['vazio']}, "
+                  f"falhas {tickers['falha']}, retentativas {relatorio['retentativas']}"]
+        for nome, etapa in relatorio['etapas'].items():
+            linhas.append(f"  {nome:<10} {etapa['quantidade']:>6}x  total {etapa['total_s']:8.2f}s  "
+                          f"p50 {etapa['p50_s']:.3f}s  p95 {etapa['p95_s']:.3f}s  max {etapa['maximo_s']:.3f}s")
+        return '\n'.join(linhas)
+
+    def salvar_relatorio(self, caminho):
+        """
+        Grava o relatorio em JSON (escrita atomica).
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+        with open(caminho + '.tmp', 'w', encoding='utf-8') as arquivo:
+            json.dump(self.relatorio(), arquivo, indent=2, ensure_ascii=False)
+        os.replace(caminho + '.tmp', caminho)
+        return caminho
+
+    def texto_prometheus(self):
+        """
+        Metricas no formato texto do Prometheus, para o textfile collector do node exporter.
+        """
+        relatorio = self.relatorio()
+        rotulo = f'execucao="{self.nome}"'
+        p = PREFIXO_PROMETHEUS
+        linhas = [
+            f'# HELP {p}_tickers Tickers consultados na ultima execução por resultado.',
+            f'# TYPE {p}_tickers gauge',
+            *[f'{p}_tickers{{{rotulo},resultado="{situacao}"}} {quantidade}'
+              for situacao, quantidade in self.resultados.items()],
+            f'# HELP {p}_retentativas Retentativas de download na ultima execução.',
+            f'# TYPE {p}_retentativas gauge',
+            f'{p}_retentativas{{{rotulo}}} {self.retentativas}',
+            f'# HELP {p}_tickers_por_segundo Tickers consultados por segundo na ultima execução.',
+            f'# TYPE {p}_tickers_por_segundo gauge',
+            f'{p}_tickers_por_segundo{{{rotulo}}} {relatorio["tickers"]["por_segundo"] or 0}',
+            f'# HELP {p}_execucao_duracao_segundos Duração da ultima execução.',
+            f'# TYPE {p}_execucao_duracao_segundos gauge',
+            f'{p}_execucao_duracao_segundos{{{rotulo}}} {relatorio["duracao_s"]}',
+            f'# HELP {p}_execucao_timestamp_segundos Horario de termino da ultima execução.',
+            f'# TYPE {p}_execucao_timestamp_segundos gauge',
+            f'{p}_execucao_timestamp_segundos{{{rotulo}}} {int(self.fim or time.time())}',
+            f'# HELP {p}_etapa_segundos Latencia das etapas da ingestão.',
+            f'# TYPE {p}_etapa_segundos histogram',
+        ]
+        with self._trava:
+            for nome, histograma in self.etapas.items():
+                for limite, acumulado in histograma.cumulativo():
+                    linhas.append(f'{p}_etapa_segundos_bucket{{{rotulo},etapa="{nome}",le="{limite}"}} {acumulado}')
+                linhas.append(f'{p}_etapa_segundos_sum{{{rotulo},etapa="{nome}"}} {histograma.soma:.6f}')
+                linhas.append(f'{p}_etapa_segundos_count{{{rotulo},etapa="{nome}"}} {histograma.total}')
+        return '\n'.join(linhas) + '\n'
+
+    def salvar_prometheus(self, caminho):
+        """
+        Grava o arquivo .prom. A escrita é atomica para o node exporter nunca ler um arquivo pela metade.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+        with open(caminho + '.tmp', 'w', encoding='utf-8') as arquivo:
+            arquivo.write(self.texto_prometheus())
+        os.replace(caminho + '.tmp', caminho)
+        return caminho
+
+
+class MetricasNulas(Metricas):
+    """
+    Metricas que descartam tudo, usadas quando a execução não coleta metricas.
+    """
+
+    @contextmanager
+    def etapa(self, nome):
+        yield
+
+    def observar(self, etapa, segundos):
+        pass
+
+    def resultado(self, ticker, situacao, linhas=0, erro=None):
+        pass
+
+    def retentativa(self, quantidade=1):
+        pass
+
+    def contar(self, nome, quantidade=1):
+        pass
+
+
+METRICAS_NULAS = MetricasNulas()
+
+
+def salvar_execucao(metricas, diretorio, caminho_prometheus=None):
+    """
+    Finaliza as metricas, mostra o resumo e grava o relatorio 'execucao_<nome>_<data>.json' no diretorio.
+    Com caminho_prometheus também grava o arquivo .prom lido pelo node exporter.
+    """
+    metricas.finalizar()
+    print(metricas.resumo_texto())
+
+    carimbo = datetime.fromtimestamp(metricas.inicio).strftime('%Y%m%d_%H%M%S')
+    caminho = metricas.salvar_relatorio(os.path.join(diretorio, f'execucao_{metricas.nome}_{carimbo}.json'))
+    print(f'Relatorio da execução salvo em: {caminho}')
+
+    if caminho_prometheus:
+        metricas.salvar_prometheus(caminho_prometheus)
+    return caminho
@@ -0,0 +1,192 @@
+import os
+import re
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from cache_respostas import CacheRespostas
+from cotacoes_ajustadas import CotacoesAjustadas
+from cubo_cotacoes import CuboCotacoes
+from historico_cotacoes import (DATA_BACKFILL_PADRAO, PlanoHistorico, baixar_planos, criar_sessao, downloader_padrao,
+                                salvar_intraday)
+from metricas import METRICAS_NULAS
+from registro_falhas import TENTATIVAS_DOWNLOAD, Disjuntor, DownloaderResiliente, RegistroFalhas, reparar_historico
+from registro_tickers import obter_registro
+
+
+# Classes de ativos: pasta do historico, prefixo dos arquivos mensais e CSV do Status Invest com os tickers
+# Novas classes (BDRs, ETFs) só precisam de uma entrada aqui e do CSV de indicadores correspondente
+CLASSES_ATIVOS = {
+    'acoes': {'pasta': 'Ações IBOV', 'prefixo': 'Acoes_IBOV', 'indicadores': 'indicadores_AcoesIBOV.csv'},
+    'fii': {'pasta': 'FII IBOV', 'prefixo': 'Fii_IBOV', 'indicadores': 'indicadores_FiiIBOV.csv'},
+}
+
+
+def lista_datas(diretorio, data_padrao=DATA_BACKFILL_PADRAO):
+    """
+    Extrai as datas salvas no diretorio de historico cotações da classe de ativo
+    Para evitar perdas é gerado a partir do penultimo registro ou seja mes anterior para evitar meses incompletos
+    Usada como data inicial dos tickers ainda sem registro no manifesto
+    """
+    datas_extraidas = []
+
+    if not os.path.exists(diretorio):
+        raise FileNotFoundError(f'Diretorio não encontrado: {diretorio}')
+
+    # Loop para a extração das datas de cada arquivo
+    for arquivo in os.listdir(diretorio):
+        # Extrair datas usando expressão regular
+        match = re.search(r"(\d{2}_\d{4})", arquivo)
+        if match:
+            # Transformação em data completa "dd/mm/YYYY"
+            trecho = match.group(1).replace("_", "/")
+            datas_extraidas.append(f"01/{trecho}")
+
+    # Convertendo as datas extraidas e mantendo a penultima data "Gerando mes anterior e atual novamente"
+    if not datas_extraidas:
+        print(f'Nenhuma data encontrada. Usando data padrão: {data_padrao}')
+        return data_padrao
+
+    datas_extraidas = sorted(pd.to_datetime(datas_extraidas, format='%d/%m/%Y'))
+    if len(datas_extraidas) < 2:
+        return datas_extraidas[0].strftime('%Y-%m-%d')
+
+    return datas_extraidas[-2].strftime('%Y-%m-%d')
+
+
+def diretorio_classe(projeto, classe):
+    """
+    Diretorio do historico de cotações da classe de ativo.
+    """
+    return os.path.join(projeto, "Historico cotações", CLASSES_ATIVOS[classe]['pasta'])
+
+
+def obter_tickers(projeto, classe) -> list:
+    """
+    Lista de tickers da classe de ativo a partir do CSV do Status Invest, com o sufixo '.SA' do Yahoo Finance.
+    """
+    caminho_csv = os.path.join(projeto, 'Indicadores Financeiros', CLASSES_ATIVOS[classe]['indicadores'])
+    return obter_registro(caminho_csv).tickers()
+
+
+def executar_ingestao(projeto, classes=tuple(CLASSES_ATIVOS), tamanho_lote=None, downloader=None, max_workers=8,
+                      taxa_requisicoes=5, timeout_requisicao=10, raiz_parquet=None,
+                      data_backfill=DATA_BACKFILL_PADRAO, raiz_ajustados=None, metricas=None,
+                      tentativas_download=TENTATIVAS_DOWNLOAD, diretorio_cache=None, motor='yfinance',
+                      url_chart=None, raiz_cubo=None, migrar_formato=False):
+    """
+    Atualiza o historico de cotações de varias classes de ativos no mesmo processo.
+    Todas as classes compartilham o pool de downloads, o limite de requisições e a sessão HTTP, o tempo total
+    acompanha a maior classe e não a soma das classes. Os arquivos gerados são os mesmos de salvar_historico.
+
+    :param classes: Chaves de CLASSES_ATIVOS a atualizar.
+    :param raiz_ajustados: Diretorio das series ajustadas e de retorno total (requer pyarrow), atualizadas
+        após a gravação de cada classe. None não atualiza.
+    :param metricas: metricas.Metricas da execução (tempos de fetch, transform, concat e write e resultado de
+        cada ticker). None não coleta metricas.
+    :param tentativas_download: Tentativas de cada download, com espera exponencial e disjuntor da fonte.
+        Os pares (ticker, mês) que continuarem com falha ficam no registro de falhas do diretorio da classe
+        (falhas.json) para reparar_ingestao.
+    :param diretorio_cache: Diretorio do cache das respostas do Yahoo (ver cache_respostas.CacheRespostas).
+        Meses fechados já baixados não são consultados novamente. None desativa o cache.
+    :param motor: 'yfinance' (yf.download) ou 'async' (coletor_yahoo_async.ColetorYahooAsync, requer aiohttp):
+        todas as consultas em uma sessão com conexões keep-alive e até max_workers requisições simultâneas.
+        No modo 'async' tamanho_lote, downloader, taxa_requisicoes e diretorio_cache não são usados.
+    :param url_chart: Endereço do endpoint de grafico no modo 'async' (ex.: benchmarks/servidor_chart.py).
+        None usa o Yahoo.
+    :param raiz_cubo: Diretorio das matrizes mapeadas em memoria (ver cubo_cotacoes.CuboCotacoes), atualizadas
+        com os meses gravados de cada classe em '<raiz_cubo>/<prefixo>'. None não atualiza.
+    :param migrar_formato: Baixa novamente sem ajuste os diretorios salvos com preços ajustados pelo Yahoo
+        (ver historico_cotacoes.PlanoHistorico). Sem ele a migração é somente estimada.
+    Demais parametros iguais aos de historico_cotacoes.salvar_historico.
+    """
+    metricas = metricas or METRICAS_NULAS
+    planos = []
+    for classe in classes:
+        diretorio = diretorio_classe(projeto, classe)
+        os.makedirs(diretorio, exist_ok=True)
+
+        # Data inicial dos tickers ainda sem registro no manifesto
+        data_inicial = lista_datas(diretorio)
+        planos.append(PlanoHistorico(data_inicial, diretorio, CLASSES_ATIVOS[classe]['prefixo'],
+                                     obter_tickers(projeto, classe), data_backfill=data_backfill,
+                                     migrar_formato=migrar_formato))
+
+    if motor == 'async':
+        from coletor_yahoo_async import URL_BASE, ColetorYahooAsync, baixar_planos_async
+
+        downloader = ColetorYahooAsync(url_base=url_chart or URL_BASE, max_simultaneas=max_workers,
+                                       timeout=timeout_requisicao, tentativas=tentativas_download, metricas=metricas)
+        dfPlanos = baixar_planos_async(planos, downloader)
+    elif motor == 'yfinance':
+        sessao = criar_sessao(max_workers) if downloader is None else None
+        downloader = DownloaderResiliente(downloader_padrao(downloader, tamanho_lote, max_workers),
+                                          tentativas=tentativas_download, metricas=metricas)
+
+        # O cache fica antes das retentativas: respostas guardadas não passam pelo disjuntor nem pela rede
+        cache = CacheRespostas(diretorio_cache, downloader, metricas=metricas) if diretorio_cache else None
+        dfPlanos = baixar_planos(planos, tamanho_lote=tamanho_lote, downloader=cache or downloader,
+                                 max_workers=max_workers, taxa_requisicoes=taxa_requisicoes,
+                                 timeout_requisicao=timeout_requisicao, session=sessao, metricas=metricas)
+        if cache:
+            print(cache.resumo_texto())
+    else:
+        raise ValueError(f"Motor de download invalido: {motor!r} (use 'yfinance' ou 'async')")
+
+    def gravar(plano, dfNovos):
+        plano.gravar(dfNovos, raiz_parquet, metricas=metricas)
+
+        registro = RegistroFalhas(plano.diretorio)
+        downloader.atualizar_registro(registro, plano.tickers)
+        registro.salvar()
+        if len(registro):
+            print(f'{plano.prefixo}: {len(registro)} pares (ticker, mês) no registro de falhas')
+        if raiz_ajustados:
+            with metricas.etapa('ajustados'):
+                CotacoesAjustadas(os.path.join(raiz_ajustados, plano.prefixo)).atualizar(plano.diretorio,
+                                                                                         plano.prefixo)
+        if raiz_cubo:
+            with metricas.etapa('cubo'):
+                CuboCotacoes(os.path.join(raiz_cubo, plano.prefixo)).atualizar(plano.diretorio, plano.prefixo)
+
+    # Cada classe grava no proprio diretorio, a gravação das classes é feita em paralelo
+    with ThreadPoolExecutor(max_workers=max(1, len(planos))) as executor:
+        gravacoes = [executor.submit(gravar, plano, dfNovos) for plano, dfNovos in zip(planos, dfPlanos)]
+        for gravacao in gravacoes:
+            gravacao.result()
+
+
+def reparar_ingestao(projeto, classes=tuple(CLASSES_ATIVOS), tamanho_lote=None, downloader=None, max_workers=8,
+                     taxa_requisicoes=5, timeout_requisicao=10, raiz_parquet=None, todas=False, metricas=None):
+    """
+    Modo reparo: baixa novamente somente os pares (ticker, mês) do registro de falhas de cada classe e corrige
+    os arquivos mensais, sem consultar os demais tickers. Todas as classes compartilham o disjuntor do Yahoo.
+
+    :param todas: Tenta todos os registros, ignorando a espera entre tentativas.
+    Demais parametros iguais aos de executar_ingestao.
+    """
+    disjuntor = Disjuntor()
+    for classe in classes:
+        diretorio = diretorio_classe(projeto, classe)
+        if not os.path.exists(diretorio):
+            continue
+
+        reparados, restantes = reparar_historico(diretorio, CLASSES_ATIVOS[classe]['prefixo'], downloader=downloader,
+                                                 tamanho_lote=tamanho_lote, max_workers=max_workers,
+                                                 taxa_requisicoes=taxa_requisicoes,
+                                                 timeout_requisicao=timeout_requisicao, raiz_parquet=raiz_parquet,
+                                                 todas=todas, disjuntor=disjuntor, metricas=metricas)
+        print(f'{classe}: {reparados} registros reparados, {restantes} restantes no registro de falhas')
+
+
+def executar_intraday(projeto, classes=tuple(CLASSES_ATIVOS), interval='5m', downloader=None, max_workers=4,
+                      taxa_requisicoes=5, timeout_requisicao=30, raiz_parquet=None, metricas=None):
+    """
+    Atualiza o historico intraday das classes de ativos (ver historico_cotacoes.salvar_intraday), salvo na pasta
+    'Intraday <interval>' dentro do diretorio de cada classe.
+    """
+    for classe in classes:
+        diretorio = diretorio_classe(projeto, classe)
+        linhas = salvar_intraday(diretorio, CLASSES_ATIVOS[classe]['prefixo'], obter_tickers(projeto, classe),
+                                 interval=interval, downloader=downloader, max_workers=max_workers,
+                                 taxa_requisicoes=taxa_requisicoes, timeout_requisicao=timeout_requisicao,
+                                 raiz_parquet=raiz_parquet, metricas=metricas)
+        print(f'{classe}: {linhas} barras de {interval} gravadas')
@@ -0,0 +1,182 @@
+import json
+import os
+import re
+from datetime import datetime
+import pandas as pd
+from historico_cotacoes import caminho_mes, ler_mes
+from motor_ingestao import CLASSES_ATIVOS, diretorio_classe
+
+
+# Resultado da junção e estado da ultima execução, salvos no diretorio do DataCom
+ARQUIVO_JUNCAO = 'Proventos_Cotacoes.csv'
+ARQUIVO_ESTADO = 'juncao_estado.json'
+
+# Ticker entre parenteses no final do nome da empresa, ex.: 'Petrobras PN (PETR4)'
+PADRAO_TICKER = r'\(([A-Z0-9]+)\)\s*$'
+
+COLUNAS_JUNCAO = ['Empresa', 'Ticker', 'Data ex-dividendos', 'Dividendo', 'Tipo', 'Pagamento', 'Data cotação',
+                  'Close', 'Rendimento calculado', 'Arquivo']
+
+
+def assinatura_arquivo(caminho):
+    estado = os.stat(caminho)
+    return [estado.st_mtime_ns, estado.st_size]
+
+
+def ler_datacom(arquivos, sufixo='.SA'):
+    """
+    Le os arquivos DATACOM_MM_YYYY.csv como eventos tipados, com o ticker do Yahoo Finance extraido da empresa.
+    Datas no formato 'dd.mm.aaaa' e valores com virgula decimal, '--' vira vazio.
+    """
+    eventos = []
+    for arquivo in arquivos:
+        df = pd.read_csv(arquivo, sep=';', dtype=str, keep_default_na=False, encoding='utf-8')
+        df['Arquivo'] = os.path.basename(arquivo)
+        eventos.append(df)
+
+    if not eventos:
+        return pd.DataFrame(columns=['Empresa', 'Ticker', 'Data ex-dividendos', 'Dividendo', 'Tipo', 'Pagamento',
+                                     'Arquivo'])
+
+    eventos = pd.concat(eventos, ignore_index=True)
+    eventos['Ticker'] = eventos['Empresa'].str.extract(PADRAO_TICKER, expand=False) + sufixo
+    for coluna in ['Data ex-dividendos', 'Pagamento']:
+        eventos[coluna] = pd.to_datetime(eventos[coluna], format='%d.%m.%Y', errors='coerce')
+    eventos['Dividendo'] = pd.to_numeric(eventos['Dividendo'].str.replace('.', '', regex=False)
+                                         .str.replace(',', '.', regex=False), errors='coerce')
+
+    # Eventos sem ticker ou data ex não podem ser associados a uma cotação
+    eventos = eventos.dropna(subset=['Ticker', 'Data ex-dividendos'])
+    return eventos[['Empresa', 'Ticker', 'Data ex-dividendos', 'Dividendo', 'Tipo', 'Pagamento', 'Arquivo']]
+
+
+def juntar_asof(eventos, cotacoes, incluir_data_ex=True):
+    """
+    Associa cada provento ao ultimo fechamento do ticker na data ex ou antes dela (merge_asof por ticker).
+
+    :param cotacoes: DataFrame com Ticker, Date e Close.
+    :param incluir_data_ex: False usa o ultimo fechamento estritamente antes da data ex (com direito ao provento).
+    """
+    eventos = eventos.sort_values('Data ex-dividendos', kind='stable')
+    cotacoes = cotacoes[['Ticker', 'Date', 'Close']].dropna(subset=['Close']).sort_values('Date', kind='stable')
+
+    juncao = pd.merge_asof(eventos, cotacoes.rename(columns={'Date': 'Data cotação'}),
+                           left_on='Data ex-dividendos', right_on='Data cotação', by='Ticker',
+                           direction='backward', allow_exact_matches=incluir_data_ex)
+    juncao['Rendimento calculado'] = juncao['Dividendo'] / juncao['Close'] * 100
+    return juncao[COLUNAS_JUNCAO]
+
+
+def meses_periodo(inicio, fim):
+    """
+    Primeiro dia de cada mês entre as datas (inclusive).
+    """
+    return list(pd.date_range(pd.Timestamp(inicio).replace(day=1), pd.Timestamp(fim), freq='MS'))
+
+
+class JuncaoProventos:
+    """
+    Junção incremental dos proventos do DataCom com o historico de cotações.
+    A cada execução só são recalculados os eventos de arquivos DATACOM alterados e os eventos com data ex
+    a partir do primeiro mês de cotações alterado, lendo apenas os meses de cotações necessarios.
+    """
+
+    def __init__(self, projeto, classes=tuple(CLASSES_ATIVOS), incluir_data_ex=True):
+        self.diretorio_datacom = os.path.join(projeto, 'DataCom Proventos')
+        self.diretorios = [(diretorio_classe(projeto, classe), CLASSES_ATIVOS[classe]['prefixo'])
+                           for classe in classes]
+        self.incluir_data_ex = incluir_data_ex
+        self.caminho_saida = os.path.join(self.diretorio_datacom, ARQUIVO_JUNCAO)
+        self.caminho_estado = os.path.join(self.diretorio_datacom, ARQUIVO_ESTADO)
+
+    def _arquivos_datacom(self):
+        return {arquivo: assinatura_arquivo(os.path.join(self.diretorio_datacom, arquivo))
+                for arquivo in sorted(os.listdir(self.diretorio_datacom))
+                if re.match(r'DATACOM_.*\d{2}_\d{4}\.csv$', arquivo)}
+
+    def _arquivos_cotacoes(self):
+        arquivos = {}
+        for diretorio, prefixo in self.diretorios:
+            if not os.path.exists(diretorio):
+                continue
+            for arquivo in os.listdir(diretorio):
+                if re.match(rf'{re.escape(prefixo)}_\d{{2}}_\d{{4}}\.csv$', arquivo):
+                    caminho = os.path.join(diretorio, arquivo)
+                    arquivos[caminho] = assinatura_arquivo(caminho)
+        return arquivos
+
+    def ler_cotacoes(self, inicio, fim):
+        """
+        Fechamentos de todas as classes nos meses entre as datas, incluindo o mês anterior ao inicio.
+        """
+        meses = meses_periodo(pd.Timestamp(inicio) - pd.DateOffset(months=1), fim)
+        partes = [ler_mes(caminho_mes(diretorio, prefixo, mes))[['Ticker', 'Date', 'Close']]
+                  for diretorio, prefixo in self.diretorios for mes in meses
+                  if os.path.exists(caminho_mes(diretorio, prefixo, mes))]
+        if not partes:
+            return pd.DataFrame({'Ticker': pd.Series(dtype=str), 'Date': pd.Series(dtype='datetime64[ns]'),
+                                 'Close': pd.Series(dtype='float64')})
+        return pd.concat(partes, ignore_index=True)
+
+    def atualizar(self):
+        """
+        Atualiza o arquivo Proventos_Cotacoes.csv e retorna a junção completa.
+        """
+        if not os.path.exists(self.diretorio_datacom):
+            raise FileNotFoundError(f'Diretorio não encontrado: {self.diretorio_datacom}')
+
+        estado = {'datacom': {}, 'cotacoes': {}}
+        if os.path.exists(self.caminho_estado) and os.path.exists(self.caminho_saida):
+            with open(self.caminho_estado, encoding='utf-8') as arquivo:
+                estado = json.load(arquivo)
+
+        arquivos_datacom = self._arquivos_datacom()
+        arquivos_cotacoes = self._arquivos_cotacoes()
+
+        alterados_datacom = {arquivo for arquivo, assinatura in arquivos_datacom.items()
+                             if estado['datacom'].get(arquivo) != assinatura}
+        removidos_datacom = set(estado['datacom']) - set(arquivos_datacom)
+        meses_alterados = [pd.Timestamp(year=int(ano), month=int(mes), day=1)
+                           for caminho, assinatura in arquivos_cotacoes.items()
+                           if estado['cotacoes'].get(caminho) != assinatura
+                           for mes, ano in re.findall(r'_(\d{2})_(\d{4})\.csv$', caminho)]
+
+        eventos = ler_datacom([os.path.join(self.diretorio_datacom, arquivo) for arquivo in arquivos_datacom])
+
+        # Eventos afetados: arquivo do DataCom alterado ou data ex a partir do primeiro mês de cotações alterado
+        afetados = eventos['Arquivo'].isin(alterados_datacom)
+        if meses_alterados:
+            afetados |= eventos['Data ex-dividendos'] >= min(meses_alterados)
+
+        anterior = pd.DataFrame(columns=COLUNAS_JUNCAO)
+        if estado['datacom']:
+            anterior = pd.read_csv(self.caminho_saida, sep=';', decimal=',', dtype={'Ticker': str},
+                                   parse_dates=['Data ex-dividendos', 'Pagamento', 'Data cotação'])
+            anterior[['Empresa', 'Tipo']] = anterior[['Empresa', 'Tipo']].fillna('')
+            anterior = anterior[~anterior['Arquivo'].isin(alterados_datacom | removidos_datacom)]
+            if meses_alterados:
+                anterior = anterior[anterior['Data ex-dividendos'] < min(meses_alterados)]
+
+        recalcular = eventos[afetados]
+        partes = [anterior]
+        if not recalcular.empty:
+            cotacoes = self.ler_cotacoes(recalcular['Data ex-dividendos'].min(),
+                                         recalcular['Data ex-dividendos'].max())
+            partes.append(juntar_asof(recalcular, cotacoes, self.incluir_data_ex))
+            # print(f'{len(recalcular)} eventos recalculados com {len(cotacoes)} cotações')
+
+        partes = [parte for parte in partes if not parte.empty]
+        juncao = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=COLUNAS_JUNCAO)
+        juncao = juncao.sort_values(['Data ex-dividendos', 'Ticker'], kind='stable').reset_index(drop=True)
+
+        juncao.to_csv(self.caminho_saida + '.tmp', sep=';', decimal=',', index=False, encoding='utf-8',
+                      date_format='%Y-%m-%d')
+        os.replace(self.caminho_saida + '.tmp', self.caminho_saida)
+
+        with open(self.caminho_estado + '.tmp', 'w', encoding='utf-8') as arquivo:
+            json.dump({'atualizado_em': datetime.now().isoformat(timespec='seconds'),
+                       'datacom': arquivos_datacom, 'cotacoes': arquivos_cotacoes}, arquivo, indent=2,
+                      ensure_ascii=False)
+        os.replace(self.caminho_estado + '.tmp', self.caminho_estado)
+
+        return juncao
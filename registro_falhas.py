@@ -0,0 +1,377 @@
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+import pandas as pd
+import yfinance as yf
+from agendador import executar_concorrente, tarefa_cancelada
+from historico_cotacoes import (downloader_padrao, erros_yfinance, mesclar_mes, obter_historico, obter_historico_lote,
+                                registrar_expiracao, salvar_mes, separar_por_mes, tickers_falhos_lote)
+from manifesto import ARQUIVO_MANIFESTO, Manifesto, ultimo_dia_fechado
+from metricas import METRICAS_NULAS
+
+
+# Registro de falhas salvo em cada diretorio de historico, ao lado do manifesto
+ARQUIVO_FALHAS = 'falhas.json'
+
+# Retentativas dentro da execução: espera inicial e máxima em segundos entre tentativas
+TENTATIVAS_DOWNLOAD = 3
+ESPERA_BASE = 1.0
+ESPERA_MAXIMA = 30.0
+
+# Reparo de falhas entre execuções: primeira espera de 15 minutos, dobrando até 1 dia
+ESPERA_BASE_REPARO = 15 * 60
+ESPERA_MAXIMA_REPARO = 24 * 60 * 60
+
+# Tentativas de reparo após as quais o registro é abandonado (ticker deslistado, por exemplo)
+MAXIMO_TENTATIVAS_REPARO = 10
+
+
+def atraso_backoff(tentativa, base, maximo, aleatorio=random):
+    """
+    Espera exponencial com jitter: metade fixa e metade aleatoria de min(maximo, base * 2^(tentativa - 1)).
+    O jitter evita que varias threads (ou execuções) voltem a consultar o Yahoo no mesmo instante.
+    """
+    limite = min(maximo, base * 2 ** (tentativa - 1))
+    return aleatorio.uniform(limite / 2, limite)
+
+
+def meses_intervalo(inicio, fim):
+    """
+    Meses ('YYYY-MM') cobertos pelo intervalo [inicio, fim) de uma consulta ao yfinance (fim exclusivo).
+    """
+    inicio = pd.Timestamp(inicio)
+    ultimo_dia = max(inicio, pd.Timestamp(fim) - pd.Timedelta(days=1))
+    return [mes.strftime('%Y-%m') for mes in pd.period_range(inicio, ultimo_dia, freq='M')]
+
+
+def agrupar_meses(entradas):
+    """
+    {ticker: lista ordenada de meses 'YYYY-MM'} dos registros de falha.
+    """
+    meses = {}
+    for entrada in entradas:
+        meses.setdefault(entrada['ticker'], []).append(entrada['mes'])
+    return {ticker: sorted(set(lista)) for ticker, lista in meses.items()}
+
+
+def intervalos_meses(meses, limite):
+    """
+    Converte meses 'YYYY-MM' ordenados em intervalos [inicio, fim) de meses consecutivos, com fim limitado
+    a `limite` (exclusivo, ex.: o dia seguinte ao atual).
+    """
+    intervalos = []
+    for periodo in pd.PeriodIndex(meses, freq='M'):
+        inicio = periodo.start_time.to_pydatetime()
+        fim = min((periodo + 1).start_time.to_pydatetime(), limite)
+        if intervalos and intervalos[-1][1] == inicio:
+            intervalos[-1] = (intervalos[-1][0], fim)
+        else:
+            intervalos.append((inicio, fim))
+    return intervalos
+
+
+class DisjuntorAberto(Exception):
+    """
+    Consulta recusada sem acessar a fonte porque o disjuntor está aberto.
+    """
+
+
+class Disjuntor:
+    """
+    Disjuntor (circuit breaker) de uma fonte de dados.
+    Após `limite_falhas` falhas seguidas a fonte fica bloqueada por `tempo_aberto` segundos e as consultas
+    falham na hora, sem acessar a rede. Passado esse tempo uma unica consulta de teste é liberada (meio aberto):
+    sucesso fecha o disjuntor e falha o abre novamente.
+    """
+
+    def __init__(self, fonte='yahoo', limite_falhas=5, tempo_aberto=60.0, relogio=time.monotonic):
+        self.fonte = fonte
+        self.limite_falhas = limite_falhas
+        self.tempo_aberto = tempo_aberto
+        self.relogio = relogio
+        self.estado = 'fechado'
+        self.falhas_seguidas = 0
+        self.aberturas = 0
+        self._aberto_ate = 0.0
+        self._teste_em_andamento = False
+        self._trava = threading.Lock()
+
+    def permitir(self):
+        """
+        True se a consulta pode ser feita agora.
+        """
+        with self._trava:
+            if self.estado == 'aberto' and self.relogio() >= self._aberto_ate:
+                self.estado = 'meio_aberto'
+                self._teste_em_andamento = False
+
+            if self.estado == 'aberto':
+                return False
+            if self.estado == 'meio_aberto':
+                if self._teste_em_andamento:
+                    return False
+                self._teste_em_andamento = True
+            return True
+
+    def sucesso(self):
+        with self._trava:
+            self.estado = 'fechado'
+            self.falhas_seguidas = 0
+            self._teste_em_andamento = False
+
+    def falha(self):
+        with self._trava:
+            self.falhas_seguidas += 1
+            if self.estado == 'meio_aberto' or self.falhas_seguidas >= self.limite_falhas:
+                if self.estado != 'aberto':
+                    self.aberturas += 1
+                    print(f'Disjuntor da fonte {self.fonte} aberto por {self.tempo_aberto:.0f}s '
+                          f'após {self.falhas_seguidas} falhas seguidas')
+                self.estado = 'aberto'
+                self._aberto_ate = self.relogio() + self.tempo_aberto
+                self._teste_em_andamento = False
+
+
+class DownloaderResiliente:
+    """
+    Downloader compatível com yf.download com retentativas, espera exponencial com jitter e disjuntor.
+    Guarda o resultado final de cada consulta (falhas e sucessos por ticker e periodo), usado para atualizar
+    o registro de falhas após a execução.
+
+    :param downloader: Função compatível com yf.download (padrão: yf.download).
+    :param tentativas: Tentativas de cada consulta antes de registrar a falha.
+    :param disjuntor: Disjuntor da fonte, compartilhado entre threads (None cria um novo).
+    :param metricas: metricas.Metricas da execução, recebe as retentativas.
+    """
+
+    def __init__(self, downloader=None, tentativas=TENTATIVAS_DOWNLOAD, espera_base=ESPERA_BASE,
+                 espera_maxima=ESPERA_MAXIMA, disjuntor=None, metricas=None, esperar=time.sleep):
+        self.downloader = downloader or yf.download
+        self.tentativas = tentativas
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.disjuntor = disjuntor or Disjuntor()
+        self.metricas = metricas or METRICAS_NULAS
+        self.esperar = esperar
+        self.falhas = []
+        self.sucessos = []
+        self._trava = threading.Lock()
+
+    def _falhos(self, tickers, resultado, lote, group_by):
+        """
+        Tickers que falharam em uma consulta sem exceção: com erro registrado pelo yf.download ou, nas consultas
+        em lote, ausentes do resultado ou com todas as colunas vazias.
+        """
+        falhos = set(tickers_falhos_lote(resultado, tickers, group_by)) if lote else set()
+        if self.downloader is yf.download:
+            erros = erros_yfinance()
+            falhos.update(ticker for ticker in tickers if ticker.upper() in erros)
+        return [ticker for ticker in tickers if ticker in falhos]
+
+    def __call__(self, tickers, start=None, end=None, **kwargs):
+        lista = [tickers] if isinstance(tickers, str) else list(tickers)
+        erro = None
+
+        for tentativa in range(1, self.tentativas + 1):
+            if not self.disjuntor.permitir():
+                erro = DisjuntorAberto(f'Fonte {self.disjuntor.fonte} bloqueada pelo disjuntor')
+                break
+
+            try:
+                resultado = self.downloader(tickers, start=start, end=end, **kwargs)
+                falhos = self._falhos(lista, resultado, not isinstance(tickers, str),
+                                      kwargs.get('group_by', 'column'))
+                if falhos and len(falhos) == len(lista):
+                    raise RuntimeError(f'Falha em todos os tickers: {erros_yfinance()}')
+            except Exception as e:
+                # Tarefa abandonada por tempo esgotado: a falha já foi registrada por registrar_falha
+                if tarefa_cancelada():
+                    raise
+                erro = e
+                self.disjuntor.falha()
+                if tentativa < self.tentativas:
+                    self.metricas.retentativa()
+                    self.esperar(atraso_backoff(tentativa, self.espera_base, self.espera_maxima))
+                continue
+
+            self.disjuntor.sucesso()
+            if tarefa_cancelada():
+                return resultado
+            with self._trava:
+                # Tickers que falharam dentro de um lote bem sucedido vão direto para o registro de falhas
+                erros = erros_yfinance() if falhos else {}
+                self.falhas.extend((ticker, start, end, erros.get(ticker.upper())) for ticker in falhos)
+                self.sucessos.extend((ticker, start, end) for ticker in lista if ticker not in falhos)
+            return resultado
+
+        with self._trava:
+            self.falhas.extend((ticker, start, end, repr(erro)) for ticker in lista)
+        raise erro
+
+    def registrar_falha(self, ticker, start, end, erro=None):
+        """
+        Registra a falha de uma consulta abandonada fora do downloader (tempo esgotado no agendador).
+        """
+        with self._trava:
+            self.falhas.append((ticker, start, end, erro))
+
+    def atualizar_registro(self, registro, tickers=None):
+        """
+        Aplica as falhas e sucessos das consultas ao registro de falhas de um diretorio.
+
+        :param tickers: Somente os tickers do diretorio (None aplica todos).
+        """
+        with self._trava:
+            aplicar_resultados(registro, self.sucessos, self.falhas, tickers)
+
+
+def aplicar_resultados(registro, sucessos, falhas, tickers=None):
+    """
+    Remove do registro os meses consultados com sucesso e registra os meses com falha.
+
+    :param sucessos: Lista de (ticker, inicio, fim).
+    :param falhas: Lista de (ticker, inicio, fim, erro).
+    :param tickers: Somente os tickers do diretorio (None aplica todos).
+    """
+    tickers = set(tickers) if tickers is not None else None
+    for ticker, inicio, fim in sucessos:
+        if tickers is None or ticker in tickers:
+            for mes in meses_intervalo(inicio, fim):
+                registro.resolver(ticker, mes)
+    for ticker, inicio, fim, erro in falhas:
+        if tickers is None or ticker in tickers:
+            for mes in meses_intervalo(inicio, fim):
+                registro.registrar_falha(ticker, mes, erro)
+
+
+class RegistroFalhas:
+    """
+    Registro persistente dos pares (ticker, mês) cujo download falhou, com a proxima tentativa de reparo
+    calculada por espera exponencial com jitter. Salvo em JSON no formato
+    {"falhas": {"PETR4.SA|2025-01": {"ticker", "mes", "tentativas", "erro", "primeira_falha", "ultima_falha",
+    "proxima_tentativa"}}}.
+    """
+
+    def __init__(self, diretorio, espera_base=ESPERA_BASE_REPARO, espera_maxima=ESPERA_MAXIMA_REPARO):
+        self.caminho = os.path.join(diretorio, ARQUIVO_FALHAS)
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.falhas = {}
+
+        if os.path.exists(self.caminho):
+            with open(self.caminho, encoding='utf-8') as arquivo:
+                self.falhas = json.load(arquivo).get('falhas', {})
+
+    def __len__(self):
+        return len(self.falhas)
+
+    def registrar_falha(self, ticker, mes, erro=None, agora=None):
+        agora = agora or datetime.now()
+        chave = f'{ticker}|{mes}'
+        entrada = self.falhas.get(chave, {'ticker': ticker, 'mes': mes, 'tentativas': 0,
+                                          'primeira_falha': agora.isoformat(timespec='seconds')})
+        entrada['tentativas'] += 1
+        entrada['erro'] = erro
+        entrada['ultima_falha'] = agora.isoformat(timespec='seconds')
+        espera = atraso_backoff(entrada['tentativas'], self.espera_base, self.espera_maxima)
+        entrada['proxima_tentativa'] = (agora + timedelta(seconds=espera)).isoformat(timespec='seconds')
+        self.falhas[chave] = entrada
+
+    def resolver(self, ticker, mes):
+        self.falhas.pop(f'{ticker}|{mes}', None)
+
+    def pendentes(self, agora=None, todas=False):
+        """
+        Registros com a proxima tentativa vencida, ordenados por mês.
+        Com todas=True retorna todos, inclusive os abandonados e os que ainda estão em espera.
+        """
+        agora = (agora or datetime.now()).isoformat(timespec='seconds')
+        return sorted((entrada for entrada in self.falhas.values()
+                       if todas or (entrada['proxima_tentativa'] <= agora
+                                    and entrada['tentativas'] < MAXIMO_TENTATIVAS_REPARO)),
+                      key=lambda entrada: (entrada['mes'], entrada['ticker']))
+
+    def salvar(self):
+        os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+        with open(self.caminho + '.tmp', 'w', encoding='utf-8') as arquivo:
+            json.dump({'atualizado_em': datetime.now().isoformat(timespec='seconds'),
+                       'falhas': dict(sorted(self.falhas.items()))}, arquivo, indent=2, ensure_ascii=False)
+        os.replace(self.caminho + '.tmp', self.caminho)
+
+
+def reparar_historico(diretorio, prefixo, downloader=None, tamanho_lote=None, max_workers=1,
+                      taxa_requisicoes=None, timeout_requisicao=10, raiz_parquet=None, todas=False, agora=None,
+                      disjuntor=None, metricas=None):
+    """
+    Baixa novamente somente os pares (ticker, mês) do registro de falhas com a tentativa vencida e mescla
+    o resultado nos arquivos mensais existentes. Os demais meses e tickers não são consultados.
+    Retorna (quantidade de registros reparados, quantidade de registros que continuam no registro).
+
+    :param todas: Tenta todos os registros, ignorando a espera e o limite de tentativas.
+    Demais parametros iguais aos de historico_cotacoes.salvar_historico.
+    """
+    agora = agora or datetime.now()
+    registro = RegistroFalhas(diretorio)
+    pendentes = registro.pendentes(agora, todas)
+    if not pendentes:
+        return 0, len(registro)
+
+    downloader = DownloaderResiliente(downloader_padrao(downloader, tamanho_lote, max_workers),
+                                      disjuntor=disjuntor, metricas=metricas)
+    manifesto = Manifesto(os.path.join(diretorio, ARQUIVO_MANIFESTO))
+    amanha = agora.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+    # Meses consecutivos de um ticker viram um unico intervalo, tickers com o mesmo intervalo são baixados juntos
+    intervalos = {}
+    for ticker, meses in agrupar_meses(pendentes).items():
+        for inicio, fim in intervalos_meses(meses, amanha):
+            intervalos.setdefault((inicio, fim), []).append(ticker)
+
+    dfNovos = []
+    for (inicio, fim), tickers in intervalos.items():
+        if tamanho_lote:
+            dfNovos.append(obter_historico_lote(inicio, fim, tickers, tamanho_lote=tamanho_lote,
+                                                downloader=downloader, metricas=metricas))
+        else:
+            dfNovos.extend(executar_concorrente(
+                lambda ticker: obter_historico(inicio, fim, ticker, downloader=downloader,
+                                               timeout=timeout_requisicao, metricas=metricas),
+                tickers, max_workers=max_workers, taxa=taxa_requisicoes, timeout=timeout_requisicao,
+                ao_expirar=lambda ticker: registrar_expiracao(ticker, inicio, fim, timeout_requisicao, downloader,
+                                                              metricas)))
+
+    dfNovos = [dfHistorico for dfHistorico in dfNovos if dfHistorico is not None]
+    if dfNovos:
+        # Somente os meses presentes no registro são regravados
+        dfNovos = pd.concat(dfNovos, ignore_index=True)
+        chaves = {f'{entrada["ticker"]}|{entrada["mes"]}' for entrada in pendentes}
+        dfNovos = dfNovos[(dfNovos['Ticker'] + '|' + dfNovos['Date'].dt.strftime('%Y-%m')).isin(chaves)]
+        for data_mes, dfMes in separar_por_mes(dfNovos):
+            dfMes = mesclar_mes(dfMes, diretorio, prefixo, data_mes)
+            salvar_mes(dfMes, diretorio, prefixo, data_mes, raiz_parquet=raiz_parquet)
+        print(f'Reparo {prefixo}: {len(dfNovos)} linhas de {dfNovos["Ticker"].nunique()} tickers')
+
+    # Registros sem falha nesta execução são removidos, os demais voltam para a fila com espera maior
+    downloader.atualizar_registro(registro)
+
+    if len(dfNovos):
+        # O manifesto de cada ticker avança no maximo até o mês anterior ao primeiro mês que continua no
+        # registro (com falha nesta execução ou ainda aguardando a proxima tentativa)
+        primeiros = {}
+        for entrada in registro.falhas.values():
+            primeiros[entrada['ticker']] = min(primeiros.get(entrada['ticker'], entrada['mes']), entrada['mes'])
+
+        dia_fechado = ultimo_dia_fechado(agora)
+        for ticker, data in dfNovos.groupby('Ticker')['Date'].max().items():
+            limite = dia_fechado
+            if ticker in primeiros:
+                limite = min(limite, datetime.strptime(primeiros[ticker], '%Y-%m') - timedelta(days=1))
+            manifesto.atualizar(ticker, min(data.to_pydatetime(), limite))
+    manifesto.salvar()
+    registro.salvar()
+
+    reparados = sum(1 for entrada in pendentes if f'{entrada["ticker"]}|{entrada["mes"]}' not in registro.falhas)
+    return reparados, len(registro)
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+import pandas as pd
+
+
+# Arquivo com o universo de tickers da ultima execução, salvo em cada diretorio de historico
+ARQUIVO_UNIVERSO = 'universo.json'
+
+_registros = {}
+_trava = threading.Lock()
+
+
+class RegistroTickers:
+    """
+    Lista de tickers de um CSV de indicadores do Status Invest carregada uma unica vez.
+    O arquivo só é lido novamente quando muda a data de modificação/tamanho e o hash do conteudo é outro.
+    """
+
+    def __init__(self, caminho_csv, sufixo='.SA'):
+        self.caminho_csv = caminho_csv
+        self.sufixo = sufixo
+        self._assinatura = None
+        self._hash = None
+        self._tickers = []
+        self._trava = threading.Lock()
+
+    def _assinatura_arquivo(self):
+        estado = os.stat(self.caminho_csv)
+        return estado.st_mtime_ns, estado.st_size
+
+    def tickers(self) -> list:
+        """
+        Lista de tickers com o sufixo do Yahoo Finance, sem duplicados e na ordem do arquivo.
+        """
+        if not os.path.exists(self.caminho_csv):
+            raise FileNotFoundError(f'Diretorio não encontrado: {self.caminho_csv}')
+
+        with self._trava:
+            assinatura = self._assinatura_arquivo()
+            if assinatura != self._assinatura:
+                with open(self.caminho_csv, 'rb') as arquivo:
+                    conteudo = arquivo.read()
+                hash_conteudo = hashlib.sha1(conteudo).hexdigest()
+
+                # Arquivo regravado com o mesmo conteudo não precisa ser processado novamente
+                if hash_conteudo != self._hash:
+                    ListaAcoes = pd.read_csv(self.caminho_csv, sep=';', usecols=['TICKER'], dtype=str)
+                    ListaAcoes = ListaAcoes['TICKER'].dropna().drop_duplicates()
+                    self._tickers = (ListaAcoes + self.sufixo).tolist()
+                    self._hash = hash_conteudo
+
+                self._assinatura = assinatura
+
+            return list(self._tickers)
+
+
+def obter_registro(caminho_csv, sufixo='.SA'):
+    """
+    Registro compartilhado do CSV informado, criado na primeira chamada.
+    """
+    chave = (os.path.abspath(caminho_csv), sufixo)
+    with _trava:
+        if chave not in _registros:
+            _registros[chave] = RegistroTickers(caminho_csv, sufixo)
+        return _registros[chave]
+
+
+def diferenca_universo(caminho_universo, tickers):
+    """
+    Compara os tickers atuais com o universo salvo na execução anterior.
+    Retorna as listas (novos, removidos). Sem universo anterior nenhum ticker é considerado novo.
+    """
+    if not os.path.exists(caminho_universo):
+        return [], []
+
+    with open(caminho_universo, encoding='utf-8') as arquivo:
+        anteriores = json.load(arquivo).get('tickers', [])
+
+    atuais = set(tickers)
+    conjunto_anteriores = set(anteriores)
+    novos = [ticker for ticker in tickers if ticker not in conjunto_anteriores]
+    removidos = [ticker for ticker in anteriores if ticker not in atuais]
+    return novos, removidos
+
+
+def salvar_universo(caminho_universo, tickers):
+    """
+    Grava o universo de tickers atual para a comparação da proxima execução.
+    """
+    with open(caminho_universo + '.tmp', 'w', encoding='utf-8') as arquivo:
+        json.dump({'atualizado_em': datetime.now().isoformat(timespec='seconds'),
+                   'tickers': list(tickers)}, arquivo, indent=2)
+    os.replace(caminho_universo + '.tmp', caminho_universo)
@@ -0,0 +1,9 @@
+import os
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modulos do projeto ficam na raiz e os servidores locais (Status Invest, grafico do Yahoo) em benchmarks.
+# Os substitutos offline (downloader, driver) ficam em tests/substitutos.py
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, 'benchmarks'))
@@ -0,0 +1,72 @@
+"""
+Substitutos offline usados pelos testes e pelo benchmark do pipeline (benchmarks/bench_pipeline.py): downloader
+sintetico compativel com yf.download e um WebDriver mínimo sobre o HTML salvo do DataCom.
+"""
+import os
+import zlib
+import numpy as np
+import pandas as pd
+from historico_cotacoes import COLUNAS_YF
+
+DIRETORIO_FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks',
+                                  'fixtures')
+FIXTURE_DATACOM = os.path.join(DIRETORIO_FIXTURES, 'datacom_calendario.html')
+
+
+class DownloaderSintetico:
+    """
+    Substituto offline do yf.download com OHLCV sintetico e deterministico por ticker e data.
+    Aceita um ticker (colunas simples com multi_level_index=False) ou uma lista (colunas (Ticker, Price)).
+    """
+
+    def __init__(self):
+        self.chamadas = 0
+
+    @staticmethod
+    def serie(ticker, start, end):
+        datas = pd.bdate_range(pd.Timestamp(start), pd.Timestamp(end) - pd.Timedelta(days=1), name='Date')
+        dias = datas.asi8 // 86_400_000_000_000
+        semente = zlib.crc32(ticker.encode())
+
+        # Preço dependente somente do ticker e da data: o mesmo dia tem o mesmo valor em qualquer consulta
+        fechamento = np.round(5 + (semente % 50) + ((dias * 7919 + semente) % 1000) / 40, 2)
+        return pd.DataFrame({
+            'Close': fechamento,
+            'Dividends': np.where((dias + semente) % 63 == 0, 0.25, 0.0),
+            'High': fechamento + 0.3,
+            'Low': fechamento - 0.3,
+            'Open': fechamento + 0.1,
+            'Stock Splits': 0.0,
+            'Volume': ((dias * 104729 + semente) % 5_000_000 + 1000).astype('int64'),
+        }, index=datas)[COLUNAS_YF]
+
+    def __call__(self, tickers, start=None, end=None, group_by='column', multi_level_index=True, **kwargs):
+        self.chamadas += 1
+        if isinstance(tickers, str):
+            return self.serie(tickers, start, end)
+        return pd.concat({ticker: self.serie(ticker, start, end) for ticker in tickers}, axis=1,
+                         names=['Ticker', 'Price'])
+
+
+class DriverFixture:
+    """
+    WebDriver mínimo para extract_table_data: a pagina vem de um HTML salvo e execute_script não
+    retorna a tabela, forçando a extração pelo page_source.
+    """
+
+    def __init__(self, html):
+        self.page_source = html
+
+    def find_element(self, *args):
+        return self
+
+    def execute_script(self, *args):
+        return None
+
+
+class EsperaImediata:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def until(self, condicao):
+        return condicao(self.driver)
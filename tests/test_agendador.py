@@ -0,0 +1,89 @@
+import threading
+import time
+from substitutos import DownloaderSintetico
+from agendador import LimitadorTaxa, executar_concorrente, tarefa_cancelada
+from historico_cotacoes import PlanoHistorico, baixar_planos
+from metricas import Metricas
+from registro_falhas import DownloaderResiliente
+
+LATENCIA = 0.05
+
+
+def dormir(item):
+    time.sleep(LATENCIA)
+    return item
+
+
+def medir(funcao, *args, **kwargs):
+    inicio = time.perf_counter()
+    resultado = funcao(*args, **kwargs)
+    return resultado, time.perf_counter() - inicio
+
+
+def test_mais_threads_reduz_o_tempo_total():
+    itens = list(range(16))
+    resultados_1, tempo_1 = medir(executar_concorrente, dormir, itens, max_workers=1)
+    resultados_8, tempo_8 = medir(executar_concorrente, dormir, itens, max_workers=8)
+
+    assert resultados_1 == resultados_8 == itens
+    assert tempo_1 >= len(itens) * LATENCIA
+    assert tempo_8 < tempo_1 / 3
+
+
+def test_limitador_taxa_limita_a_vazao():
+    # Rajada inicial de `capacidade` fichas, depois uma ficha a cada 1 / taxa segundos
+    limitador = LimitadorTaxa(taxa=50, capacidade=5)
+    _, tempo = medir(lambda: [limitador.adquirir() for _ in range(30)])
+    assert tempo >= 25 / 50 * 0.9
+
+    # Com 8 threads e tarefas instantaneas a vazão fica limitada pela taxa (capacidade padrão = taxa)
+    _, tempo_livre = medir(executar_concorrente, lambda item: item, range(75), max_workers=8)
+    _, tempo_limitado = medir(executar_concorrente, lambda item: item, range(75), max_workers=8, taxa=50)
+    assert tempo_limitado >= 25 / 50 * 0.9
+    assert tempo_livre < tempo_limitado / 2
+
+
+def test_tempo_esgotado_conta_como_falha_e_ignora_resultado_tardio():
+    expirados, tardios = [], []
+
+    def tarefa(item):
+        time.sleep(0.4 if item == 'lento' else 0.01)
+        if not tarefa_cancelada():
+            tardios.append(item)
+        return item
+
+    resultados = executar_concorrente(tarefa, ['a', 'lento', 'b'], max_workers=3, timeout=0.1,
+                                      ao_expirar=expirados.append)
+    assert resultados == ['a', None, 'b']
+    assert expirados == ['lento']
+
+    time.sleep(0.5)
+    assert sorted(tardios) == ['a', 'b']
+
+
+def test_ticker_com_tempo_esgotado_vai_para_metricas_e_registro(tmp_path):
+    sintetico = DownloaderSintetico()
+    liberar = threading.Event()
+
+    def downloader(ticker, **kwargs):
+        if ticker == 'LENTO3.SA':
+            liberar.wait(2)
+        return sintetico(ticker, **kwargs)
+
+    metricas = Metricas()
+    resiliente = DownloaderResiliente(downloader, esperar=lambda segundos: None)
+    plano = PlanoHistorico('2024-01-01', str(tmp_path), 'Teste', ['PETR4.SA', 'LENTO3.SA', 'VALE3.SA'],
+                           data_backfill='2024-01-01')
+    dfPlanos = baixar_planos([plano], downloader=resiliente, max_workers=3, timeout_requisicao=0.2,
+                             metricas=metricas)
+
+    # A resposta tardia chega depois da execução e não altera metricas nem o registro
+    liberar.set()
+    time.sleep(0.2)
+
+    assert sum(dfTicker is None for dfTicker in dfPlanos[0]) == 1
+    assert metricas.resultados == {'ok': 2, 'vazio': 0, 'falha': 1}
+    assert [falha['ticker'] for falha in metricas.falhas] == ['LENTO3.SA']
+    assert [falha[0] for falha in resiliente.falhas] == ['LENTO3.SA']
+    assert 'TempoEsgotado' in resiliente.falhas[0][3]
+    assert sorted(sucesso[0] for sucesso in resiliente.sucessos) == ['PETR4.SA', 'VALE3.SA']
@@ -0,0 +1,82 @@
+import os
+import pandas as pd
+import pytest
+from substitutos import DownloaderSintetico
+from historico_cotacoes import normalizar_historico, salvar_mes, separar_por_mes
+
+pytest.importorskip('pyarrow')
+import armazenamento_parquet  # noqa: E402
+from armazenamento_parquet import (caminho_particao, converter_csv_para_parquet, esquema_historico,  # noqa: E402
+                                   ler_historico)
+
+CLASSES = {'Acoes_IBOV': ['PETR4.SA', 'VALE3.SA', 'ITUB4.SA'], 'Fii_IBOV': ['HGLG11.SA', 'KNRI11.SA']}
+
+
+@pytest.fixture
+def raiz(tmp_path, monkeypatch):
+    """
+    Historico de janeiro a junho de 2024 das duas classes, convertido dos CSVs mensais para parquet.
+    Row groups pequenos para o filtro de tickers ter row groups a descartar.
+    """
+    monkeypatch.setattr(armazenamento_parquet, 'LINHAS_ROW_GROUP', 16)
+    raiz = os.path.join(tmp_path, 'parquet')
+    for classe, tickers in CLASSES.items():
+        diretorio = os.path.join(tmp_path, classe)
+        os.makedirs(diretorio)
+        dfHistorico = pd.concat([normalizar_historico(DownloaderSintetico.serie(ticker, '2024-01-01', '2024-07-01'),
+                                                      ticker) for ticker in tickers], ignore_index=True)
+        for data_mes, dfMes in separar_por_mes(dfHistorico):
+            salvar_mes(dfMes, diretorio, classe, data_mes)
+        assert len(converter_csv_para_parquet(diretorio, raiz, classe)) == 6
+    return raiz
+
+
+def ordenado(dfHistorico):
+    return dfHistorico.sort_values(['Ticker', 'Date'], kind='stable').reset_index(drop=True)
+
+
+@pytest.mark.parametrize('classe, tickers, inicio, fim', [
+    ('Acoes_IBOV', None, None, None),
+    (None, ['VALE3.SA', 'KNRI11.SA'], None, None),
+    (None, None, '2024-02-14', '2024-04-09'),
+    (['Fii_IBOV'], ['HGLG11.SA', 'INEXISTENTE.SA'], '2024-05-31', None),
+    ('Acoes_IBOV', ['PETR4.SA'], None, '2024-01-31'),
+])
+def test_filtros_na_leitura_iguais_a_leitura_completa(raiz, classe, tickers, inicio, fim):
+    dfCompleto = ler_historico(raiz, colunas=esquema_historico().names + ['classe'])
+    mascara = pd.Series(True, index=dfCompleto.index)
+    if classe is not None:
+        mascara &= dfCompleto['classe'].isin([classe] if isinstance(classe, str) else classe)
+    if tickers is not None:
+        mascara &= dfCompleto['Ticker'].isin(tickers)
+    if inicio is not None:
+        mascara &= dfCompleto['Date'] >= pd.Timestamp(inicio)
+    if fim is not None:
+        mascara &= dfCompleto['Date'] <= pd.Timestamp(fim)
+    esperado = ordenado(dfCompleto.loc[mascara, esquema_historico().names])
+
+    dfFiltrado = ler_historico(raiz, classe=classe, tickers=tickers, inicio=inicio, fim=fim)
+    assert not dfFiltrado.empty
+    pd.testing.assert_frame_equal(ordenado(dfFiltrado), esperado)
+
+    colunas = ['Date', 'Ticker', 'Close']
+    pd.testing.assert_frame_equal(ordenado(ler_historico(raiz, classe, tickers, inicio, fim, colunas)),
+                                  esperado[colunas])
+
+
+def test_particoes_fora_do_filtro_nao_sao_abertas(raiz):
+    dfMarco = ler_historico(raiz, classe='Acoes_IBOV', inicio='2024-03-01', fim='2024-03-31')
+
+    # Arquivos corrompidos nas partições fora da classe e do periodo: a leitura filtrada não pode abri-los
+    for classe in CLASSES:
+        for mes in range(1, 7):
+            if (classe, mes) != ('Acoes_IBOV', 3):
+                with open(os.path.join(caminho_particao(raiz, classe, pd.Timestamp(2024, mes, 1)),
+                                       'historico.parquet'), 'wb') as arquivo:
+                    arquivo.write(b'corrompido')
+
+    pd.testing.assert_frame_equal(ler_historico(raiz, classe='Acoes_IBOV', inicio='2024-03-01', fim='2024-03-31'),
+                                  dfMarco)
+    assert set(dfMarco['Date'].dt.month) == {3}
+    with pytest.raises(Exception):
+        ler_historico(raiz, classe='Acoes_IBOV', inicio='2024-03-01', fim='2024-04-30')
@@ -0,0 +1,71 @@
+from datetime import datetime
+import pandas as pd
+import pytest
+from substitutos import DownloaderSintetico
+from cache_respostas import TTL_MES_ATUAL, CacheRespostas
+
+AGORA = datetime(2024, 6, 14, 12).timestamp()
+PARAMETROS = {'actions': True, 'auto_adjust': False, 'multi_level_index': False}
+
+
+class DownloaderContador(DownloaderSintetico):
+    def __init__(self):
+        super().__init__()
+        self.periodos = []
+        self.consultados = []
+
+    def __call__(self, tickers, start=None, end=None, **kwargs):
+        self.periodos.append((pd.Timestamp(start), pd.Timestamp(end)))
+        self.consultados.append(tickers)
+        return super().__call__(tickers, start=start, end=end, **kwargs)
+
+
+@pytest.fixture
+def relogio():
+    return {'agora': AGORA}
+
+
+@pytest.fixture
+def cache(tmp_path, relogio):
+    return CacheRespostas(str(tmp_path), DownloaderContador(), relogio=lambda: relogio['agora'])
+
+
+def consultar(cache, tickers, inicio, fim):
+    return cache(tickers, start=datetime.strptime(inicio, '%Y-%m-%d'), end=datetime.strptime(fim, '%Y-%m-%d'),
+                 group_by='ticker', **PARAMETROS)
+
+
+def esperado(tickers, inicio, fim):
+    return DownloaderSintetico()(tickers, start=inicio, end=fim, group_by='ticker', **PARAMETROS)
+
+
+def test_meses_reaproveitados_entre_periodos_diferentes(cache):
+    pd.testing.assert_frame_equal(consultar(cache, 'PETR4.SA', '2024-01-10', '2024-06-15'),
+                                  esperado('PETR4.SA', '2024-01-10', '2024-06-15'), check_freq=False)
+    assert cache.downloader.periodos == [(pd.Timestamp('2024-01-01'), pd.Timestamp('2024-07-01'))]
+
+    # Outro inicio e fim dentro dos meses guardados: nenhuma consulta nova
+    pd.testing.assert_frame_equal(consultar(cache, 'PETR4.SA', '2024-02-05', '2024-06-14'),
+                                  esperado('PETR4.SA', '2024-02-05', '2024-06-14'), check_freq=False)
+    assert len(cache.downloader.periodos) == 1
+    assert cache.acertos == 5 and cache.faltas == 6
+
+
+def test_somente_o_mes_atual_expira(cache, relogio):
+    consultar(cache, ['PETR4.SA', 'VALE3.SA'], '2024-03-01', '2024-06-15')
+    relogio['agora'] = AGORA + TTL_MES_ATUAL + 1
+
+    dfLote = consultar(cache, ['PETR4.SA', 'VALE3.SA'], '2024-03-01', '2024-06-15')
+    pd.testing.assert_frame_equal(dfLote, esperado(['PETR4.SA', 'VALE3.SA'], '2024-03-01', '2024-06-15'),
+                                  check_freq=False)
+    assert cache.downloader.periodos[-1] == (pd.Timestamp('2024-06-01'), pd.Timestamp('2024-07-01'))
+    assert len(cache.downloader.periodos) == 2
+
+
+def test_lote_baixa_somente_os_tickers_ausentes(cache):
+    consultar(cache, 'PETR4.SA', '2024-04-01', '2024-06-15')
+    dfLote = consultar(cache, ['PETR4.SA', 'VALE3.SA'], '2024-04-01', '2024-06-15')
+
+    pd.testing.assert_frame_equal(dfLote, esperado(['PETR4.SA', 'VALE3.SA'], '2024-04-01', '2024-06-15'),
+                                  check_freq=False)
+    assert cache.downloader.consultados == ['PETR4.SA', ['VALE3.SA']]
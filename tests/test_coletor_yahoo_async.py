@@ -0,0 +1,63 @@
+import time
+import pandas as pd
+import pytest
+from substitutos import DownloaderSintetico
+from historico_cotacoes import obter_historico
+from metricas import Metricas
+from registro_falhas import RegistroFalhas
+
+pytest.importorskip('aiohttp')
+from coletor_yahoo_async import ColetorYahooAsync, obter_historico_async  # noqa: E402
+from servidor_chart import iniciar_servidor  # noqa: E402
+
+LATENCIA = 0.05
+TICKERS = ['PETR4.SA', 'VALE3.SA', 'ITUB4.SA']
+INICIO, FIM = '2024-03-01', '2024-07-01'
+
+
+@pytest.fixture
+def servidor():
+    # Respostas gravadas em benchmarks/fixtures/chart, cada uma depois de LATENCIA segundos
+    servidor, url_base = iniciar_servidor(latencia=LATENCIA)
+    yield servidor, url_base
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def test_coletor_igual_ao_obter_historico(servidor):
+    _, url_base = servidor
+    dfAsync = obter_historico_async(INICIO, FIM, TICKERS, url_base=url_base)
+    downloader = DownloaderSintetico()
+    dfHistorico = pd.concat([obter_historico(INICIO, FIM, ticker, downloader=downloader) for ticker in TICKERS],
+                            ignore_index=True)
+
+    assert dfAsync['Dividends'].gt(0).any()
+    pd.testing.assert_frame_equal(dfAsync, dfHistorico)
+
+
+def test_ticker_inexistente_ou_sem_resultado_vai_para_o_registro(servidor, tmp_path):
+    _, url_base = servidor
+    metricas = Metricas()
+    coletor = ColetorYahooAsync(url_base=url_base, espera_base=0, metricas=metricas)
+    resultados = coletor.baixar([(ticker, INICIO, FIM) for ticker in ['INEXISTENTE3.SA', 'VAZIO3.SA', 'PETR4.SA']])
+
+    assert [dfTicker is None for dfTicker in resultados] == [True, True, False]
+    assert metricas.resultados == {'ok': 1, 'vazio': 0, 'falha': 2}
+
+    registro = RegistroFalhas(str(tmp_path))
+    coletor.atualizar_registro(registro)
+    assert {entrada['ticker'] for entrada in registro.falhas.values()} == {'INEXISTENTE3.SA', 'VAZIO3.SA'}
+    assert {entrada['mes'] for entrada in registro.falhas.values()} >= {'2024-03', '2024-06'}
+
+
+def test_max_simultaneas_limita_as_requisicoes_em_andamento(servidor):
+    servidor, url_base = servidor
+    consultas = [(ticker, f'2024-{mes:02d}-01', f'2024-{mes + 1:02d}-01') for ticker in TICKERS for mes in (1, 3, 5, 7)]
+
+    inicio = time.perf_counter()
+    resultados = ColetorYahooAsync(url_base=url_base, max_simultaneas=3).baixar(consultas)
+    segundos = time.perf_counter() - inicio
+
+    assert all(dfTicker is not None for dfTicker in resultados)
+    assert servidor.simultaneas['pico'] == 3
+    assert segundos >= len(consultas) / 3 * LATENCIA
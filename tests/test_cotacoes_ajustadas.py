@@ -0,0 +1,210 @@
+import json
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pytest
+from substitutos import DownloaderSintetico
+from historico_cotacoes import (FORMATO_HISTORICO, PlanoHistorico, baixar_planos, caminho_mes, ler_mes, meses_salvos,
+                                normalizar_historico, salvar_mes, separar_por_mes)
+from manifesto import ARQUIVO_MANIFESTO, Manifesto
+
+pytest.importorskip('pyarrow')
+from cotacoes_ajustadas import CotacoesAjustadas  # noqa: E402
+
+PREFIXO = 'Teste'
+TICKERS = ['PETR4.SA', 'VALE3.SA']
+
+
+def historico(ticker, inicio='2024-01-01', fim='2024-07-01'):
+    dfTicker = normalizar_historico(DownloaderSintetico.serie(ticker, inicio, fim), ticker)
+    dfTicker.loc[dfTicker.index % 20 == 5, 'Dividends'] = 0.3
+    dfTicker.loc[dfTicker.index == 70, 'Stock Splits'] = 1 / 3
+    return dfTicker
+
+
+def gravar_historico(diretorio, dfHistorico):
+    for data_mes, dfMes in separar_por_mes(dfHistorico):
+        if os.path.exists(caminho_mes(diretorio, PREFIXO, data_mes)):
+            dfMes = pd.concat([ler_mes(caminho_mes(diretorio, PREFIXO, data_mes)), dfMes]).drop_duplicates(
+                subset=['Ticker', 'Date'], keep='last').sort_values(['Ticker', 'Date'])
+        salvar_mes(dfMes, diretorio, PREFIXO, data_mes)
+
+
+def ajustados(raiz, diretorio):
+    cotacoes = CotacoesAjustadas(raiz)
+    cotacoes.atualizar(diretorio, PREFIXO)
+    return cotacoes.ler()
+
+
+def test_desdobramento_gravado_com_virgula_decimal(tmp_path):
+    gravar_historico(str(tmp_path), historico('PETR4.SA'))
+    with open(caminho_mes(str(tmp_path), PREFIXO, datetime(2024, 4, 1)), encoding='utf-8') as arquivo:
+        conteudo = arquivo.read()
+    assert ' 0,333333' in conteudo
+    assert ler_mes(caminho_mes(str(tmp_path), PREFIXO, datetime(2024, 4, 1)))['Stock Splits'].max() == 0.333333
+
+
+def test_reparo_em_datas_processadas_recalcula_o_ticker(tmp_path):
+    diretorio = os.path.join(tmp_path, 'historico')
+    os.makedirs(diretorio)
+    dfHistorico = pd.concat([historico(ticker) for ticker in TICKERS], ignore_index=True)
+    gravar_historico(diretorio, dfHistorico[dfHistorico['Date'] < '2024-05-01'])
+
+    cotacoes = CotacoesAjustadas(os.path.join(tmp_path, 'ajustados'))
+    assert cotacoes.atualizar(diretorio, PREFIXO) > 0
+    assert cotacoes.atualizar(diretorio, PREFIXO) == 0
+
+    # Reparo de fevereiro (datas já processadas) junto com os meses novos
+    reparado = dfHistorico.copy()
+    fevereiro = (reparado['Ticker'] == 'VALE3.SA') & (reparado['Date'].dt.month == 2)
+    reparado.loc[fevereiro, 'Close'] += 1.0
+    reparado.loc[fevereiro & (reparado['Date'].dt.day == 15), 'Dividends'] = 0.8
+    gravar_historico(diretorio, reparado[fevereiro | (reparado['Date'] >= '2024-05-01')])
+    cotacoes.atualizar(diretorio, PREFIXO)
+
+    pd.testing.assert_frame_equal(cotacoes.ler(), ajustados(os.path.join(tmp_path, 'completo'), diretorio))
+
+
+def test_diretorio_com_precos_ajustados_e_baixado_novamente(tmp_path):
+    diretorio = str(tmp_path)
+    gravar_historico(diretorio, pd.concat([historico(ticker) for ticker in TICKERS], ignore_index=True))
+    manifesto = Manifesto(os.path.join(diretorio, ARQUIVO_MANIFESTO))
+    manifesto.atualizar('PETR4.SA', datetime(2024, 6, 28))
+    manifesto.salvar()
+
+    agora = datetime(2024, 7, 3, 20)
+    plano = PlanoHistorico('2024-05-01', diretorio, PREFIXO, TICKERS, data_backfill='2024-03-01', agora=agora,
+                           migrar_formato=True)
+    assert dict(plano.grupos) == {datetime(2024, 1, 1): TICKERS}
+
+    # Execução interrompida: somente PETR4 foi gravado, VALE3 continua pendente na proxima execução
+    plano.gravar([historico('PETR4.SA', fim='2024-07-04')])
+    with open(os.path.join(diretorio, ARQUIVO_MANIFESTO), encoding='utf-8') as arquivo:
+        conteudo = json.load(arquivo)
+    assert conteudo['formato'] == FORMATO_HISTORICO
+    assert list(conteudo['legado']) == ['VALE3.SA']
+
+    plano = PlanoHistorico('2024-05-01', diretorio, PREFIXO, TICKERS, data_backfill='2024-03-01', agora=agora)
+    assert dict(plano.grupos) == {datetime(2024, 1, 1): ['VALE3.SA']}
+
+
+def historico_desdobrado(ajustado_pelo_yahoo):
+    """
+    PETR4 com desdobramento 2:1 em 2024-04-01 e proventos trimestrais. Com ajustado_pelo_yahoo os preços e
+    proventos anteriores ao evento vêm divididos por 2, como no historico baixado depois do desdobramento.
+    """
+    datas = pd.bdate_range('2024-01-02', '2024-06-28', name='Date')
+    aleatorio = np.random.default_rng(1)
+    fechamento = np.round(20 * np.cumprod(1 + aleatorio.normal(0, 0.01, len(datas))), 2)
+    dfTicker = pd.DataFrame({'Close': fechamento, 'Dividends': 0.0, 'High': fechamento, 'Low': fechamento,
+                             'Open': fechamento, 'Stock Splits': 0.0, 'Volume': 1000}, index=datas)
+    dfTicker.loc[['2024-02-15', '2024-05-15'], 'Dividends'] = 0.4
+    dfTicker.loc['2024-04-01', 'Stock Splits'] = 2.0
+
+    # Preços brutos: antes do evento cada ação valia o dobro
+    if not ajustado_pelo_yahoo:
+        anteriores = dfTicker.index < '2024-04-01'
+        dfTicker.loc[anteriores, ['Close', 'Dividends', 'High', 'Low', 'Open']] *= 2
+    return normalizar_historico(dfTicker, 'PETR4.SA')
+
+
+def test_desdobramento_ja_ajustado_pelo_yahoo_nao_e_aplicado_de_novo(tmp_path):
+    for pasta, ajustado in [('bruto', False), ('yahoo', True)]:
+        os.makedirs(os.path.join(tmp_path, pasta))
+        gravar_historico(os.path.join(tmp_path, pasta), historico_desdobrado(ajustado))
+    dfBruto = ajustados(os.path.join(tmp_path, 'ajustados_bruto'), os.path.join(tmp_path, 'bruto'))
+    dfYahoo = ajustados(os.path.join(tmp_path, 'ajustados_yahoo'), os.path.join(tmp_path, 'yahoo'))
+
+    pd.testing.assert_series_equal(dfYahoo['Adj Close'], dfBruto['Adj Close'])
+    pd.testing.assert_series_equal(dfYahoo['Total Return'], dfBruto['Total Return'])
+
+    # Sem salto na data do desdobramento e sem proventos no dia, o retorno total acompanha o fechamento
+    posicao = dfYahoo.index[dfYahoo['Date'] == '2024-04-01'][0]
+    assert dfYahoo['Total Return'][posicao] / dfYahoo['Total Return'][posicao - 1] == pytest.approx(
+        dfYahoo['Close'][posicao] / dfYahoo['Close'][posicao - 1])
+    assert dfYahoo['Adj Close'].iat[-1] == pytest.approx(dfYahoo['Close'].iat[-1])
+    antes = dfYahoo['Date'] < '2024-02-15'
+    assert ((dfYahoo['Adj Close'] / dfYahoo['Close'])[antes] > 0.95).all()
+
+
+class DownloaderInterrompido(DownloaderSintetico):
+    """
+    Downloader sintetico em que os tickers de `falhos` falham, como uma execução interrompida no meio.
+    """
+
+    def __init__(self, falhos=()):
+        super().__init__()
+        self.falhos = set(falhos)
+
+    def __call__(self, tickers, start=None, end=None, **kwargs):
+        if tickers in self.falhos:
+            raise ConnectionError(f'{tickers}: conexão encerrada')
+        return super().__call__(tickers, start=start, end=end, **kwargs)
+
+
+def diretorio_legado(diretorio):
+    """
+    Diretorio salvo antes do campo 'formato': preços ajustados (10% abaixo dos brutos) e manifesto sem formato.
+    """
+    for ticker in TICKERS:
+        dfTicker = normalizar_historico(DownloaderSintetico.serie(ticker, '2024-01-01', '2024-07-01'), ticker)
+        dfTicker[['Close', 'High', 'Low', 'Open']] = (dfTicker[['Close', 'High', 'Low', 'Open']] * 0.9).round(2)
+        gravar_historico(diretorio, dfTicker)
+    with open(os.path.join(diretorio, ARQUIVO_MANIFESTO), 'w', encoding='utf-8') as arquivo:
+        json.dump({'datas': {ticker: '2024-06-28' for ticker in TICKERS}, 'aposentados': {}}, arquivo)
+
+
+def executar(diretorio, downloader, migrar_formato):
+    plano = PlanoHistorico('2024-05-01', diretorio, PREFIXO, TICKERS, data_backfill='2024-03-01',
+                           agora=datetime(2024, 7, 3, 20), migrar_formato=migrar_formato)
+    dfNovos, = baixar_planos([plano], downloader=downloader)
+    plano.gravar(dfNovos)
+    return plano
+
+
+def precos_brutos(diretorio, ticker):
+    dfSalvo = pd.concat([ler_mes(caminho) for caminho in meses_salvos(diretorio, PREFIXO).values()])
+    dfSalvo = dfSalvo[dfSalvo['Ticker'] == ticker].set_index('Date')['Close'].sort_index()
+    return dfSalvo.equals(DownloaderSintetico.serie(ticker, '2024-01-01', '2024-07-04')['Close'].reindex(
+        dfSalvo.index))
+
+
+def test_migracao_de_formato_exige_confirmacao(tmp_path, capsys):
+    diretorio = str(tmp_path)
+    diretorio_legado(diretorio)
+    plano = executar(diretorio, DownloaderSintetico(), migrar_formato=False)
+
+    assert 'cerca de 14 pares (ticker, mês)' in capsys.readouterr().out
+    assert dict(plano.grupos) == {datetime(2024, 6, 29): TICKERS}
+    manifesto = Manifesto(os.path.join(diretorio, ARQUIVO_MANIFESTO))
+    assert manifesto.formato is None and not manifesto.legado
+    assert not precos_brutos(diretorio, 'PETR4.SA')
+
+
+def test_migracao_interrompida_continua_no_legado(tmp_path):
+    diretorio = str(tmp_path)
+    diretorio_legado(diretorio)
+
+    # Falha antes da gravação: nada muda no diretorio
+    with pytest.raises(ConnectionError):
+        PlanoHistorico('2024-05-01', diretorio, PREFIXO, TICKERS, data_backfill='2024-03-01',
+                       agora=datetime(2024, 7, 3, 20), migrar_formato=True)
+        raise ConnectionError('execução interrompida antes da gravação')
+    assert Manifesto(os.path.join(diretorio, ARQUIVO_MANIFESTO)).formato is None
+
+    # VALE3 falha: somente PETR4 é regravado, VALE3 continua no legado com os preços ajustados
+    executar(diretorio, DownloaderInterrompido(['VALE3.SA']), migrar_formato=True)
+    manifesto = Manifesto(os.path.join(diretorio, ARQUIVO_MANIFESTO))
+    assert manifesto.formato == FORMATO_HISTORICO
+    assert list(manifesto.legado) == ['VALE3.SA'] and list(manifesto.datas) == ['PETR4.SA']
+    assert precos_brutos(diretorio, 'PETR4.SA') and not precos_brutos(diretorio, 'VALE3.SA')
+
+    # A execução seguinte termina a migração sem precisar da confirmação novamente
+    plano = executar(diretorio, DownloaderSintetico(), migrar_formato=False)
+    assert dict(plano.grupos) == {datetime(2024, 1, 1): ['VALE3.SA']}
+    manifesto = Manifesto(os.path.join(diretorio, ARQUIVO_MANIFESTO))
+    assert not manifesto.legado
+    assert {ticker: manifesto.ultima_data(ticker) for ticker in TICKERS} == {
+        ticker: datetime(2024, 7, 3) for ticker in TICKERS}
+    assert precos_brutos(diretorio, 'PETR4.SA') and precos_brutos(diretorio, 'VALE3.SA')
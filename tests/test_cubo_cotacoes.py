@@ -0,0 +1,71 @@
+import os
+import numpy as np
+import pandas as pd
+from substitutos import DownloaderSintetico
+from cubo_cotacoes import CuboCotacoes
+from historico_cotacoes import normalizar_historico, salvar_mes, separar_por_mes
+
+PREFIXO = 'Teste'
+TICKERS = ['PETR4.SA', 'VALE3.SA', 'ITUB4.SA']
+
+
+def historico(fim='2024-04-01'):
+    return pd.concat([normalizar_historico(DownloaderSintetico.serie(ticker, '2024-01-01', fim), ticker)
+                      for ticker in TICKERS], ignore_index=True)
+
+
+def gravar(diretorio, dfHistorico):
+    for data_mes, dfMes in separar_por_mes(dfHistorico):
+        salvar_mes(dfMes.sort_values(['Ticker', 'Date']), diretorio, PREFIXO, data_mes)
+
+
+def compilar(raiz, diretorio):
+    cubo = CuboCotacoes(raiz)
+    cubo.reconstruir(diretorio, PREFIXO)
+    return cubo
+
+
+def assert_cubos_iguais(cubo, esperado):
+    assert cubo.tickers == esperado.tickers
+    np.testing.assert_array_equal(cubo.datas, esperado.datas)
+    for campo in ('close', 'volume', 'dividends'):
+        np.testing.assert_array_equal(cubo.matriz(campo), esperado.matriz(campo))
+
+
+def test_mes_reparado_nao_altera_a_versao_aberta_pelos_leitores(tmp_path):
+    diretorio = os.path.join(tmp_path, 'historico')
+    os.makedirs(diretorio)
+    dfHistorico = historico()
+    gravar(diretorio, dfHistorico)
+    raiz = os.path.join(tmp_path, 'cubo')
+    CuboCotacoes(raiz).atualizar(diretorio, PREFIXO)
+
+    leitor = CuboCotacoes(raiz)
+    aberta = leitor.matriz('close')
+    anterior = np.array(aberta)
+
+    fevereiro = dfHistorico['Date'].dt.month == 2
+    dfHistorico.loc[fevereiro, 'Close'] += 1.0
+    gravar(diretorio, dfHistorico[fevereiro])
+    CuboCotacoes(raiz).atualizar(diretorio, PREFIXO)
+
+    np.testing.assert_array_equal(aberta, anterior)
+    leitor.recarregar()
+    assert_cubos_iguais(leitor, compilar(os.path.join(tmp_path, 'completo'), diretorio))
+
+
+def test_pregoes_novos_gravados_no_mesmo_arquivo(tmp_path):
+    diretorio = os.path.join(tmp_path, 'historico')
+    os.makedirs(diretorio)
+    gravar(diretorio, historico('2024-03-15'))
+    raiz = os.path.join(tmp_path, 'cubo')
+    CuboCotacoes(raiz).atualizar(diretorio, PREFIXO)
+    inode = os.stat(os.path.join(raiz, 'close.npy')).st_ino
+
+    # Mês atual regravado com os mesmos valores e novos pregões: sem troca de arquivos
+    gravar(diretorio, historico('2024-04-01'))
+    cubo = CuboCotacoes(raiz)
+    cubo.atualizar(diretorio, PREFIXO)
+
+    assert os.stat(os.path.join(raiz, 'close.npy')).st_ino == inode
+    assert_cubos_iguais(CuboCotacoes(raiz), compilar(os.path.join(tmp_path, 'completo'), diretorio))
@@ -0,0 +1,188 @@
+import os
+import shutil
+import urllib.request
+from datetime import datetime
+import lxml.html
+import pandas as pd
+import pytest
+from selenium.webdriver.support.ui import WebDriverWait
+from substitutos import FIXTURE_DATACOM, DriverFixture, EsperaImediata
+import Main_DataCom
+from Main_DataCom import (SCRIPT_TABELA, extract_table_data, linhas_tabela_html, mesclar_datacom,
+                          montar_tabela_dividendos)
+from manifesto import ARQUIVO_MANIFESTO, Manifesto
+from servidor_datacom import iniciar_servidor
+
+
+def ler_fixture():
+    with open(FIXTURE_DATACOM, encoding='utf-8') as arquivo:
+        return arquivo.read()
+
+
+class DriverScript(DriverFixture):
+    """
+    Driver em que o SCRIPT_TABELA responde como o navegador: texto das celulas pelo innerText, que mantém
+    o &nbsp; como '\\xa0' e pode trazer quebras de linha nas bordas.
+    """
+
+    def execute_script(self, *args):
+        tabela = lxml.html.fromstring(self.page_source).xpath('//*[@id="dividendsCalendarData"]')[0]
+        return [[linha.get('class') or '', [f'{celula.text_content()}\n' for celula in linha.iter('td')]]
+                for linha in tabela.iter('tr')]
+
+
+def extrair(driver):
+    return extract_table_data(driver, EsperaImediata(driver))
+
+
+def test_script_e_page_source_extraem_a_mesma_tabela():
+    html = ler_fixture()
+    dfScript = extrair(DriverScript(html))
+    dfHtml = extrair(DriverFixture(html))
+
+    assert not dfScript.empty
+    assert not dfScript['Empresa'].str.contains('\xa0').any()
+    pd.testing.assert_frame_equal(dfScript, dfHtml)
+
+
+def test_mesclar_reconhece_linhas_dos_dois_caminhos(tmp_path):
+    html = ler_fixture()
+    dfHtml = extrair(DriverFixture(html))
+    caminho = os.path.join(tmp_path, 'DATACOM_01_2025.csv')
+    dfHtml.to_csv(caminho, sep=';', index=False, encoding='utf-8')
+
+    dfMesclado = mesclar_datacom(extrair(DriverScript(html)), caminho)
+    assert len(dfMesclado) == len(dfHtml)
+
+
+@pytest.fixture
+def calendario():
+    # Pagina salva do calendario servida em http://127.0.0.1:<porta>/dividends-calendar/
+    servidor, url = iniciar_servidor()
+    yield url
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def test_fallback_lxml_extrai_a_pagina_servida(calendario):
+    with urllib.request.urlopen(calendario) as resposta:
+        html = resposta.read().decode('utf-8')
+    dfHtml = montar_tabela_dividendos(linhas_tabela_html(html))
+
+    # Um evento por linha com a bandeira do país, as linhas 'theDay' separam os dias
+    assert len(dfHtml) == html.count('<td class="flag">') == 500
+    assert dfHtml.iloc[0].tolist() == ['Empresa 0 (T0003)', '02.01.2025', '0,6370', '', '01.02.2025', '2.70%']
+    assert dfHtml['Data ex-dividendos'].str.fullmatch(r'\d{2}\.\d{2}\.\d{4}').all()
+    assert dfHtml['Rendimento'].str.fullmatch(r'\d+\.\d{2}%').all()
+
+
+def chromedriver_instalado():
+    return shutil.which('chromedriver') and any(shutil.which(nome) for nome in
+                                                ('google-chrome', 'chromium', 'chromium-browser', 'chrome'))
+
+
+@pytest.mark.skipif(not chromedriver_instalado(), reason='Chrome e chromedriver não instalados')
+def test_script_tabela_no_chrome_igual_ao_fallback(calendario, tmp_path):
+    driver = Main_DataCom.initialize_driver(headless=True, diretorio_download=str(tmp_path),
+                                            caminho_driver=shutil.which('chromedriver'))
+    try:
+        driver.get(calendario)
+        assert driver.execute_script(SCRIPT_TABELA) is not None
+        dfChrome = extract_table_data(driver, WebDriverWait(driver, 15))
+    finally:
+        driver.quit()
+
+    pd.testing.assert_frame_equal(dfChrome, montar_tabela_dividendos(linhas_tabela_html(ler_fixture())))
+
+
+class NavegadorFixture(DriverFixture):
+    """
+    Chrome simulado para SessaoDataCom: cada intervalo de datas mostra as linhas da fixture com data ex no mês.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__('')
+        self.caminho_driver = kwargs.get('caminho_driver')
+        self.current_url = None
+
+    def get(self, url):
+        self.current_url = url
+
+    def quit(self):
+        pass
+
+
+def pagina_intervalo(html, inicio, fim):
+    documento = lxml.html.fromstring(html)
+    inicio, fim = (pd.to_datetime(data, format='%d/%m/%Y') for data in (inicio, fim))
+    for linha in list(documento.iter('tr')):
+        celulas = list(linha.iter('td'))
+        if len(celulas) == 7 and not inicio <= pd.to_datetime(celulas[2].text_content(), format='%d.%m.%Y') <= fim:
+            linha.getparent().remove(linha)
+    return lxml.html.tostring(documento, encoding='unicode')
+
+
+@pytest.fixture
+def navegadores(monkeypatch):
+    """
+    Substitui o Chrome e a configuração da pagina. `falhas` define quantas vezes cada mês ('MM/YYYY') falha
+    antes de extrair a tabela.
+    """
+    html = ler_fixture()
+    estado = {'falhas': {}, 'drivers': []}
+
+    def iniciar(*args, **kwargs):
+        driver = NavegadorFixture(*args, **kwargs)
+        estado['drivers'].append(driver)
+        return driver
+
+    def selecionar_datas(driver, wait, start_date, end_date):
+        mes = end_date[3:]
+        if estado['falhas'].get(mes, 0) > 0:
+            estado['falhas'][mes] -= 1
+            raise Main_DataCom.FalhaExtracao(f'filtro não aplicado em {mes}')
+        driver.page_source = pagina_intervalo(html, start_date, end_date)
+
+    monkeypatch.setattr(Main_DataCom, 'initialize_driver', iniciar)
+    monkeypatch.setattr(Main_DataCom, 'caminho_chromedriver', lambda: 'chromedriver')
+    monkeypatch.setattr(Main_DataCom, 'close_overlays', lambda driver: None)
+    monkeypatch.setattr(Main_DataCom, 'select_countries', lambda driver, wait: None)
+    monkeypatch.setattr(Main_DataCom, 'select_dates', selecionar_datas)
+    return estado
+
+
+def arquivos_datacom(diretorio):
+    return {nome: pd.read_csv(os.path.join(diretorio, nome), sep=';', dtype=str)
+            for nome in sorted(os.listdir(diretorio)) if nome.startswith('DATACOM_')}
+
+
+def test_paralelo_igual_ao_sequencial(navegadores, tmp_path):
+    sequencial, paralelo = os.path.join(tmp_path, 'sequencial'), os.path.join(tmp_path, 'paralelo')
+    os.makedirs(sequencial)
+    os.makedirs(paralelo)
+    navegadores['falhas'] = {'01/2025': 1}
+    Main_DataCom.salvar_datacom('2024-11-15', sequencial)
+    navegadores['falhas'], navegadores['drivers'] = {'01/2025': 1}, []
+    Main_DataCom.salvar_datacom_paralelo('2024-11-15', paralelo, max_workers=3)
+
+    dfSequencial, dfParalelo = arquivos_datacom(sequencial), arquivos_datacom(paralelo)
+    assert list(dfSequencial) == list(dfParalelo) == ['DATACOM__01_2025.csv']
+    pd.testing.assert_frame_equal(dfSequencial['DATACOM__01_2025.csv'], dfParalelo['DATACOM__01_2025.csv'])
+    assert len(dfParalelo['DATACOM__01_2025.csv']) == len(extrair(DriverFixture(ler_fixture())))
+
+    ultima = Manifesto(os.path.join(paralelo, ARQUIVO_MANIFESTO)).ultima_data(Main_DataCom.CHAVE_MANIFESTO)
+    assert ultima == Manifesto(os.path.join(sequencial, ARQUIVO_MANIFESTO)).ultima_data(
+        Main_DataCom.CHAVE_MANIFESTO)
+    assert ultima.date() == min(datetime.now().date(), ultima.date())
+    assert {driver.caminho_driver for driver in navegadores['drivers']} == {'chromedriver'}
+
+
+@pytest.mark.parametrize('salvar', ['salvar_datacom', 'salvar_datacom_paralelo'])
+def test_manifesto_para_na_primeira_janela_com_falha(navegadores, tmp_path, salvar):
+    navegadores['falhas'] = {'12/2024': 10}
+    getattr(Main_DataCom, salvar)('2024-11-15', str(tmp_path))
+
+    ultima = Manifesto(os.path.join(tmp_path, ARQUIVO_MANIFESTO)).ultima_data(Main_DataCom.CHAVE_MANIFESTO)
+    assert ultima == datetime(2024, 11, 30)
+    # Os meses seguintes são gravados, a proxima execução os extrai novamente a partir de dezembro
+    assert list(arquivos_datacom(tmp_path)) == ['DATACOM__01_2025.csv']
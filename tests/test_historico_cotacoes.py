@@ -0,0 +1,148 @@
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pytest
+from substitutos import DownloaderSintetico
+from agendador import executar_concorrente
+from historico_cotacoes import (COLUNAS_YF, PlanoHistorico, baixar_planos, formatar_decimal_br, ler_mes, meses_salvos,
+                                normalizar_historico, obter_historico, obter_historico_lote)
+from manifesto import ARQUIVO_MANIFESTO, Manifesto
+from metricas import Metricas
+from registro_falhas import DownloaderResiliente
+
+TICKERS = ['PETR4.SA', 'VALE3.SA', 'ITUB4.SA', 'BBDC4.SA', 'WEGE3.SA']
+INICIO, FIM = '2024-01-01', '2024-04-01'
+
+
+class DownloaderComFalha(DownloaderSintetico):
+    """
+    Igual ao DownloaderSintetico, mas os tickers de `falhos` voltam do lote como o yf.download devolve um ticker
+    com erro: o bloco de colunas inteiro vazio.
+    """
+
+    def __init__(self, falhos):
+        super().__init__()
+        self.falhos = set(falhos)
+
+    def __call__(self, tickers, start=None, end=None, group_by='column', **kwargs):
+        dfLote = super().__call__(tickers, start=start, end=end, **kwargs).astype('float64')
+        for ticker in self.falhos & set(tickers):
+            dfLote.loc[:, ticker] = np.nan
+        return dfLote if group_by == 'ticker' else dfLote.swaplevel(axis=1)
+
+
+def ordenar(dfHistorico):
+    return dfHistorico.sort_values(['Ticker', 'Date'], kind='stable').reset_index(drop=True)
+
+
+def test_lote_e_paralelo_iguais_ao_download_por_ticker():
+    downloader = DownloaderSintetico()
+    dfSequencial = pd.concat([obter_historico(INICIO, FIM, ticker, downloader=downloader) for ticker in TICKERS],
+                             ignore_index=True)
+    dfLote = obter_historico_lote(INICIO, FIM, TICKERS, tamanho_lote=2, downloader=downloader)
+    dfParalelo = pd.concat(executar_concorrente(lambda ticker: obter_historico(INICIO, FIM, ticker,
+                                                                               downloader=downloader),
+                                                TICKERS, max_workers=4), ignore_index=True)
+
+    assert list(dfLote.columns) == list(dfSequencial.columns)
+    pd.testing.assert_frame_equal(ordenar(dfLote), ordenar(dfSequencial))
+    pd.testing.assert_frame_equal(ordenar(dfParalelo), ordenar(dfSequencial))
+
+
+def test_lote_classifica_bloco_vazio_como_falha():
+    metricas = Metricas()
+    dfLote = obter_historico_lote(INICIO, FIM, TICKERS, tamanho_lote=10,
+                                  downloader=DownloaderComFalha(['VALE3.SA']), metricas=metricas)
+
+    assert 'VALE3.SA' not in set(dfLote['Ticker'])
+    assert metricas.resultados == {'ok': 4, 'vazio': 0, 'falha': 1}
+    assert [falha['ticker'] for falha in metricas.falhas] == ['VALE3.SA']
+
+
+@pytest.mark.parametrize('group_by', ['ticker', 'column'])
+def test_downloader_resiliente_registra_bloco_vazio(group_by):
+    downloader = DownloaderResiliente(DownloaderComFalha(['ITUB4.SA']), esperar=lambda segundos: None)
+    dfLote = downloader(TICKERS, start=INICIO, end=FIM, group_by=group_by)
+
+    assert set(dfLote.columns.get_level_values(0 if group_by == 'ticker' else 1)) == set(TICKERS)
+    assert [falha[0] for falha in downloader.falhas] == ['ITUB4.SA']
+    assert sorted(sucesso[0] for sucesso in downloader.sucessos) == sorted(set(TICKERS) - {'ITUB4.SA'})
+    assert list(dfLote.columns.get_level_values(1 if group_by == 'ticker' else 0).unique()) == COLUNAS_YF
+
+
+def test_formatar_decimal_br_igual_ao_f_string():
+    aleatorio = np.random.default_rng(0)
+    valores = np.concatenate([
+        [0.0, -0.0, -0.001, -0.004999, -0.005, 0.005, 0.015, 1.005, 2.675, -2.675, 1e13, 9.2e16, 1e17, -1e17,
+         np.inf, -np.inf],
+        aleatorio.normal(0, 1000, 20000).round(3),
+        aleatorio.uniform(-1e12, 1e12, 20000),
+    ])
+    esperado = [f'{valor: .2f}'.replace('.', ',') for valor in valores]
+    assert list(formatar_decimal_br(valores)) == esperado
+    assert list(formatar_decimal_br([np.nan, -0.0])) == ['', '-0,00']
+
+
+class DownloaderPregao(DownloaderSintetico):
+    """
+    Durante o pregão o ultimo dia vem com o fechamento parcial, diferente do fechamento final do dia.
+    """
+
+    def __init__(self, dia_parcial):
+        super().__init__()
+        self.dia_parcial = pd.Timestamp(dia_parcial)
+
+    @staticmethod
+    def parcial(dfTicker, dia):
+        dfTicker = dfTicker.copy()
+        dfTicker.loc[dfTicker.index == dia, 'Close'] += 0.5
+        return dfTicker
+
+    def __call__(self, tickers, start=None, end=None, **kwargs):
+        return self.parcial(super().__call__(tickers, start=start, end=end, **kwargs), self.dia_parcial)
+
+
+def executar_plano(diretorio, tickers, downloader, agora):
+    plano = PlanoHistorico('2024-01-01', diretorio, 'Teste', tickers, data_backfill='2023-11-01', agora=agora)
+    dfNovos, = baixar_planos([plano], downloader=downloader)
+    plano.gravar(dfNovos)
+    return plano
+
+
+def test_plano_baixa_somente_os_dias_faltantes_de_cada_ticker(tmp_path):
+    diretorio = str(tmp_path)
+
+    # Primeira execução durante o pregão de 13/03: o dia é gravado, mas o manifesto para no dia anterior
+    executar_plano(diretorio, ['PETR4.SA', 'VALE3.SA'], DownloaderPregao('2024-03-13'), datetime(2024, 3, 13, 12))
+    manifesto = Manifesto(os.path.join(diretorio, ARQUIVO_MANIFESTO))
+    assert {ticker: manifesto.ultima_data(ticker) for ticker in ['PETR4.SA', 'VALE3.SA']} == {
+        'PETR4.SA': datetime(2024, 3, 12), 'VALE3.SA': datetime(2024, 3, 12)}
+
+    # Segunda execução: VALE3 sai do universo, ITUB4 entra e recebe o historico desde data_backfill
+    downloader = DownloaderSintetico()
+    plano = executar_plano(diretorio, ['PETR4.SA', 'ITUB4.SA'], downloader, datetime(2024, 4, 10, 20))
+    assert plano.grupos == {datetime(2024, 3, 13): ['PETR4.SA'], datetime(2023, 11, 1): ['ITUB4.SA']}
+    assert downloader.chamadas == 2
+
+    manifesto = Manifesto(os.path.join(diretorio, ARQUIVO_MANIFESTO))
+    assert manifesto.datas == {'ITUB4.SA': '2024-04-10', 'PETR4.SA': '2024-04-10', 'VALE3.SA': '2024-03-12'}
+    assert list(manifesto.aposentados) == ['VALE3.SA']
+
+    # Meses mesclados sem linhas repetidas: o 13/03 de PETR4 foi substituido pelo fechamento final, o de VALE3
+    # (fora do universo) continua com o parcial
+    dfSalvo = pd.concat([ler_mes(caminho) for caminho in meses_salvos(diretorio, 'Teste').values()],
+                        ignore_index=True)
+    assert not dfSalvo.duplicated(['Ticker', 'Date']).any()
+    esperado = pd.concat([
+        normalizar_historico(DownloaderSintetico.serie('PETR4.SA', '2024-01-01', '2024-04-11'), 'PETR4.SA'),
+        normalizar_historico(DownloaderPregao.parcial(DownloaderSintetico.serie('VALE3.SA', '2024-01-01',
+                                                                               '2024-03-14'), '2024-03-13'),
+                             'VALE3.SA'),
+        normalizar_historico(DownloaderSintetico.serie('ITUB4.SA', '2023-11-01', '2024-04-11'), 'ITUB4.SA'),
+    ], ignore_index=True)
+    pd.testing.assert_frame_equal(ordenar(dfSalvo)[['Ticker', 'Date', 'Close', 'Volume']],
+                                  ordenar(esperado)[['Ticker', 'Date', 'Close', 'Volume']])
+
+    # Nada faltando no mesmo dia
+    assert executar_plano(diretorio, ['PETR4.SA', 'ITUB4.SA'], downloader, datetime(2024, 4, 10, 21)).grupos == {}
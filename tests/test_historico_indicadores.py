@@ -0,0 +1,84 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from leitor_indicadores import ler_indicadores
+
+pytest.importorskip('pyarrow')
+from historico_indicadores import COLUNA_TICKER, HistoricoIndicadores  # noqa: E402
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE_FII = os.path.join(RAIZ, 'benchmarks', 'fixtures', 'statusinvest_fii.csv')
+
+
+def snapshots():
+    """
+    Cinco dias do CSV de FIIs com preços alterados, um fundo incluido, um removido e uma coluna nova.
+    """
+    dfBase = ler_indicadores(FIXTURE_FII)
+    aleatorio = np.random.default_rng(0)
+    dias = {}
+    for posicao, data in enumerate(['2025-01-06', '2025-01-07', '2025-01-08', '2025-01-09', '2025-01-10']):
+        df = dfBase.copy()
+        df['PRECO'] = (df['PRECO'] * (1 + aleatorio.normal(0, 0.01, len(df)))).round(2)
+        if posicao >= 2:
+            df = pd.concat([df, pd.DataFrame({COLUNA_TICKER: ['NOVO11'], 'PRECO': [10.0], 'GESTAO': ['Ativa']})],
+                           ignore_index=True)
+        if posicao >= 3:
+            df = df.iloc[1:]
+            df['NOVA COLUNA'] = 1.5
+        if posicao == 4:
+            df.loc[df[COLUNA_TICKER] == 'NOVO11', 'GESTAO'] = 'Passiva'
+        dias[data] = df
+    return dias
+
+
+def assert_estado_igual(estado, df):
+    esperado = df.set_index(COLUNA_TICKER)
+    pd.testing.assert_frame_equal(estado.loc[esperado.index, esperado.columns], esperado, check_dtype=False,
+                                  check_index_type=False)
+    assert sorted(estado.index) == sorted(esperado.index)
+
+
+def test_estado_em_igual_ao_snapshot_de_cada_data(tmp_path):
+    historico = HistoricoIndicadores(str(tmp_path), intervalo_keyframe=3)
+    dias = snapshots()
+    for data, df in dias.items():
+        historico.registrar(df, data)
+        # Segunda atualização do dia substitui o snapshot (09/01 é keyframe, 10/01 delta)
+        if data >= '2025-01-09':
+            dias[data] = df.assign(PRECO=df['PRECO'] + 1)
+            historico.registrar(dias[data], data)
+
+    # Substituição com outro tipo: o delta de 10/01 vira keyframe e o arquivo do delta é removido
+    dias['2025-01-10'] = dias['2025-01-10'].assign(DY=2.0)
+    HistoricoIndicadores(str(tmp_path), intervalo_keyframe=1).registrar(dias['2025-01-10'], '2025-01-10')
+
+    historico = HistoricoIndicadores(str(tmp_path), intervalo_keyframe=3)
+    assert historico.datas() == list(dias)
+    assert [snapshot['tipo'] for snapshot in historico.snapshots] == ['keyframe', 'delta', 'delta', 'keyframe',
+                                                                     'keyframe']
+    for data, df in dias.items():
+        assert_estado_igual(historico.estado_em(data), df)
+
+    arquivos = {tipo: sorted(os.listdir(os.path.join(tmp_path, tipo))) for tipo in ('keyframes', 'deltas')}
+    assert arquivos == {'keyframes': ['2025-01-06.parquet', '2025-01-09.parquet', '2025-01-10.parquet'],
+                        'deltas': ['2025-01-07.parquet', '2025-01-08.parquet']}
+
+
+def test_substituicao_interrompida_mantem_o_snapshot_anterior(tmp_path, monkeypatch):
+    dias = snapshots()
+    historico = HistoricoIndicadores(str(tmp_path), intervalo_keyframe=3)
+    for data in ['2025-01-06', '2025-01-07']:
+        historico.registrar(dias[data], data)
+
+    def falhar(*args):
+        raise OSError('disco cheio')
+
+    monkeypatch.setattr(HistoricoIndicadores, '_gravar', falhar)
+    with pytest.raises(OSError):
+        historico.registrar(dias['2025-01-08'], '2025-01-07')
+
+    historico = HistoricoIndicadores(str(tmp_path), intervalo_keyframe=3)
+    assert historico.datas() == ['2025-01-06', '2025-01-07']
+    assert_estado_igual(historico.estado_em('2025-01-07'), dias['2025-01-07'])
@@ -0,0 +1,65 @@
+import os
+import shutil
+import pandas as pd
+import pytest
+from servidor_statusinvest import ARQUIVOS_PADRAO, iniciar_servidor
+from indicadores_http import baixar_indicadores
+from leitor_indicadores import ler_indicadores
+
+
+@pytest.fixture
+def servidor():
+    servidor, url_base = iniciar_servidor()
+    yield url_base
+    servidor.shutdown()
+
+
+@pytest.mark.parametrize('classe', ['acoes', 'fii'])
+def test_download_http_igual_ao_arquivo_do_navegador(servidor, tmp_path, classe):
+    destino = os.path.join(tmp_path, 'Indicadores Financeiros', f'indicadores_{classe}.csv')
+    assert baixar_indicadores(classe, destino, url_base=servidor) == destino
+
+    dfHttp = ler_indicadores(destino)
+    dfNavegador = ler_indicadores(ARQUIVOS_PADRAO[classe])
+    assert list(dfHttp.columns) == list(dfNavegador.columns)
+    pd.testing.assert_frame_equal(dfHttp, dfNavegador)
+    assert not os.path.exists(destino + '.tmp')
+
+
+def test_pagina_de_bloqueio_nao_substitui_o_arquivo(tmp_path):
+    servidor, url_base = iniciar_servidor(bloqueio=True)
+    try:
+        destino = os.path.join(tmp_path, 'indicadores_acoes.csv')
+        with pytest.raises(ValueError):
+            baixar_indicadores('acoes', destino, url_base=url_base)
+        assert not os.path.exists(destino)
+    finally:
+        servidor.shutdown()
+
+
+def test_historico_registrado_somente_apos_download(monkeypatch, tmp_path):
+    import Main_IndicadoresFinanceiros
+    from historico_indicadores import HistoricoIndicadores
+
+    def download_bloqueado(categoria, destino, sessao=None):
+        raise ValueError('pagina de bloqueio')
+
+    def navegador_fii():
+        destino = os.path.join(tmp_path, 'Indicadores Financeiros', 'Indicadores_FiiIBOV.csv')
+        shutil.copyfile(ARQUIVOS_PADRAO['fii'], destino)
+        return destino
+
+    # Arquivo de ações de uma execução anterior: não deve entrar no historico como snapshot de hoje
+    os.makedirs(os.path.join(tmp_path, 'Indicadores Financeiros'))
+    shutil.copyfile(ARQUIVOS_PADRAO['acoes'],
+                    os.path.join(tmp_path, 'Indicadores Financeiros', 'Indicadores_AcoesIBOV.csv'))
+
+    monkeypatch.setattr(Main_IndicadoresFinanceiros, 'projeto', str(tmp_path), raising=False)
+    monkeypatch.setattr(Main_IndicadoresFinanceiros, 'baixar_indicadores', download_bloqueado)
+    monkeypatch.setattr(Main_IndicadoresFinanceiros, 'indicadores_AcoesIBOV', lambda: None)
+    monkeypatch.setattr(Main_IndicadoresFinanceiros, 'indicadores_FiiIBOV', navegador_fii)
+    Main_IndicadoresFinanceiros.atualizar_indicadores(sessao=object())
+
+    historico = os.path.join(tmp_path, 'Indicadores Financeiros', 'Historico')
+    assert HistoricoIndicadores(os.path.join(historico, 'acoes')).datas() == []
+    assert len(HistoricoIndicadores(os.path.join(historico, 'fii')).datas()) == 1
@@ -0,0 +1,110 @@
+import os
+from datetime import datetime
+import pandas as pd
+import pytest
+from substitutos import DownloaderSintetico
+from historico_cotacoes import (COLUNAS_YF, EscritorParticoes, caminho_mes, diretorio_intraday, normalizar_historico,
+                                salvar_intraday)
+from manifesto import ARQUIVO_MANIFESTO
+
+PREFIXO = 'Teste'
+TICKERS = ['PETR4.SA', 'VALE3.SA']
+
+
+def barras(ticker, inicio, fim, versao=0):
+    """
+    Barras de 5 minutos das 10h às 11h de cada pregão em [inicio, fim), fechamento do DownloaderSintetico
+    mais `versao` centavos.
+    """
+    dfDiario = DownloaderSintetico.serie(ticker, pd.Timestamp(inicio).normalize(), fim)
+    horarios = pd.DatetimeIndex([dia + pd.Timedelta(minutes=minutos) for dia in dfDiario.index
+                                 for minutos in range(600, 660, 5)], name='Date')
+    dfTicker = dfDiario.reindex(horarios.normalize()).set_axis(horarios)
+    dfTicker['Close'] += versao / 100
+    dfTicker['Dividends'] = 0.0
+    return dfTicker[(dfTicker.index >= pd.Timestamp(inicio)) & (dfTicker.index < pd.Timestamp(fim))][COLUNAS_YF]
+
+
+class DownloaderIntraday:
+    """
+    Substituto do yf.download para barras intraday. Os tickers de `interromper` geram KeyboardInterrupt, como uma
+    execução encerrada no meio.
+    """
+
+    def __init__(self, versao=0, interromper=()):
+        self.versao = versao
+        self.interromper = set(interromper)
+
+    def __call__(self, ticker, start=None, end=None, **kwargs):
+        if ticker in self.interromper:
+            raise KeyboardInterrupt
+        return barras(ticker, start, end, self.versao)
+
+
+def ler_publicado(diretorio, data_mes=datetime(2024, 3, 1)):
+    return pd.read_csv(caminho_mes(diretorio, f'{PREFIXO}_5m', data_mes), sep=';', decimal=',',
+                       skipinitialspace=True, parse_dates=['Date'])
+
+
+def ler_bytes(caminho):
+    with open(caminho, 'rb') as arquivo:
+        return arquivo.read()
+
+
+def parciais(diretorio):
+    return [arquivo for arquivo in os.listdir(diretorio) if arquivo.endswith('.parcial')]
+
+
+def test_finalizar_substitui_somente_a_partir_do_primeiro_horario_recebido(tmp_path):
+    salvar_intraday(str(tmp_path), PREFIXO, TICKERS, downloader=DownloaderIntraday(), max_workers=1,
+                    agora=datetime(2024, 3, 7, 12))
+    diretorio = diretorio_intraday(str(tmp_path), '5m')
+    dfAnterior = ler_publicado(diretorio)
+
+    # PETR4 chega a partir das 10h30 de 06/03 com outros valores
+    escritor = EscritorParticoes(diretorio, f'{PREFIXO}_5m')
+    escritor.adicionar(normalizar_historico(barras('PETR4.SA', '2024-03-06 10:30', '2024-03-09', versao=7),
+                                            'PETR4.SA'))
+    assert parciais(diretorio) == [os.path.basename(caminho_mes(diretorio, f'{PREFIXO}_5m',
+                                                                datetime(2024, 3, 1))) + '.parcial']
+    pd.testing.assert_frame_equal(ler_publicado(diretorio), dfAnterior)
+    escritor.finalizar()
+
+    assert parciais(diretorio) == []
+    dfFinal = ler_publicado(diretorio)
+    assert not dfFinal.duplicated(['Ticker', 'Date']).any()
+
+    limite = pd.Timestamp('2024-03-06 10:30')
+    mantidas = (dfAnterior['Ticker'] == 'VALE3.SA') | (dfAnterior['Date'] < limite)
+    pd.testing.assert_frame_equal(dfFinal[(dfFinal['Ticker'] == 'VALE3.SA') | (dfFinal['Date'] < limite)]
+                                  .reset_index(drop=True), dfAnterior[mantidas].reset_index(drop=True))
+
+    dfPetr = dfFinal[(dfFinal['Ticker'] == 'PETR4.SA') & (dfFinal['Date'] >= limite)]
+    esperado = barras('PETR4.SA', '2024-03-06 10:30', '2024-03-09', versao=7)
+    assert list(dfPetr['Date']) == list(esperado.index)
+    assert list(dfPetr['Close']) == pytest.approx(list(esperado['Close']))
+
+
+def test_execucao_interrompida_nao_altera_a_particao_publicada(tmp_path):
+    salvar_intraday(str(tmp_path), PREFIXO, TICKERS, downloader=DownloaderIntraday(), max_workers=1,
+                    agora=datetime(2024, 3, 7, 12))
+    diretorio = diretorio_intraday(str(tmp_path), '5m')
+    caminhos = [caminho_mes(diretorio, f'{PREFIXO}_5m', datetime(2024, 3, 1)),
+                os.path.join(diretorio, ARQUIVO_MANIFESTO)]
+    conteudos = [ler_bytes(caminho) for caminho in caminhos]
+
+    # PETR4 já foi para o parcial quando VALE3 interrompe a execução
+    downloader = DownloaderIntraday(versao=3, interromper=['VALE3.SA'])
+    with pytest.raises(KeyboardInterrupt):
+        salvar_intraday(str(tmp_path), PREFIXO, TICKERS, downloader=downloader, max_workers=1, tickers_por_bloco=1,
+                        agora=datetime(2024, 3, 8, 12))
+
+    assert parciais(diretorio) == []
+    assert [ler_bytes(caminho) for caminho in caminhos] == conteudos
+
+    # Parcial deixado por um processo encerrado sem descartar é removido pela execução seguinte
+    with open(caminhos[0] + '.parcial', 'w', encoding='utf-8') as arquivo:
+        arquivo.write('Date;Close\n')
+    EscritorParticoes(diretorio, f'{PREFIXO}_5m')
+    assert parciais(diretorio) == []
+    assert ler_bytes(caminhos[0]) == conteudos[0]
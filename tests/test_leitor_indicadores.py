@@ -0,0 +1,45 @@
+import os
+import shutil
+import pandas as pd
+import leitor_indicadores
+from leitor_indicadores import carregar_indicadores, ler_indicadores
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE_ACOES = os.path.join(RAIZ, 'statusinvest-busca-avancada.csv')
+
+
+def test_cache_invalidado_quando_o_csv_muda(tmp_path, monkeypatch):
+    caminho = os.path.join(tmp_path, 'indicadores_AcoesIBOV.csv')
+    shutil.copyfile(FIXTURE_ACOES, caminho)
+    diretorio_cache = os.path.join(tmp_path, 'cache')
+
+    leituras = []
+    monkeypatch.setattr(leitor_indicadores, 'ler_indicadores',
+                        lambda *args: leituras.append(args) or ler_indicadores(*args))
+
+    dfPrimeira = carregar_indicadores(caminho, diretorio_cache=diretorio_cache)
+    pd.testing.assert_frame_equal(carregar_indicadores(caminho, diretorio_cache=diretorio_cache), dfPrimeira)
+    assert len(leituras) == 1
+    caches = os.listdir(diretorio_cache)
+    assert len(caches) == 1
+
+    # Mesmo tamanho e data de modificação preservada: somente o conteudo identifica a alteração
+    with open(caminho, encoding='utf-8', newline='') as arquivo:
+        conteudo = arquivo.read()
+    ticker = dfPrimeira['TICKER'].iat[0]
+    alterado = conteudo.replace(f'\n{ticker};', f'\n{ticker[:-1]}9;', 1)
+    estado = os.stat(caminho)
+    with open(caminho, 'w', encoding='utf-8', newline='') as arquivo:
+        arquivo.write(alterado)
+    os.utime(caminho, ns=(estado.st_atime_ns, estado.st_mtime_ns))
+    assert os.stat(caminho).st_size == estado.st_size
+
+    dfAlterado = carregar_indicadores(caminho, diretorio_cache=diretorio_cache)
+    assert len(leituras) == 2
+    assert dfAlterado['TICKER'].iat[0] == f'{ticker[:-1]}9'
+    pd.testing.assert_frame_equal(dfAlterado.iloc[1:], dfPrimeira.iloc[1:])
+
+    # O cache da versão anterior é substituido, a leitura seguinte volta a usar o cache
+    assert len(os.listdir(diretorio_cache)) == 1 and os.listdir(diretorio_cache) != caches
+    pd.testing.assert_frame_equal(carregar_indicadores(caminho, diretorio_cache=diretorio_cache), dfAlterado)
+    assert len(leituras) == 2
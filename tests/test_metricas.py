@@ -0,0 +1,18 @@
+import re
+from metricas import PREFIXO_PROMETHEUS, Metricas
+
+
+def test_texto_prometheus_reserva_sufixo_total_para_contadores():
+    metricas = Metricas()
+    metricas.resultado('PETR4.SA', 'ok', linhas=10)
+    metricas.resultado('VALE3.SA', 'falha', erro='timeout')
+    metricas.retentativa()
+    with metricas.etapa('fetch'):
+        pass
+    metricas.finalizar()
+    texto = metricas.texto_prometheus()
+
+    tipos = dict(re.findall(r'^# TYPE (\S+) (\S+)$', texto, flags=re.MULTILINE))
+    assert all(tipo == 'counter' for nome, tipo in tipos.items() if nome.endswith('_total'))
+    assert tipos[f'{PREFIXO_PROMETHEUS}_tickers'] == tipos[f'{PREFIXO_PROMETHEUS}_retentativas'] == 'gauge'
+    assert re.search(r'_tickers\{execucao="ingestao",resultado="falha"\} 1$', texto, flags=re.MULTILINE)
@@ -0,0 +1,88 @@
+import json
+import os
+import pandas as pd
+from substitutos import DownloaderSintetico
+from historico_cotacoes import caminho_mes, ler_mes, normalizar_historico, salvar_mes, separar_por_mes
+from motor_ingestao import CLASSES_ATIVOS, diretorio_classe
+from proventos_cotacoes import ARQUIVO_ESTADO, JuncaoProventos, assinatura_arquivo, juntar_asof, ler_datacom
+
+TICKERS = ['PETR4', 'VALE3', 'ITUB4']
+PREFIXO = CLASSES_ATIVOS['acoes']['prefixo']
+
+
+def gravar_cotacoes(projeto, dfHistorico):
+    diretorio = diretorio_classe(projeto, 'acoes')
+    os.makedirs(diretorio, exist_ok=True)
+    for data_mes, dfMes in separar_por_mes(dfHistorico):
+        salvar_mes(dfMes.sort_values(['Ticker', 'Date']), diretorio, PREFIXO, data_mes)
+
+
+def gravar_datacom(projeto, mes, ano, eventos):
+    """
+    Arquivo do DataCom com um evento por (ticker, dia do mês), nas colunas gravadas por Main_DataCom.
+    """
+    diretorio = os.path.join(projeto, 'DataCom Proventos')
+    os.makedirs(diretorio, exist_ok=True)
+    pd.DataFrame([{'Empresa': f'Empresa {ticker} ({ticker})', 'Data ex-dividendos': f'{dia:02d}.{mes:02d}.{ano}',
+                   'Dividendo': f'{valor:.4f}'.replace('.', ','), 'Tipo': '', 'Pagamento': f'28.{mes:02d}.{ano}',
+                   'Rendimento': '1,00%'} for ticker, dia, valor in eventos]).to_csv(
+        os.path.join(diretorio, f'DATACOM__{mes:02d}_{ano}.csv'), sep=';', index=False, encoding='utf-8')
+
+
+def juncao_completa(projeto):
+    """
+    Referencia: merge_asof de todos os eventos com todas as cotações salvas.
+    """
+    diretorio_datacom = os.path.join(projeto, 'DataCom Proventos')
+    eventos = ler_datacom([os.path.join(diretorio_datacom, arquivo) for arquivo in sorted(os.listdir(
+        diretorio_datacom)) if arquivo.startswith('DATACOM_')])
+    diretorio = diretorio_classe(projeto, 'acoes')
+    cotacoes = pd.concat([ler_mes(os.path.join(diretorio, arquivo)) for arquivo in sorted(os.listdir(diretorio))
+                          if arquivo.startswith(PREFIXO)], ignore_index=True)
+    return juntar_asof(eventos, cotacoes).sort_values(['Data ex-dividendos', 'Ticker'],
+                                                      kind='stable').reset_index(drop=True)
+
+
+def test_juncao_incremental_igual_a_completa(tmp_path, monkeypatch):
+    projeto = str(tmp_path)
+    dfHistorico = pd.concat([normalizar_historico(DownloaderSintetico.serie(f'{ticker}.SA', '2024-01-01',
+                                                                            '2024-05-01'), f'{ticker}.SA')
+                             for ticker in TICKERS], ignore_index=True)
+    gravar_cotacoes(projeto, dfHistorico)
+    # Datas ex em fins de semana usam o pregão anterior, SEMC3 não tem cotações
+    gravar_datacom(projeto, 2, 2024, [('PETR4', 3, 0.5), ('VALE3', 15, 1.2), ('SEMC3', 20, 0.1)])
+    gravar_datacom(projeto, 3, 2024, [('PETR4', 1, 0.4), ('ITUB4', 16, 0.3), ('VALE3', 28, 0.9)])
+    gravar_datacom(projeto, 4, 2024, [('ITUB4', 6, 0.2), ('PETR4', 22, 0.7)])
+
+    juncao = JuncaoProventos(projeto, classes=['acoes'])
+    pd.testing.assert_frame_equal(juncao.atualizar(), juncao_completa(projeto))
+
+    # Março regravado (reparo): o estado é invalidado e somente eventos a partir de março são recalculados
+    leituras = []
+    ler_cotacoes = JuncaoProventos.ler_cotacoes
+    monkeypatch.setattr(JuncaoProventos, 'ler_cotacoes',
+                        lambda self, inicio, fim: leituras.append((inicio, fim)) or ler_cotacoes(self, inicio, fim))
+    marco = dfHistorico['Date'].dt.month == 3
+    dfHistorico.loc[marco, 'Close'] += 1.0
+    gravar_cotacoes(projeto, dfHistorico[marco])
+    caminho_marco = caminho_mes(diretorio_classe(projeto, 'acoes'), PREFIXO, pd.Timestamp('2024-03-01'))
+
+    dfIncremental = JuncaoProventos(projeto, classes=['acoes']).atualizar()
+    assert leituras == [(pd.Timestamp('2024-03-01'), pd.Timestamp('2024-04-22'))]
+    pd.testing.assert_frame_equal(dfIncremental, juncao_completa(projeto))
+    assert dfIncremental.loc[dfIncremental['Ticker'] == 'ITUB4.SA', 'Close'].iat[0] == \
+        dfHistorico.loc[(dfHistorico['Ticker'] == 'ITUB4.SA') & (dfHistorico['Date'] == '2024-03-15'), 'Close'].iat[0]
+
+    with open(os.path.join(projeto, 'DataCom Proventos', ARQUIVO_ESTADO), encoding='utf-8') as arquivo:
+        assert json.load(arquivo)['cotacoes'][caminho_marco] == assinatura_arquivo(caminho_marco)
+
+    # Novo evento no DataCom de fevereiro: somente o arquivo alterado é recalculado
+    leituras.clear()
+    gravar_datacom(projeto, 2, 2024, [('PETR4', 3, 0.5), ('VALE3', 15, 1.2), ('SEMC3', 20, 0.1), ('ITUB4', 9, 0.6)])
+    pd.testing.assert_frame_equal(JuncaoProventos(projeto, classes=['acoes']).atualizar(), juncao_completa(projeto))
+    assert leituras == [(pd.Timestamp('2024-02-03'), pd.Timestamp('2024-02-20'))]
+
+    # Sem alterações nada é lido
+    leituras.clear()
+    pd.testing.assert_frame_equal(JuncaoProventos(projeto, classes=['acoes']).atualizar(), juncao_completa(projeto))
+    assert leituras == []
@@ -0,0 +1,43 @@
+import os
+from datetime import datetime
+from substitutos import DownloaderSintetico
+from manifesto import ARQUIVO_MANIFESTO, Manifesto
+from registro_falhas import RegistroFalhas, reparar_historico
+
+AGORA = datetime(2024, 6, 3, 20)
+
+
+def criar_registro(diretorio, meses_vencidos, meses_em_espera=()):
+    registro = RegistroFalhas(diretorio)
+    for ticker, mes in meses_vencidos:
+        registro.registrar_falha(ticker, mes, 'sem dados', agora=datetime(2024, 5, 1))
+    for ticker, mes in meses_em_espera:
+        registro.registrar_falha(ticker, mes, 'sem dados', agora=datetime(2024, 5, 1))
+        registro.falhas[f'{ticker}|{mes}']['proxima_tentativa'] = '2099-01-01T00:00:00'
+    registro.salvar()
+
+
+def ultima_data(diretorio, ticker):
+    return Manifesto(os.path.join(diretorio, ARQUIVO_MANIFESTO)).ultima_data(ticker)
+
+
+def test_manifesto_para_antes_do_primeiro_mes_pendente(tmp_path):
+    diretorio = str(tmp_path)
+    criar_registro(diretorio, [('PETR4.SA', '2024-01'), ('PETR4.SA', '2024-03'), ('VALE3.SA', '2024-03')],
+                   meses_em_espera=[('PETR4.SA', '2024-02')])
+
+    reparados, restantes = reparar_historico(diretorio, 'Teste', downloader=DownloaderSintetico(), agora=AGORA)
+
+    assert restantes == 1
+    assert ultima_data(diretorio, 'PETR4.SA') == datetime(2024, 1, 31)
+    assert ultima_data(diretorio, 'VALE3.SA') == datetime(2024, 3, 29)
+
+
+def test_manifesto_avanca_quando_todos_os_meses_foram_reparados(tmp_path):
+    diretorio = str(tmp_path)
+    criar_registro(diretorio, [('PETR4.SA', '2024-01'), ('PETR4.SA', '2024-03')])
+
+    reparar_historico(diretorio, 'Teste', downloader=DownloaderSintetico(), agora=AGORA)
+
+    assert len(RegistroFalhas(diretorio)) == 0
+    assert ultima_data(diretorio, 'PETR4.SA') == datetime(2024, 3, 29)
@@ -0,0 +1,54 @@
+import os
+import numpy as np
+import pandas as pd
+from leitor_indicadores import ler_indicadores
+from triagem import Coluna, Triagem, filtro_formula_magica, filtro_tickers, formula_magica
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE_ACOES = os.path.join(RAIZ, 'statusinvest-busca-avancada.csv')
+
+
+def ranking_pandas(df, fatores, mascara, top=None):
+    """
+    Referencia do ranking com rank(method='first') do pandas sobre os tickers filtrados.
+    """
+    selecionados = df[mascara]
+    pontuacao = pd.Series(0.0, index=selecionados.index)
+    posicoes = {}
+    for coluna, ascendente, peso in fatores:
+        posicoes[f'POSICAO {coluna}'] = selecionados[coluna].rank(method='first', ascending=ascendente) - 1
+        pontuacao += peso * posicoes[f'POSICAO {coluna}']
+    ranking = pd.DataFrame({'TICKER': selecionados['TICKER'], 'PONTUACAO': pontuacao, **posicoes})
+    ranking = ranking.dropna(subset=['PONTUACAO']).sort_values('PONTUACAO', kind='stable')
+    return ranking.head(top) if top is not None else ranking
+
+
+def test_filtros_e_rankings_iguais_ao_pandas():
+    df = ler_indicadores(FIXTURE_ACOES)
+    triagem = Triagem(df)
+
+    consultas = {
+        'pl_roic': ((Coluna('P/L') > 0) & Coluna('ROIC').entre(10, 50),
+                    (df['P/L'] > 0) & df['ROIC'].between(10, 50)),
+        'sem_dy_baixo': (~(Coluna('DY') < 5) | (Coluna('P/VP') <= 1),
+                         ~(df['DY'] < 5) | (df['P/VP'] <= 1)),
+        'dy_preenchido': (Coluna('DY').preenchida() & (Coluna('DY') >= 6),
+                          df['DY'].notna() & (df['DY'] >= 6)),
+        'tickers': (filtro_tickers(['PETR4', 'VALE3', 'ITUB4']) & (Coluna('P/L') < 100),
+                    df['TICKER'].isin(['PETR4', 'VALE3', 'ITUB4']) & (df['P/L'] < 100)),
+    }
+    filtros = [filtro for filtro, _ in consultas.values()]
+    for tickers, (_, mascara) in zip(triagem.executar(filtros + filtros), list(consultas.values()) * 2):
+        np.testing.assert_array_equal(tickers, df.loc[mascara, 'TICKER'].to_numpy(dtype=str))
+
+    # Formula magica: EV/EBIT crescente e ROIC decrescente, com empates nos dois fatores
+    mascara = (df['EV/EBIT'] > 0) & (df['ROIC'] > 0) & (df['LIQUIDEZ MEDIA DIARIA'] >= 1_000_000)
+    assert df.loc[mascara, 'ROIC'].duplicated().any() and df.loc[mascara, 'EV/EBIT'].duplicated().any()
+    pd.testing.assert_frame_equal(formula_magica(triagem),
+                                  ranking_pandas(df, [('EV/EBIT', True, 1.0), ('ROIC', False, 1.0)], mascara,
+                                                 30).reset_index(drop=True))
+
+    # Pesos e fator com valores vazios (DY): tickers sem o valor ficam fora do ranking
+    fatores = [('P/VP', True, 1.0), ('DY', False, 0.5), ('ROE', False, 2.0)]
+    pd.testing.assert_frame_equal(triagem.ranquear(fatores, filtro_formula_magica()),
+                                  ranking_pandas(df, fatores, mascara).reset_index(drop=True))
@@ -0,0 +1,211 @@
+import numpy as np
+import pandas as pd
+
+
+class Filtro:
+    """
+    Expressão de filtro sobre as colunas de indicadores, combinavel com & (e), | (ou) e ~ (não).
+    A chave identifica a expressão, permitindo reaproveitar a mascara entre consultas.
+    """
+
+    def __init__(self, chave, avaliar):
+        self.chave = chave
+        self._avaliar = avaliar
+
+    def __and__(self, outro):
+        return Filtro(('e', self.chave, outro.chave), lambda t: t.mascara(self) & t.mascara(outro))
+
+    def __or__(self, outro):
+        return Filtro(('ou', self.chave, outro.chave), lambda t: t.mascara(self) | t.mascara(outro))
+
+    def __invert__(self):
+        return Filtro(('nao', self.chave), lambda t: ~t.mascara(self))
+
+    def __repr__(self):
+        return f'Filtro{self.chave}'
+
+
+class Coluna:
+    """
+    Referencia a uma coluna numerica para montar filtros: Coluna('P/L') > 0, Coluna('ROIC').entre(10, 50).
+    Comparações com NaN são sempre falsas.
+    """
+
+    def __init__(self, nome):
+        self.nome = nome
+
+    def _intervalo(self, simbolo, minimo, maximo, inclui_minimo, inclui_maximo):
+        return Filtro((simbolo, self.nome, minimo, maximo),
+                      lambda t: t.intervalo(self.nome, minimo, maximo, inclui_minimo, inclui_maximo))
+
+    def __gt__(self, valor):
+        return self._intervalo('>', valor, None, False, True)
+
+    def __ge__(self, valor):
+        return self._intervalo('>=', valor, None, True, True)
+
+    def __lt__(self, valor):
+        return self._intervalo('<', None, valor, True, False)
+
+    def __le__(self, valor):
+        return self._intervalo('<=', None, valor, True, True)
+
+    def entre(self, minimo, maximo):
+        """
+        minimo <= valor <= maximo.
+        """
+        return self._intervalo('entre', minimo, maximo, True, True)
+
+    def preenchida(self):
+        return Filtro(('preenchida', self.nome), lambda t: ~np.isnan(t.valores(self.nome)))
+
+
+def filtro_tickers(*lista):
+    """
+    Filtro por lista de tickers.
+    """
+    lista = tuple(lista[0]) if len(lista) == 1 and not isinstance(lista[0], str) else lista
+    return Filtro(('tickers', lista), lambda t: np.isin(t.tickers, lista))
+
+
+class Triagem:
+    """
+    Triagem e ranking vetorizados sobre a tabela de indicadores (uma linha por ticker).
+    As colunas são convertidas uma unica vez em arrays float64 e a ordenação de cada coluna (argsort) é
+    calculada na primeira consulta e reaproveitada: filtros de intervalo viram buscas binarias na coluna
+    ordenada e os rankings usam a mesma ordem.
+    """
+
+    def __init__(self, df, coluna_ticker='TICKER'):
+        self.tickers = df[coluna_ticker].to_numpy(dtype=str)
+        self.total = len(df)
+        self._colunas = {coluna: pd.to_numeric(df[coluna], errors='coerce').to_numpy(dtype='float64')
+                         for coluna in df.columns if coluna != coluna_ticker and
+                         pd.api.types.is_numeric_dtype(df[coluna])}
+        self._ordens = {}
+        self._ordens_decrescentes = {}
+        self._mascaras = {}
+
+    def valores(self, coluna):
+        return self._colunas[coluna]
+
+    def ordem(self, coluna):
+        """
+        (argsort da coluna, valores ordenados, quantidade de valores preenchidos). NaN ficam no final.
+        """
+        if coluna not in self._ordens:
+            valores = self._colunas[coluna]
+            ordem = np.argsort(valores, kind='stable')
+            self._ordens[coluna] = (ordem, valores[ordem], int(np.count_nonzero(~np.isnan(valores))))
+        return self._ordens[coluna]
+
+    def ordem_decrescente(self, coluna):
+        """
+        argsort decrescente dos valores preenchidos, com valores iguais na ordem da tabela como na ordem crescente.
+        """
+        if coluna not in self._ordens_decrescentes:
+            ordem, ordenados, preenchidos = self.ordem(coluna)
+            self._ordens_decrescentes[coluna] = ordem[:preenchidos][np.argsort(-ordenados[:preenchidos],
+                                                                               kind='stable')]
+        return self._ordens_decrescentes[coluna]
+
+    def intervalo(self, coluna, minimo=None, maximo=None, inclui_minimo=True, inclui_maximo=True):
+        """
+        Mascara dos tickers com o valor da coluna dentro do intervalo, por busca binaria na coluna ordenada.
+        """
+        ordem, ordenados, preenchidos = self.ordem(coluna)
+        inicio, fim = 0, preenchidos
+        if minimo is not None:
+            inicio = np.searchsorted(ordenados[:preenchidos], minimo, side='left' if inclui_minimo else 'right')
+        if maximo is not None:
+            fim = np.searchsorted(ordenados[:preenchidos], maximo, side='right' if inclui_maximo else 'left')
+
+        mascara = np.zeros(self.total, dtype=bool)
+        mascara[ordem[inicio:max(inicio, fim)]] = True
+        return mascara
+
+    def mascara(self, filtro):
+        """
+        Avalia o filtro (None seleciona todos), reaproveitando mascaras já calculadas para a mesma expressão.
+        """
+        if filtro is None:
+            return np.ones(self.total, dtype=bool)
+        if filtro.chave not in self._mascaras:
+            self._mascaras[filtro.chave] = filtro._avaliar(self)
+        return self._mascaras[filtro.chave]
+
+    def filtrar(self, filtro):
+        """
+        Tickers que passam no filtro, na ordem da tabela.
+        """
+        return self.tickers[self.mascara(filtro)]
+
+    def posicoes(self, coluna, mascara, ascendente=True):
+        """
+        Posição (0 = melhor) de cada ticker selecionado na coluna, considerando somente os tickers da mascara.
+        Tickers fora da mascara ou sem valor recebem NaN, valores iguais seguem a ordem da tabela.
+        """
+        ordem, _, preenchidos = self.ordem(coluna)
+        ordem = ordem[:preenchidos] if ascendente else self.ordem_decrescente(coluna)
+
+        selecionados = mascara[ordem]
+        posicoes = np.full(self.total, np.nan)
+        posicoes[ordem[selecionados]] = np.arange(np.count_nonzero(selecionados))
+        return posicoes
+
+    def ranquear(self, fatores, filtro=None, top=None):
+        """
+        Ranking multifator: soma ponderada das posições de cada fator dentro dos tickers filtrados.
+        Tickers sem valor em algum fator ficam fora do ranking.
+
+        :param fatores: Lista de (coluna, ascendente) ou (coluna, ascendente, peso).
+            Ex.: [('EV/EBIT', True), ('ROIC', False)] (formula magica).
+        :param filtro: Filtro aplicado antes do ranking.
+        :param top: Quantidade de tickers retornados (None retorna todos).
+        :return: DataFrame com TICKER, PONTUACAO (menor é melhor) e as posições de cada fator.
+        """
+        mascara = self.mascara(filtro)
+        pontuacao = np.zeros(self.total)
+        resultado = {}
+        for fator in fatores:
+            coluna, ascendente, peso = (tuple(fator) + (1.0,))[:3]
+            posicoes = self.posicoes(coluna, mascara, ascendente)
+            pontuacao += peso * posicoes
+            resultado[f'POSICAO {coluna}'] = posicoes
+
+        validos = np.flatnonzero(~np.isnan(pontuacao))
+        ordem = validos[np.argsort(pontuacao[validos], kind='stable')]
+        if top is not None:
+            ordem = ordem[:top]
+
+        return pd.DataFrame({'TICKER': self.tickers[ordem], 'PONTUACAO': pontuacao[ordem],
+                             **{nome: posicoes[ordem] for nome, posicoes in resultado.items()}})
+
+    def executar(self, consultas):
+        """
+        Executa um lote de consultas sobre o mesmo snapshot, compartilhando ordenações e mascaras.
+
+        :param consultas: Lista de filtros (retorna os tickers) ou de dicts com 'fatores', 'filtro' e 'top'
+            (retorna o ranking).
+        """
+        resultados = []
+        for consulta in consultas:
+            if isinstance(consulta, Filtro):
+                resultados.append(self.filtrar(consulta))
+            else:
+                resultados.append(self.ranquear(consulta['fatores'], consulta.get('filtro'), consulta.get('top')))
+        return resultados
+
+
+def filtro_formula_magica(liquidez_minima=1_000_000):
+    """
+    Universo da formula magica: EV/EBIT e ROIC positivos e liquidez media diaria minima.
+    """
+    return (Coluna('EV/EBIT') > 0) & (Coluna('ROIC') > 0) & (Coluna('LIQUIDEZ MEDIA DIARIA') >= liquidez_minima)
+
+
+def formula_magica(triagem, top=30, liquidez_minima=1_000_000):
+    """
+    Ranking da formula magica (Greenblatt): menor EV/EBIT somado ao maior ROIC.
+    """
+    return triagem.ranquear([('EV/EBIT', True), ('ROIC', False)], filtro_formula_magica(liquidez_minima), top)